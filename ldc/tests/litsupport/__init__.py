@@ -0,0 +1 @@
+# Support code for LDC's lit test suite, shared by lit.site.cfg and runlit.py.
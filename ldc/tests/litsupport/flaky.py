@@ -0,0 +1,75 @@
+# Handling of flaky tests, see runlit.py --flaky-threshold and --retry-budget.
+#
+# The timing database (see timing.py) keeps the outcomes of the last runs of
+# each test: 'P' passed, 'R' passed only when retried, 'F' failed. Flaky tests
+# are told apart from broken ones by their failures not persisting, i.e. by
+# retried passes and by failures between two passes. Tests with a share of
+# such runs above the threshold get lit's retries, as if they had an
+# ALLOW_RETRIES: line. Tests still failing at the end of the run can be rerun
+# once on their own instead of rerunning the whole suite.
+
+from __future__ import print_function
+
+# codes of failures worth a rerun
+RERUN_CODES = ('FAIL', 'TIMEOUT')
+
+
+def flakiness(history):
+    """The share of the runs in 'history' with a failure which did not persist."""
+    if not history:
+        return 0.0
+    flaky = history.count('R')
+    for i in range(1, len(history) - 1):
+        if history[i] == 'F' and history[i - 1] != 'F' and history[i + 1] != 'F':
+            flaky += 1
+    return flaky / float(len(history))
+
+
+def pass_rate(history):
+    return (history.count('P') + history.count('R')) / float(len(history)) if history else 1.0
+
+
+def flaky_tests(db, threshold):
+    """The names of the tests in the timing database whose flakiness is above 'threshold'."""
+    return sorted(name for name, entry in db.tests.items() if flakiness(entry.get('history', '')) > threshold)
+
+
+def write_list(path, names):
+    with open(path, 'w') as f:
+        for name in names:
+            f.write(name + '\n')
+
+
+def read_list(path):
+    with open(path) as f:
+        return set(line.rstrip('\n') for line in f if line.strip())
+
+
+def rerun_candidates(tests, budget):
+    """The failed tests of a lit JSON report worth a rerun, and whether there are few enough for a 'budget' of reruns."""
+    failed = [t['name'] for t in tests if t['code'] in RERUN_CODES]
+    return failed, len(failed) <= budget
+
+
+def apply_rerun(tests, rerun):
+    """Turns the failures in the tests of a lit JSON report which passed when rerun into flaky passes."""
+    passed = set(t['name'] for t in rerun if t['code'] in ('PASS', 'FLAKYPASS'))
+    for t in tests:
+        if t['name'] in passed and t['code'] in RERUN_CODES:
+            t['code'] = 'FLAKYPASS'
+            t['output'] = 'Passed when rerun at the end of the run, output of the failed run:\n' + (t.get('output') or '')
+    return passed
+
+
+def print_summary(tests, db, quarantined, rerun):
+    """Lists the tests which only passed when retried, and what's left failing of the rerun ones."""
+    retried = sorted(t['name'] for t in tests if t['code'] == 'FLAKYPASS')
+    failed = set(t['name'] for t in tests if t['code'] in RERUN_CODES)
+    if not retried and not rerun and not quarantined:
+        return
+    print('\nFlaky tests: %d known flaky tests got retries, %d tests passed only when retried, %d of %d rerun tests still failed' % (
+        len(quarantined), len(retried), len(failed & set(rerun)), len(rerun)))
+    for name in retried + sorted(failed & set(rerun)):
+        history = db.tests.get(name, {}).get('history', '')
+        print('  %-7s pass rate %3.0f%% and flakiness %.2f over the last %d runs: %s' % (
+            'FAILED' if name in failed else 'retried', pass_rate(history) * 100, flakiness(history), len(history), name))
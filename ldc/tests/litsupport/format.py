@@ -0,0 +1,70 @@
+# The lit test format of LDC's test suite: lit's ShTest plus the hooks runlit.py
+# features build on.
+
+import os
+import tempfile
+import time
+
+import lit.formats
+import lit.Test
+
+from litsupport import impact, instrument
+
+
+class LDCShTest(lit.formats.ShTest):
+    def __init__(self, *args, **kwargs):
+        super(LDCShTest, self).__init__(*args, **kwargs)
+        self.result_cache = None
+        self.instrument = False
+        self.record_impact = False
+        self.flaky_tests = set()
+        self.flaky_retries = 0
+
+    def execute(self, test, litConfig):
+        if test.getFullName() in self.flaky_tests:
+            # an ALLOW_RETRIES: line in the test overrides this
+            test.allowed_retries = max(test.allowed_retries, self.flaky_retries)
+        key = None
+        if self.result_cache is not None and not litConfig.noExecute:
+            key = self.result_cache.key(test)
+            entry = self.result_cache.lookup(key)
+            if entry is not None:
+                result = lit.Test.Result(lit.Test.PASS, 'Cached pass, test and dependencies unchanged\n')
+                result.addMetric('cached', lit.Test.IntMetricValue(1))
+                result.addMetric('cached_elapsed', lit.Test.RealMetricValue(entry.get('elapsed') or 0.0))
+                return result
+
+        start = time.time()
+        # the logs of the wrapped tools and the metrics they become
+        logs = []
+        if self.instrument:
+            logs.append((instrument.LOG_VARIABLE, 'commands'))
+        if self.record_impact:
+            logs.append((impact.LOG_VARIABLE, 'impact'))
+        if logs:
+            result = self.execute_logged(test, litConfig, logs)
+        else:
+            result = super(LDCShTest, self).execute(test, litConfig)
+        if key is not None and result.code == lit.Test.PASS:
+            self.result_cache.store(key, test, time.time() - start)
+        return result
+
+    def execute_logged(self, test, litConfig, logs):
+        # the wrapped tools append their records to the logs, workers run one test at a time
+        files = []
+        for variable, _ in logs:
+            fd, path = tempfile.mkstemp(prefix='ldc-lit-log', suffix='.jsonl')
+            os.close(fd)
+            test.config.environment[variable] = path
+            files.append(path)
+        try:
+            result = super(LDCShTest, self).execute(test, litConfig)
+        finally:
+            records = []
+            for (variable, _), path in zip(logs, files):
+                del test.config.environment[variable]
+                records.append(instrument.read_log(path))
+                os.remove(path)
+        for (_, metric), value in zip(logs, records):
+            result.addMetric(metric, lit.Test.JSONMetricValue(value))
+        return result
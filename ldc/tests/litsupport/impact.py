@@ -0,0 +1,213 @@
+# Change-impact test selection, see runlit.py --changed-since and --record-impact.
+#
+# With --record-impact, %ldc is routed through this script, which adds
+# -makedeps to the compilation and logs the modules it read, and whether it
+# linked, to the file named by $LDC_LIT_IMPACT_LOG. The test format attaches
+# the records to the test's result, from where runlit.py merges them into the
+# impact map: the druntime/Phobos modules and inputs/ files each test reads.
+#
+# The tests affected by a set of changed files (relative to the repository
+# root) are then:
+#  - changed tests, all tests of a directory with a changed lit.local.cfg and
+#    all tests if the test suite's own files changed,
+#  - for other files of the test directories (inputs/ etc.) and for druntime
+#    and Phobos, the tests that read them according to the impact map; as the
+#    runtime libraries are linked into every executable, changes to the
+#    runtime also affect all tests that link,
+#  - for the compiler's own sources, the test directories in COMPILER_RULES,
+#  - for the tools in ldc/tools, the tests using their substitutions,
+#  - all tests for any other file, e.g. druntime/Makefile or phobos/dub.sdl,
+#    unless _IGNORED.
+# Tests missing from the impact map count as affected wherever it is needed.
+#
+# Usage as wrapper: impact.py -- <ldc2> [args...]
+
+from __future__ import print_function
+
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from litsupport import instrument, objcache
+from litsupport.timing import NOT_RUN_CODES, test_path, write_json
+
+LOG_VARIABLE = 'LDC_LIT_IMPACT_LOG'
+
+# test directories producing or checking code, which changes to the backend can affect
+CODEGEN_DIRS = ['baremetal', 'codegen', 'compilable', 'debuginfo', 'dynamiccompile', 'fail_compilation',
+                'instrument', 'linking', 'PGO', 'sanitizers', 'semantic']
+
+# test directories affected by changes to the compiler, by path prefix relative to
+# the repository root; the first match wins, None stands for all directories
+COMPILER_RULES = [
+    ('ldc/gen/', CODEGEN_DIRS),
+    ('ldc/ir/', CODEGEN_DIRS),
+    ('ldc/runtime/jit-rt/', ['dynamiccompile']),
+    ('ldc/driver/', None),
+    ('ldc/utils/', None),  # FileCheck, not, split-file
+    ('compiler/src/dmd/', None),
+]
+
+# tools built from ldc/tools and the substitutions running them
+TOOL_RULES = [
+    ('ldc/tools/ldc-profdata', '%profdata'),
+    ('ldc/tools/ldc-profgen', '%profgen'),
+    ('ldc/tools/ldc-prune-cache', '%prunecache'),
+    ('ldc/tools/timetrace2txt', '%timetrace2txt'),
+    ('ldc/tools/ldc-build-plugin', '%buildplugin'),
+]
+
+# files which do not affect any test
+_IGNORED = re.compile(r'(\.md|/README[^/]*|/LICENSE[^/]*|/CHANGELOG[^/]*)$', re.I)
+
+
+def wrap_substitution(config):
+    """Routes the %ldc substitution of 'config' through this script."""
+    wrapper = '"%s" "%s" --' % (sys.executable, os.path.abspath(__file__))
+    config.substitutions = [(p, wrapper + ' ' + v if p == '%ldc' else v) for p, v in config.substitutions]
+
+
+def record(argv):
+    compiler, args = argv[1], argv[2:]
+    deps_file = None
+    # a second -makedeps would override the test's own
+    if not any(a.startswith('-makedeps') for a in args):
+        fd, deps_file = tempfile.mkstemp(suffix='.deps')
+        os.close(fd)
+        args = args + ['-makedeps=' + deps_file]
+    try:
+        returncode = subprocess.call([compiler] + args)
+        deps = [a for a in args if not a.startswith('-') and os.path.isfile(a)]
+        if deps_file and os.path.getsize(deps_file):
+            deps += objcache.read_makedeps(deps_file)
+    finally:
+        if deps_file:
+            os.remove(deps_file)
+
+    log = os.environ.get(LOG_VARIABLE)
+    if log:
+        entry = {'deps': sorted(set(os.path.abspath(d) for d in deps)),
+                 'links': instrument.category('ldc', args) == 'ldc compile+link'}
+        with open(log, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+    objcache.exit_with(returncode, b'', b'')
+
+
+def site_config_value(exec_root, name):
+    """The value of 'config.<name> = "..."' in the lit.site.cfg in 'exec_root'."""
+    with open(os.path.join(exec_root, 'lit.site.cfg')) as f:
+        m = re.search(r'^config\.%s\s*=\s*"([^"]*)"' % re.escape(name), f.read(), re.M)
+    return m.group(1) if m else None
+
+
+def repository_root(path):
+    return subprocess.check_output(['git', 'rev-parse', '--show-toplevel'], cwd=path, universal_newlines=True).strip()
+
+
+def changed_files(root, base):
+    """The files changed since the git revision 'base', committed or not, relative to 'root'."""
+    output = subprocess.check_output(['git', 'diff', '--name-only', base, '--'], cwd=root, universal_newlines=True)
+    return [line for line in output.splitlines() if line]
+
+
+class ImpactMap(object):
+    def __init__(self, path):
+        self.path = path
+        self.tests = {}
+        try:
+            with open(path) as f:
+                self.tests = json.load(f).get('tests', {})
+        except (IOError, OSError, ValueError):
+            pass
+
+    def save(self):
+        write_json(self.path, {'tests': self.tests})
+
+    def update(self, results, root):
+        """Replaces the entries of the tests of a lit JSON report which recorded their dependencies, returns their number."""
+        count = 0
+        for t in results:
+            records = t.get('metrics', {}).get('impact')
+            if records is None or t['code'] in NOT_RUN_CODES:
+                continue
+            deps = set()
+            for r in records:
+                deps.update(os.path.relpath(d, root).replace(os.sep, '/') for d in r['deps'])
+            self.tests[t['name']] = {'deps': sorted(d for d in deps if not d.startswith('..')),
+                                     'links': any(r['links'] for r in records)}
+            count += 1
+        return count
+
+    def readers(self, tests, path):
+        """The 'tests' which read 'path' or are missing from the map."""
+        return set(t for t in tests if t not in self.tests or path in self.tests[t]['deps'])
+
+    def linkers(self, tests):
+        """The 'tests' which link executables or are missing from the map."""
+        return set(t for t in tests if t not in self.tests or self.tests[t]['links'])
+
+
+def affected_tests(changed, tests, impact_map, root, tests_dir):
+    """
+    The subset of the test names 'tests' affected by the 'changed' files; 'root' is
+    the repository root and 'tests_dir' the lit test directory relative to it.
+    """
+    by_path = dict((test_path(t), t) for t in tests)
+    sources = {}
+
+    def source(name):
+        if name not in sources:
+            try:
+                with open(os.path.join(root, tests_dir, test_path(name))) as f:
+                    sources[name] = f.read()
+            except (IOError, OSError, UnicodeDecodeError):
+                sources[name] = ''
+        return sources[name]
+
+    def in_dirs(dirs):
+        return set(t for t in tests if dirs is None or test_path(t).split('/', 1)[0] in dirs)
+
+    affected = set()
+    for path in changed:
+        if path.startswith(tests_dir + '/'):
+            rel = path[len(tests_dir) + 1:]
+            if rel in by_path:
+                affected.add(by_path[rel])
+            elif rel.startswith('dmd/'):
+                pass  # the DMD testsuite, not run by lit
+            elif os.path.basename(rel) == 'lit.local.cfg':
+                affected |= set(t for t in tests if test_path(t).startswith(os.path.dirname(rel) + '/'))
+            elif '/' not in rel or rel.startswith('litsupport/'):
+                return set(tests)  # lit.site.cfg.in, runlit.py, ...
+            else:
+                # inputs/ etc.: the tests reading it, or mentioning it in their RUN lines
+                directory = rel.split('/', 1)[0] + '/'
+                name = os.path.basename(rel)
+                affected |= set(t for t in impact_map.readers(tests, path) if t in impact_map.tests)
+                affected |= set(t for t in tests if test_path(t).startswith(directory) and name in source(t))
+            continue
+        if _IGNORED.search('/' + path):
+            continue
+
+        tool = [s for prefix, s in TOOL_RULES if path.startswith(prefix)]
+        rule = [dirs for prefix, dirs in COMPILER_RULES if path.startswith(prefix)]
+        if tool:
+            affected |= set(t for t in tests if tool[0] in source(t))
+        elif rule:
+            affected |= in_dirs(rule[0])
+        elif path.startswith(('druntime/src/', 'druntime/import/', 'phobos/std/', 'phobos/etc/')):
+            affected |= impact_map.readers(tests, path) | impact_map.linkers(tests)
+        elif path.startswith('ldc/tools/'):
+            affected |= in_dirs(['tools'])
+        else:
+            return set(tests)  # build systems, runtime build, configuration, anything unknown
+    return affected
+
+
+if __name__ == '__main__':
+    record(sys.argv[1:])
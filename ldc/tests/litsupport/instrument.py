@@ -0,0 +1,152 @@
+# Instrumentation of the commands run by lit tests, enabled by runlit.py --instrument.
+#
+# The tool substitutions (%ldc, %llc, %profdata, ...) and FileCheck are
+# wrapped by this script, which runs the tool and appends its wall time, CPU
+# time and peak RSS to the log file named by $LDC_LIT_MEASURE_LOG. The test
+# format points that variable to a file per test and attaches the records to
+# the test's result, from where runlit.py builds its report.
+#
+# If $LDC_LIT_TIME_TRACE_DIR is set, %ldc additionally writes a --ftime-trace
+# file per invocation into that directory, which runbench.py aggregates.
+#
+# Usage as wrapper: instrument.py <label> -- <command> [args...]
+
+from __future__ import print_function
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None  # Windows, only wall times are measured
+
+LOG_VARIABLE = 'LDC_LIT_MEASURE_LOG'
+TIME_TRACE_VARIABLE = 'LDC_LIT_TIME_TRACE_DIR'
+
+# substitutions of tools worth measuring, FileCheck is not a substitution and is wrapped separately
+TOOL_SUBSTITUTIONS = ['%ldc', '%llc', '%profdata', '%profgen', '%prunecache', '%buildplugin',
+                      '%timetrace2txt', '%llvm-spirv', '%gnu_make']
+
+# ldc2 flags which make it stop before linking, besides the -output-* ones
+_NO_LINK_FLAGS = ('-c', '-o-', '-lib')
+
+
+def wrap_substitutions(config):
+    """Routes the tool substitutions of 'config' and FileCheck through this script."""
+    wrapper = '"%s" "%s"' % (sys.executable, os.path.abspath(__file__))
+    for i, (pattern, value) in enumerate(config.substitutions):
+        if pattern in TOOL_SUBSTITUTIONS:
+            config.substitutions[i] = (pattern, '%s %s -- %s' % (wrapper, pattern[1:], value))
+    config.substitutions.append((r'(?<![\w/\\.=-])FileCheck\b', wrapper + ' FileCheck -- FileCheck'))
+
+
+def category(label, args):
+    if label == 'ldc':
+        return 'ldc compile' if any(a in _NO_LINK_FLAGS or a.startswith('-output-') for a in args) else 'ldc compile+link'
+    return label
+
+
+def measure(argv):
+    label, command = argv[0], argv[2:]
+    trace_dir = os.environ.get(TIME_TRACE_VARIABLE)
+    if trace_dir and label == 'ldc':
+        fd, trace_file = tempfile.mkstemp(suffix='.time-trace', dir=trace_dir)
+        os.close(fd)
+        # in front of the test's own flags, which win if it uses --ftime-trace itself
+        command = command[:1] + ['--ftime-trace', '--ftime-trace-file=' + trace_file] + command[1:]
+
+    start = time.time()
+    if resource is not None:
+        process = subprocess.Popen(command)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        cpu = usage.ru_utime + usage.ru_stime
+        # kilobytes on Linux and the BSDs, bytes on macOS
+        rss = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    else:
+        process = subprocess.Popen(command)
+        process.wait()
+        cpu = rss = None
+    wall = time.time() - start
+
+    log = os.environ.get(LOG_VARIABLE)
+    if log:
+        record = {'tool': category(label, command[1:]), 'command': ' '.join(command)[:500],
+                  'wall': wall, 'cpu': cpu, 'rss': rss, 'exit_code': process.returncode}
+        with open(log, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+    if process.returncode < 0:
+        # die the same way, for e.g. 'not --crash'
+        signal.signal(-process.returncode, signal.SIG_DFL)
+        os.kill(os.getpid(), -process.returncode)
+    return process.returncode
+
+
+def read_log(path):
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    pass  # a record cut short by a killed test
+    except (IOError, OSError):
+        pass
+    return records
+
+
+def make_report(results):
+    """Per test and per tool totals of the command records in a lit JSON report's tests."""
+    tests = []
+    tools = {}
+    for t in results:
+        commands = t.get('metrics', {}).get('commands')
+        if commands is None:
+            continue
+        measured = sum(c['wall'] for c in commands)
+        tests.append({'name': t['name'], 'code': t['code'], 'elapsed': t.get('elapsed') or 0.0,
+                      'untracked': max(0.0, (t.get('elapsed') or 0.0) - measured), 'commands': commands})
+        for c in commands:
+            tool = tools.setdefault(c['tool'], {'count': 0, 'wall': 0.0, 'cpu': 0.0, 'max_rss': 0})
+            tool['count'] += 1
+            tool['wall'] += c['wall']
+            tool['cpu'] += c['cpu'] or 0.0
+            tool['max_rss'] = max(tool['max_rss'], c['rss'] or 0)
+    tools['other (executables, shell builtins)'] = {'count': len(tests), 'wall': sum(t['untracked'] for t in tests),
+                                                    'cpu': None, 'max_rss': None}
+    return {'tests': tests, 'tools': tools}
+
+
+def print_summary(report, top):
+    def mb(rss):
+        return '%8.1f' % (rss / 1048576.0) if rss else '       -'
+
+    print('\nTime and memory by tool:')
+    print('  %-36s %7s %10s %10s %10s' % ('tool', 'count', 'wall [s]', 'cpu [s]', 'rss [MB]'))
+    for name, tool in sorted(report['tools'].items(), key=lambda x: -x[1]['wall']):
+        cpu = '%10.1f' % tool['cpu'] if tool['cpu'] is not None else '         -'
+        print('  %-36s %7d %10.1f %s   %s' % (name, tool['count'], tool['wall'], cpu, mb(tool['max_rss'])))
+
+    print('\nTop %d slowest tests:' % top)
+    for t in sorted(report['tests'], key=lambda t: -t['elapsed'])[:top]:
+        print('  %7.2fs  %s' % (t['elapsed'], t['name']))
+
+    commands = [(c, t['name']) for t in report['tests'] for c in t['commands']]
+    print('\nTop %d slowest commands:' % top)
+    for c, name in sorted(commands, key=lambda x: -x[0]['wall'])[:top]:
+        print('  %7.2fs %s MB  %s: %s' % (c['wall'], mb(c['rss']).strip(), name, c['command'][:120]))
+
+    print('\nTop %d commands by peak RSS:' % top)
+    for c, name in sorted(commands, key=lambda x: -(x[0]['rss'] or 0))[:top]:
+        print('  %s MB %7.2fs  %s: %s' % (mb(c['rss']), c['wall'], name, c['command'][:120]))
+
+
+if __name__ == '__main__':
+    sys.exit(measure(sys.argv[1:]))
@@ -0,0 +1,364 @@
+# Memoizing wrapper around %ldc, enabled by runlit.py --object-cache.
+#
+# Many tests compile the same helpers from their 'inputs' directories with
+# the same flags. A plain compilation to a single output file ('-c ... -of=X')
+# is looked up by the compiler digest, the working directory, the flags (the
+# output path excluded) and the contents of all files named on the command
+# line. An entry holds the output file, the compiler's stdout/stderr and a
+# manifest of the imported modules (from -makedeps) with their mtimes and
+# sizes, so a change to an imported module is a miss too.
+#
+# Entries are created in a temporary directory and renamed into place, so
+# concurrent lit workers never see partial entries. Every invocation writes
+# its hit/miss counters to a file of its own in stats/, without locking.
+# collect_stats() folds them into stats.json at the start and the end of a
+# run, under a lock file, and then evicts the least recently used entries if
+# the cache outgrew its size limit.
+#
+# Usage: objcache.py -- <ldc2> [args...], configured by the environment variables below.
+
+from __future__ import print_function
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+CACHE_DIR_VARIABLE = 'LDC_LIT_OBJECT_CACHE'
+TOOLCHAIN_VARIABLE = 'LDC_LIT_TOOLCHAIN'  # digest of the compiler and runtime libs
+
+# flags producing files besides the output, or depending on files -makedeps does not list
+_UNCACHEABLE_PREFIXES = ('-deps', '-makedeps', '-X', '-H', '-D', '-J', '-od', '-op', '-oq', '-lib', '-shared',
+                         '-run', '-mixin', '-vcg-ast', '-ftime-trace', '-cache', '-plugin', '-mdcompute',
+                         '-fsave-optimization-record', '-output-mlir', '--')
+_OUTPUT_FLAGS = ('-output-o', '-output-ll', '-output-bc', '-output-s')
+
+# fraction of the size limit the cache is trimmed to when it outgrows it
+_TRIM_TO = 0.8
+
+# subdirectory of the per-invocation counter files
+_STATS_DIR = 'stats'
+
+
+def configure(config, cache_dir, max_size, toolchain):
+    """Enables the cache for the %ldc invocations routed through this script or objcachedaemon.py."""
+    config.environment[CACHE_DIR_VARIABLE] = cache_dir
+    config.environment[TOOLCHAIN_VARIABLE] = toolchain
+    if not os.path.isdir(os.path.join(cache_dir, _STATS_DIR)):
+        os.makedirs(os.path.join(cache_dir, _STATS_DIR))
+    collect_stats(cache_dir, max_size)
+
+
+def wrap_substitution(config):
+    """Routes the %ldc substitution of 'config' through this script."""
+    wrapper = '"%s" "%s" --' % (sys.executable, os.path.abspath(__file__))
+    config.substitutions = [(p, wrapper + ' ' + v if p == '%ldc' else v) for p, v in config.substitutions]
+
+
+def output_of(args):
+    """The output file of a cacheable invocation, else None."""
+    if '-c' not in args or sum(1 for a in args if a in _OUTPUT_FLAGS) > 1:
+        return None
+    output = None
+    for i, a in enumerate(args):
+        if a.startswith('@') or a.startswith(_UNCACHEABLE_PREFIXES):
+            return None
+        if a.startswith('-of'):
+            if output is not None:
+                return None
+            output = a[3:].lstrip('=') or (args[i + 1] if i + 1 < len(args) else None)
+    return output
+
+
+def file_stamp(path):
+    try:
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+    except OSError:
+        return None
+
+
+def hash_file(path, hashes=None):
+    """The digest of a file's contents, None if it is no file. 'hashes' memoizes them by path and stamp."""
+    if not os.path.isfile(path):
+        return None
+    stamp = file_stamp(path)
+    if hashes is not None and path in hashes and hashes[path][0] == stamp:
+        return hashes[path][1]
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).digest()
+    if hashes is not None:
+        hashes[path] = (stamp, digest)
+    return digest
+
+
+def invocation_key(compiler, args, output, cwd, env, hashes=None):
+    hasher = hashlib.sha256()
+    hasher.update(env.get(TOOLCHAIN_VARIABLE, compiler).encode() + b'\0')
+    hasher.update(cwd.encode() + b'\0')
+    hasher.update(env.get('DFLAGS', '').encode() + b'\0')
+    for a in args:
+        if a in ('-of', '-of=' + output, '-of' + output, output):
+            continue
+        hasher.update(a.encode() + b'\0')
+        # contents of files named on the command line: sources, -fsanitize-blacklist=<file>, ...
+        digest = hash_file(os.path.join(cwd, a.split('=', 1)[-1] if a.startswith('-') else a), hashes)
+        if digest is not None:
+            hasher.update(digest)
+    return hasher.hexdigest()
+
+
+def read_makedeps(path):
+    """The dependencies listed in a Makefile-style dependency file."""
+    with open(path) as f:
+        text = f.read().replace('\\\n', ' ')
+    deps = []
+    for line in text.splitlines():
+        if ':' not in line:
+            continue
+        # split at the rule's colon, not at a drive letter
+        rule = line.split(': ', 1)[-1] if ': ' in line else line.split(':', 1)[-1]
+        token = ''
+        for part in rule.split(' '):
+            if part.endswith('\\'):
+                token += part[:-1] + ' '
+                continue
+            token += part
+            if token:
+                deps.append(token)
+            token = ''
+    return deps
+
+
+@contextlib.contextmanager
+def locked(cache_dir):
+    with open(os.path.join(cache_dir, 'lock'), 'a+') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def count(cache_dir, **increments):
+    """Writes the counters of one invocation to a new file in the stats directory, read by collect_stats."""
+    stats_dir = os.path.join(cache_dir, _STATS_DIR)
+    try:
+        fd, tmp = tempfile.mkstemp(dir=stats_dir, prefix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(increments, f)
+        os.rename(tmp, os.path.join(stats_dir, uuid.uuid4().hex + '.json'))
+    except (IOError, OSError):
+        pass  # statistics are best effort
+
+
+def collect_stats(cache_dir, max_size=None):
+    """
+    Adds the counters of the invocations since the last call to stats.json and returns
+    the totals. Evicts old entries if the cache grew bigger than 'max_size' bytes.
+    """
+    stats_file = os.path.join(cache_dir, 'stats.json')
+    stats_dir = os.path.join(cache_dir, _STATS_DIR)
+    if not os.path.isdir(cache_dir):
+        return {}
+    with locked(cache_dir):
+        try:
+            with open(stats_file) as f:
+                stats = json.load(f)
+        except (IOError, OSError, ValueError):
+            stats = {}
+        for name in os.listdir(stats_dir) if os.path.isdir(stats_dir) else []:
+            if not name.endswith('.json'):
+                continue
+            path = os.path.join(stats_dir, name)
+            try:
+                with open(path) as f:
+                    increments = json.load(f)
+                os.remove(path)
+            except (IOError, OSError, ValueError):
+                continue
+            for counter, value in increments.items():
+                stats[counter] = stats.get(counter, 0) + value
+        if max_size is not None and stats.get('size', 0) > max_size:
+            stats['size'] = evict(cache_dir, int(max_size * _TRIM_TO))
+        with open(stats_file, 'w') as f:
+            json.dump(stats, f)
+    return stats
+
+
+def entry_size(entry):
+    return sum(os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry))
+
+
+def evict(cache_dir, target_size):
+    """Removes the least recently used entries until the cache is at most 'target_size' bytes, returns its size."""
+    entries = []
+    for prefix in os.listdir(cache_dir):
+        prefix_dir = os.path.join(cache_dir, prefix)
+        if len(prefix) != 2 or not os.path.isdir(prefix_dir):
+            continue
+        for key in os.listdir(prefix_dir):
+            entry = os.path.join(prefix_dir, key)
+            try:
+                # hits touch the manifest
+                entries.append((os.path.getmtime(os.path.join(entry, 'manifest.json')), entry_size(entry), entry))
+            except OSError:
+                continue  # entry being replaced
+    size = sum(s for _, s, _ in entries)
+    for _, entry_bytes, entry in sorted(entries):
+        if size <= target_size:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        size -= entry_bytes
+    return size
+
+
+def lookup(entry):
+    """The manifest of a valid entry, None if missing or an import changed since."""
+    try:
+        with open(os.path.join(entry, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    for path, stamp in manifest['deps']:
+        if file_stamp(path) != stamp:
+            return None
+    return manifest
+
+
+def copy_output(source, destination):
+    directory = os.path.dirname(os.path.abspath(destination))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp')
+    os.close(fd)
+    shutil.copyfile(source, tmp)
+    os.replace(tmp, destination)
+
+
+def store(cache_dir, entry, output, manifest):
+    """Moves a new entry into place, returns its size or 0 if another worker was faster."""
+    parent = os.path.dirname(entry)
+    if not os.path.isdir(parent):
+        try:
+            os.makedirs(parent)
+        except OSError:
+            pass
+    tmp = tempfile.mkdtemp(dir=parent, prefix='.tmp')
+    try:
+        shutil.copyfile(output, os.path.join(tmp, 'output'))
+        with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+        size = entry_size(tmp)
+        if os.path.isdir(entry):
+            # stale entry, an import changed; move it aside first, renames onto directories fail
+            stale = tempfile.mkdtemp(dir=parent, prefix='.stale')
+            try:
+                os.rename(entry, os.path.join(stale, 'entry'))
+            except OSError:
+                pass
+            shutil.rmtree(stale, ignore_errors=True)
+        os.rename(tmp, entry)
+        return size
+    except OSError:
+        return 0
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def run(command, cwd, env):
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    return process.returncode, stdout, stderr
+
+
+def compile_cached(compiler, args, cwd, env, hashes=None):
+    """
+    Runs 'compiler args' in 'cwd' with the environment 'env', or replays it from the
+    cache named by the environment. Returns the exit code and the output on stdout
+    and stderr as bytes.
+    """
+    cache_dir = env.get(CACHE_DIR_VARIABLE)
+    output = output_of(args) if cache_dir else None
+    if output is None:
+        if cache_dir:
+            count(cache_dir, uncacheable=1)
+        return run([compiler] + args, cwd, env)
+
+    key = invocation_key(compiler, args, output, cwd, env, hashes)
+    entry = os.path.join(cache_dir, key[:2], key)
+    output = os.path.join(cwd, output)
+
+    manifest = lookup(entry)
+    if manifest is not None:
+        try:
+            copy_output(os.path.join(entry, 'output'), output)
+            os.utime(os.path.join(entry, 'manifest.json'), None)
+        except (IOError, OSError):
+            manifest = None  # evicted meanwhile
+    if manifest is not None:
+        count(cache_dir, hits=1)
+        return 0, to_bytes(manifest['stdout']), to_bytes(manifest['stderr'])
+
+    fd, deps_file = tempfile.mkstemp(suffix='.deps')
+    os.close(fd)
+    try:
+        returncode, stdout, stderr = run([compiler] + args + ['-makedeps=' + deps_file], cwd, env)
+        size = 0
+        if returncode == 0 and os.path.isfile(output):
+            deps = sorted(set(os.path.join(cwd, d) for d in read_makedeps(deps_file)))
+            manifest = {'deps': [[d, file_stamp(d)] for d in deps], 'stdout': to_text(stdout), 'stderr': to_text(stderr)}
+            size = store(cache_dir, entry, output, manifest)
+        count(cache_dir, misses=1, size=size)
+        return returncode, stdout, stderr
+    finally:
+        os.remove(deps_file)
+
+
+# compiler output in JSON, lossless for any bytes
+def to_text(data):
+    return data.decode('utf-8', 'surrogateescape')
+
+
+def to_bytes(text):
+    return text.encode('utf-8', 'surrogateescape')
+
+
+def exit_with(returncode, stdout, stderr):
+    """Writes the output of a compilation and exits like it, re-raising the signal it died of, if any."""
+    sys.stdout.flush()
+    getattr(sys.stdout, 'buffer', sys.stdout).write(stdout)
+    sys.stdout.flush()
+    getattr(sys.stderr, 'buffer', sys.stderr).write(stderr)
+    sys.stderr.flush()
+    if returncode < 0:
+        # die the same way, for e.g. 'not --crash'
+        signal.signal(-returncode, signal.SIG_DFL)
+        os.kill(os.getpid(), -returncode)
+    sys.exit(returncode)
+
+
+def main(argv):
+    exit_with(*compile_cached(argv[1], argv[2:], os.getcwd(), os.environ))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
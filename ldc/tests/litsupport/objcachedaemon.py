@@ -0,0 +1,91 @@
+# Object cache daemon, enabled by runlit.py --object-cache-daemon next to
+# --object-cache.
+#
+# It is not a compile server: ldc2 has no resident mode, so every compilation
+# still runs a fresh ldc2 that parses druntime and Phobos and initializes LLVM
+# anew. The daemon only keeps the object cache's (see objcache.py) digests of
+# the sources, inputs and imports in memory, keyed by path and stamp, so they
+# are hashed once per run instead of by every %ldc invocation.
+#
+# runlit.py starts the daemon before lit and stops it afterwards. %ldc is
+# routed through the client mode of this script, which sends the command
+# line, working directory and environment over a Unix socket and replays the
+# compiler's output and exit code. If the daemon cannot be reached, e.g. when
+# lit is run directly or the daemon died, the client uses the object cache by
+# itself.
+#
+# Usage: objcachedaemon.py --serve <socket>
+#        objcachedaemon.py <socket> -- <ldc2> [args...]
+
+from __future__ import print_function
+
+import json
+import os
+import socket
+import sys
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from litsupport import objcache
+
+# Unix sockets are missing on Windows (before Python 3.9 at least)
+SUPPORTED = hasattr(socket, 'AF_UNIX')
+
+if SUPPORTED:
+    import socketserver
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline().decode())
+            try:
+                returncode, stdout, stderr = objcache.compile_cached(
+                    request['compiler'], request['args'], request['cwd'], request['env'], self.server.hashes)
+                reply = {'returncode': returncode, 'stdout': objcache.to_text(stdout), 'stderr': objcache.to_text(stderr)}
+            except (IOError, OSError) as e:
+                reply = {'error': str(e)}  # the client retries by itself and reports it
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+    class ObjectCacheDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def __init__(self, address):
+            socketserver.UnixStreamServer.__init__(self, address, Handler)
+            self.hashes = {}  # path -> (stamp, digest), see objcache.hash_file
+
+
+def wrap_substitution(config, address):
+    """Routes the %ldc substitution of 'config' through the client of the daemon at 'address'."""
+    wrapper = '"%s" "%s" "%s" --' % (sys.executable, os.path.abspath(__file__), address)
+    config.substitutions = [(p, wrapper + ' ' + v if p == '%ldc' else v) for p, v in config.substitutions]
+
+
+def request(address, compiler, args):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(address)
+        client.sendall(json.dumps({'compiler': compiler, 'args': args, 'cwd': os.getcwd(),
+                                   'env': dict(os.environ)}).encode() + b'\n')
+        return json.loads(client.makefile('rb').readline().decode())
+    finally:
+        client.close()
+
+
+def main(argv):
+    if argv[0] == '--serve':
+        ObjectCacheDaemon(argv[1]).serve_forever()
+        return
+
+    address, compiler, args = argv[0], argv[2], argv[3:]
+    # the daemon cannot pass on stdin
+    if SUPPORTED and '-' not in args:
+        try:
+            reply = request(address, compiler, args)
+        except (IOError, OSError, ValueError):
+            reply = {'error': 'daemon unavailable'}
+        if 'error' not in reply:
+            objcache.exit_with(reply['returncode'], objcache.to_bytes(reply['stdout']), objcache.to_bytes(reply['stderr']))
+    objcache.main(argv[1:])
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,56 @@
+# Memoization of the feature probes in lit.site.cfg.
+#
+# Probing tools like gdb or wasm-ld spawns processes each time lit loads its
+# configuration, which dominates the startup when running a single test. The
+# results are kept in a JSON file, each stamped with the paths, mtimes and
+# sizes of the files the probe depends on; a probe is rerun as soon as any of
+# them changes, appears or disappears.
+
+import json
+import os
+
+from litsupport.timing import write_json
+
+
+def file_stamp(path):
+    if path:
+        try:
+            st = os.stat(path)
+            return [path, st.st_mtime_ns, st.st_size]
+        except OSError:
+            pass
+    return [path, None, None]
+
+
+class ProbeCache(object):
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def get(self, name, files, probe, extra=None):
+        """
+        The result of 'probe()', which must be JSON serializable, rerun only if the
+        stamps of 'files' or the 'extra' value changed since it was cached.
+        """
+        stamp = [file_stamp(f) for f in files] + [extra]
+        entry = self.entries.get(name)
+        if entry is not None and entry['stamp'] == stamp:
+            return entry['value']
+        value = probe()
+        self.entries[name] = {'stamp': stamp, 'value': value}
+        self.dirty = True
+        return value
+
+    def save(self):
+        if self.dirty:
+            try:
+                write_json(self.path, self.entries)
+            except (IOError, OSError):
+                pass  # e.g. read-only build dir, probe again next time
+            self.dirty = False
@@ -0,0 +1,138 @@
+# Content-addressed cache of passing lit test results.
+#
+# A test's key combines the test source, the auxiliary files it references
+# (its 'inputs' directory, other files referenced via %S/%p and the
+# lit.local.cfg files on its path), the digest of the compiler and runtime
+# libraries and the active lit features and substitutions. A passing test is
+# recorded under its key; as long as none of these change, runlit.py reports
+# it as a cached pass instead of running it again.
+
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+# Files making up the toolchain next to the %ldc binary
+RUNTIME_LIB_PATTERNS = ['*druntime-ldc*', '*phobos2-ldc*', '*ldc-jit*']
+
+_file_reference = re.compile(r'%[Sp][/\\]([^\s\'";:,]+)')
+
+
+def hash_file(path, hasher):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(chunk)
+
+
+def hash_tree(path, hasher):
+    """Hashes the names and contents of all files below 'path', in a stable order."""
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            hasher.update(os.path.relpath(file_path, path).replace(os.sep, '/').encode() + b'\0')
+            hash_file(file_path, hasher)
+
+
+def toolchain_files(config):
+    """The compiler, its config file and the runtime libraries tests link against."""
+    files = [config.ldc2_bin, os.path.join(config.ldc2_bin_dir, 'ldc2.conf')]
+    for pattern in RUNTIME_LIB_PATTERNS:
+        files += sorted(glob.glob(os.path.join(config.ldc2_lib_dir, pattern)))
+    return [f for f in files if os.path.isfile(f)]
+
+
+def toolchain_digest(files):
+    hasher = hashlib.sha256()
+    for path in files:
+        hasher.update(os.path.basename(path).encode() + b'\0')
+        hash_file(path, hasher)
+    return hasher.hexdigest()
+
+
+class ResultCache(object):
+    def __init__(self, cache_dir, toolchain):
+        self.cache_dir = cache_dir
+        self.toolchain = toolchain
+        # per process memo of the digests of shared dependencies (inputs dirs, lit.local.cfg)
+        self._dependency_digests = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_dependency_digests'] = {}
+        return state
+
+    def _dependency_digest(self, path):
+        digest = self._dependency_digests.get(path)
+        if digest is None:
+            hasher = hashlib.sha256()
+            if os.path.isdir(path):
+                hash_tree(path, hasher)
+            elif os.path.isfile(path):
+                hash_file(path, hasher)
+            digest = hasher.hexdigest()
+            self._dependency_digests[path] = digest
+        return digest
+
+    def dependencies(self, test, source):
+        """The auxiliary files and directories 'test' depends on besides its own source."""
+        test_dir = os.path.dirname(test.getSourcePath())
+        deps = set()
+        if 'inputs' in source:
+            deps.add(os.path.join(test_dir, 'inputs'))
+        for ref in _file_reference.findall(source):
+            path = os.path.normpath(os.path.join(test_dir, ref))
+            # a file inside an inputs directory may import any of its neighbours
+            parts = os.path.relpath(path, test_dir).split(os.sep)
+            if 'inputs' in parts:
+                path = os.path.join(test_dir, *parts[:parts.index('inputs') + 1])
+            deps.add(path)
+        suite_root = test.suite.source_root
+        for i in range(len(test.path_in_suite)):
+            deps.add(os.path.join(suite_root, *(test.path_in_suite[:i] + ('lit.local.cfg',))))
+        return sorted(deps)
+
+    def key(self, test):
+        with open(test.getSourcePath(), 'rb') as f:
+            source = f.read()
+        text = source.decode('utf-8', 'replace')
+
+        hasher = hashlib.sha256()
+        hasher.update(self.toolchain.encode() + b'\0')
+        hasher.update('/'.join(test.path_in_suite).encode() + b'\0')
+        hasher.update(source + b'\0')
+        for dep in self.dependencies(test, text):
+            if os.path.exists(dep):
+                hasher.update(dep.encode() + b'\0' + self._dependency_digest(dep).encode() + b'\0')
+        for feature in sorted(test.config.available_features):
+            hasher.update(feature.encode() + b'\0')
+        for pattern, replacement in test.config.substitutions:
+            hasher.update(repr((pattern, replacement)).encode() + b'\0')
+        return hasher.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def lookup(self, key):
+        """Returns the recorded entry of a passing run, or None."""
+        try:
+            with open(self._entry_path(key)) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def store(self, key, test, elapsed):
+        path = self._entry_path(key)
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                pass  # created by another worker
+        # write to a temporary file and rename it, concurrent workers never see partial entries
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'test': test.getFullName(), 'elapsed': elapsed}, f)
+        os.replace(tmp, path)
@@ -0,0 +1,103 @@
+# Splitting the test suite into shards run on different machines, and merging
+# their results again.
+#
+# Shards are balanced with a plan file mapping each test to a shard, made by
+# runlit.py --write-shard-plan from the timing database (see timing.py) with
+# a longest-processing-time-first assignment. All machines must use the same
+# plan, so it is meant to be distributed along with the build (or checked in).
+# Tests missing from the plan, i.e. added after it was made, and all tests if
+# there is no plan, are assigned by a hash of their name, so the assignment
+# never depends on the local timing database or on which other tests exist.
+
+import hashlib
+import json
+from xml.sax.saxutils import quoteattr
+
+from litsupport.timing import write_json
+
+
+def hash_shard(name, count):
+    return int(hashlib.md5(name.encode()).hexdigest(), 16) % count
+
+
+def make_plan(tests, db, count):
+    """Assigns 'tests' to 'count' shards, longest first to the shard with the least expected time."""
+    known = sorted(e for e in (db.estimate(name) for name in tests) if e is not None)
+    default = known[len(known) // 2] if known else 1.0
+    estimates = sorted(((db.estimate(name, default), name) for name in tests), key=lambda x: (-x[0], x[1]))
+
+    loads = [0.0] * count
+    shards = {}
+    for estimate, name in estimates:
+        shard = min(range(count), key=lambda i: (loads[i], i))
+        shards[name] = shard
+        loads[shard] += estimate
+    return {'count': count, 'shards': shards, 'expected_times': loads}
+
+
+def read_plan(path, count):
+    """The test -> shard mapping of the plan at 'path', None if there is none for 'count' shards."""
+    try:
+        with open(path) as f:
+            plan = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    return plan['shards'] if plan.get('count') == count else None
+
+
+def write_plan(path, plan):
+    write_json(path, plan)
+
+
+def select_shard(tests, index, count, plan):
+    """The subset of 'tests' run by shard 'index' (0-based) of 'count'."""
+    plan = plan or {}
+    return [name for name in tests if plan.get(name, hash_shard(name, count)) == index]
+
+
+def merge_reports(paths):
+    """Merges the lit JSON reports of several shards into one."""
+    merged = {'tests': [], 'elapsed': 0.0}
+    for path in paths:
+        with open(path) as f:
+            report = json.load(f)
+        merged['tests'] += report.pop('tests', [])
+        merged['elapsed'] = max(merged['elapsed'], report.pop('elapsed', 0.0) or 0.0)
+        report.pop('shard', None)
+        merged.update(report)
+    merged['tests'].sort(key=lambda t: t['name'])
+    return merged
+
+
+FAILURE_CODES = ('FAIL', 'XPASS', 'UNRESOLVED', 'TIMEOUT')
+SKIPPED_CODES = ('UNSUPPORTED', 'SKIPPED', 'EXCLUDED')
+
+
+def write_junit(path, report):
+    """Writes a lit JSON report in the JUnit XML format of lit's --xunit-xml-output."""
+    suites = {}
+    for t in report['tests']:
+        suite, _, test_path = t['name'].partition(' :: ')
+        suites.setdefault(suite, []).append((test_path, t))
+
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites time="%.2f">\n' % report.get('elapsed', 0.0))
+        for suite in sorted(suites):
+            tests = suites[suite]
+            failures = sum(1 for _, t in tests if t['code'] in FAILURE_CODES)
+            skipped = sum(1 for _, t in tests if t['code'] in SKIPPED_CODES)
+            f.write('<testsuite name=%s tests="%d" failures="%d" skipped="%d">\n' % (
+                quoteattr(suite), len(tests), failures, skipped))
+            for test_path, t in tests:
+                directory, _, name = test_path.rpartition('/')
+                classname = suite.replace('.', '-') + ('.' + directory.replace('/', '.') if directory else '')
+                f.write('<testcase classname=%s name=%s time="%.2f"' % (quoteattr(classname), quoteattr(name), t.get('elapsed') or 0.0))
+                if t['code'] in FAILURE_CODES:
+                    output = (t.get('output') or '').replace(']]>', ']]]]><![CDATA[>')
+                    f.write('>\n\t<failure><![CDATA[%s]]></failure>\n</testcase>\n' % output)
+                elif t['code'] in SKIPPED_CODES:
+                    f.write('>\n\t<skipped message=%s/>\n</testcase>\n' % quoteattr(t['code']))
+                else:
+                    f.write('/>\n')
+            f.write('</testsuite>\n')
+        f.write('</testsuites>\n')
@@ -0,0 +1,2 @@
+# Unit tests of the litsupport modules, run by CMake's litsupport-tests or from ldc/tests with:
+#   python3 -m unittest discover -s litsupport/tests -t .
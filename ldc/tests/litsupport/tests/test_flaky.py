@@ -0,0 +1,82 @@
+# Tests of the handling of flaky tests and of the retry budget, see flaky.py.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from litsupport import flaky
+from litsupport.timing import TimingDB
+
+
+def report(**codes):
+    return [{'name': 'LDC :: %s.d' % name, 'code': code, 'output': 'output of ' + name} for name, code in sorted(codes.items())]
+
+
+class RetryBudgetTest(unittest.TestCase):
+    def test_within_budget(self):
+        failed, within_budget = flaky.rerun_candidates(report(a='FAIL', b='PASS', c='TIMEOUT'), 2)
+        self.assertEqual(failed, ['LDC :: a.d', 'LDC :: c.d'])
+        self.assertTrue(within_budget)
+
+    def test_over_budget(self):
+        failed, within_budget = flaky.rerun_candidates(report(a='FAIL', b='FAIL', c='TIMEOUT'), 2)
+        self.assertEqual(len(failed), 3)
+        self.assertFalse(within_budget)
+
+    def test_only_failures_count(self):
+        tests = report(a='FAIL', b='XPASS', c='UNRESOLVED', d='UNSUPPORTED', e='FLAKYPASS', f='XFAIL')
+        self.assertEqual(flaky.rerun_candidates(tests, 1), (['LDC :: a.d'], True))
+        self.assertEqual(flaky.rerun_candidates(report(a='PASS'), 0), ([], True))
+
+    def test_apply_rerun(self):
+        tests = report(a='FAIL', b='FAIL', c='PASS', d='XPASS')
+        passed = flaky.apply_rerun(tests, report(a='PASS', b='FAIL', d='PASS'))
+        self.assertEqual(passed, set(['LDC :: a.d', 'LDC :: d.d']))
+        self.assertEqual([t['code'] for t in tests], ['FLAKYPASS', 'FAIL', 'PASS', 'XPASS'])
+        self.assertTrue(tests[0]['output'].endswith('output of a'))
+        self.assertEqual(tests[1]['output'], 'output of b')
+
+
+class FlakinessTest(unittest.TestCase):
+    def test_flakiness(self):
+        self.assertEqual(flaky.flakiness(''), 0.0)
+        self.assertEqual(flaky.flakiness('PPPP'), 0.0)
+        self.assertEqual(flaky.flakiness('PRPP'), 0.25)
+        self.assertEqual(flaky.flakiness('PFPP'), 0.25)
+        # a failure that persisted is a broken test, not a flaky one
+        self.assertEqual(flaky.flakiness('PPFF'), 0.0)
+        self.assertEqual(flaky.flakiness('FFFF'), 0.0)
+
+    def test_pass_rate(self):
+        self.assertEqual(flaky.pass_rate(''), 1.0)
+        self.assertEqual(flaky.pass_rate('PRFF'), 0.5)
+
+    def test_flaky_tests_from_history(self):
+        directory = tempfile.mkdtemp()
+        try:
+            db = TimingDB(os.path.join(directory, 'timing.json'))
+            runs = zip(['PASS', 'FAIL', 'PASS', 'FLAKYPASS', 'PASS', 'PASS'],
+                       ['PASS', 'PASS', 'PASS', 'FAIL', 'FAIL', 'TIMEOUT'])
+            for flaky_code, broken_code in runs:
+                db.update(report(flaky=flaky_code, broken=broken_code, stable='PASS', unsupported='UNSUPPORTED'))
+            self.assertEqual(db.tests['LDC :: flaky.d']['history'], 'PFPRPP')
+            self.assertEqual(db.tests['LDC :: broken.d']['history'], 'PPPFFF')
+            self.assertNotIn('LDC :: unsupported.d', db.tests)
+            self.assertEqual(flaky.flaky_tests(db, 0.2), ['LDC :: flaky.d'])
+            self.assertEqual(flaky.flaky_tests(db, 0.5), [])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_list_round_trip(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'flaky.txt')
+            flaky.write_list(path, ['LDC :: a.d', 'LDC :: dir with spaces/b.d'])
+            self.assertEqual(flaky.read_list(path), set(['LDC :: a.d', 'LDC :: dir with spaces/b.d']))
+        finally:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
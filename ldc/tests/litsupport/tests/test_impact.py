@@ -0,0 +1,98 @@
+# Tests of the change-impact test selection of runlit.py --changed-since, see impact.py.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from litsupport import impact
+
+TESTS_DIR = 'tests'
+
+SOURCES = {
+    'codegen/a.d': '// RUN: %ldc -c %s -I%S/inputs\nimport helper;\n',
+    'codegen/b.d': '// RUN: %ldc -run %s\n',
+    'debuginfo/c.d': '// RUN: %ldc -g -c %s\n',
+    'tools/d.d': '// RUN: %prunecache --help\n',
+    'dynamiccompile/e.d': '// RUN: %ldc -enable-dynamic-compile -run %s\n',
+    'plugins/f.d': '// RUN: %ldc -c %s\n',
+}
+
+
+class AffectedTestsTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for path, text in SOURCES.items():
+            path = os.path.join(self.root, TESTS_DIR, path)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write(text)
+        self.tests = sorted('LDC :: ' + path for path in SOURCES)
+        self.map = impact.ImpactMap(os.path.join(self.root, 'impact.json'))
+        self.map.tests = {
+            'LDC :: codegen/a.d': {'deps': ['druntime/src/object.d', 'tests/codegen/inputs/helper.d'], 'links': False},
+            'LDC :: codegen/b.d': {'deps': ['druntime/src/object.d', 'phobos/std/stdio.d'], 'links': True},
+            'LDC :: debuginfo/c.d': {'deps': ['druntime/src/object.d'], 'links': False},
+            'LDC :: tools/d.d': {'deps': [], 'links': False},
+            'LDC :: dynamiccompile/e.d': {'deps': ['druntime/src/object.d'], 'links': True},
+        }
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def affected(self, *changed):
+        names = impact.affected_tests(list(changed), self.tests, self.map, self.root, TESTS_DIR)
+        return sorted(name.split(' :: ', 1)[1] for name in names)
+
+    def test_changed_test(self):
+        self.assertEqual(self.affected('tests/codegen/b.d'), ['codegen/b.d'])
+
+    def test_lit_local_cfg(self):
+        self.assertEqual(self.affected('tests/codegen/lit.local.cfg'), ['codegen/a.d', 'codegen/b.d'])
+
+    def test_suite_files_affect_all(self):
+        all_tests = sorted(SOURCES)
+        self.assertEqual(self.affected('tests/lit.site.cfg.in'), all_tests)
+        self.assertEqual(self.affected('tests/litsupport/objcache.py'), all_tests)
+
+    def test_inputs_file(self):
+        # read by a.d, and plugins/f.d is missing from the map but does not mention it
+        self.assertEqual(self.affected('tests/codegen/inputs/helper.d'), ['codegen/a.d'])
+
+    def test_runtime_module(self):
+        # readers, linkers and tests missing from the map
+        self.assertEqual(self.affected('phobos/std/stdio.d'), ['codegen/b.d', 'dynamiccompile/e.d', 'plugins/f.d'])
+        self.assertEqual(self.affected('druntime/src/object.d'),
+                         ['codegen/a.d', 'codegen/b.d', 'debuginfo/c.d', 'dynamiccompile/e.d', 'plugins/f.d'])
+
+    def test_compiler_rules(self):
+        self.assertEqual(self.affected('ldc/gen/toir.cpp'), ['codegen/a.d', 'codegen/b.d', 'debuginfo/c.d', 'dynamiccompile/e.d'])
+        self.assertEqual(self.affected('ldc/runtime/jit-rt/cpp-so/jit.cpp'), ['dynamiccompile/e.d'])
+        self.assertEqual(self.affected('ldc/driver/main.cpp'), sorted(SOURCES))
+
+    def test_tools(self):
+        self.assertEqual(self.affected('ldc/tools/ldc-prune-cache.d'), ['tools/d.d'])
+        self.assertEqual(self.affected('ldc/tools/other.d'), ['tools/d.d'])
+
+    def test_ignored_and_unknown_files(self):
+        self.assertEqual(self.affected('README.md', 'ldc/docs/LICENSE.txt', 'tests/dmd/runnable/test1.d'), [])
+        self.assertEqual(self.affected('druntime/Makefile'), sorted(SOURCES))
+        self.assertEqual(self.affected('some/new/file.txt'), sorted(SOURCES))
+
+    def test_update(self):
+        report = [
+            {'name': 'LDC :: plugins/f.d', 'code': 'PASS', 'metrics': {'impact': [
+                {'deps': [os.path.join(self.root, 'druntime', 'src', 'object.d'), '/usr/include/outside.h'], 'links': False},
+                {'deps': [os.path.join(self.root, 'phobos', 'std', 'stdio.d')], 'links': True}]}},
+            {'name': 'LDC :: codegen/b.d', 'code': 'UNSUPPORTED', 'metrics': {'impact': []}},
+            {'name': 'LDC :: debuginfo/c.d', 'code': 'PASS', 'metrics': {}},
+        ]
+        self.assertEqual(self.map.update(report, self.root), 1)
+        self.assertEqual(self.map.tests['LDC :: plugins/f.d'],
+                         {'deps': ['druntime/src/object.d', 'phobos/std/stdio.d'], 'links': True})
+        self.assertEqual(self.map.tests['LDC :: codegen/b.d']['links'], True)
+
+
+if __name__ == '__main__':
+    unittest.main()
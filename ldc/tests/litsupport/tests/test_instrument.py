@@ -0,0 +1,58 @@
+# Tests of the per-command report of runlit.py --instrument, see instrument.py.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from litsupport import instrument
+
+
+def command(tool, wall, cpu=None, rss=None):
+    return {'tool': tool, 'command': tool, 'wall': wall, 'cpu': cpu, 'rss': rss, 'exit_code': 0}
+
+
+class InstrumentTest(unittest.TestCase):
+    def test_category(self):
+        self.assertEqual(instrument.category('ldc', ['-c', 'foo.d']), 'ldc compile')
+        self.assertEqual(instrument.category('ldc', ['-output-ll', 'foo.d']), 'ldc compile')
+        self.assertEqual(instrument.category('ldc', ['-lib', 'foo.d']), 'ldc compile')
+        self.assertEqual(instrument.category('ldc', ['foo.d', '-of=foo']), 'ldc compile+link')
+        self.assertEqual(instrument.category('FileCheck', ['-c']), 'FileCheck')
+
+    def test_wrap_substitutions(self):
+        class Config(object):
+            substitutions = [('%ldc', '/bin/ldc2'), ('%runtimedir', '/lib')]
+        instrument.wrap_substitutions(Config)
+        self.assertTrue(Config.substitutions[0][1].endswith(' ldc -- /bin/ldc2'))
+        self.assertEqual(Config.substitutions[1], ('%runtimedir', '/lib'))
+        self.assertIn('FileCheck', Config.substitutions[2][0])
+
+    def test_read_log_skips_cut_records(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'log')
+            with open(path, 'w') as f:
+                f.write('{"tool": "ldc compile", "wall": 1.0}\n{"tool": "FileCh')
+            self.assertEqual(instrument.read_log(path), [{'tool': 'ldc compile', 'wall': 1.0}])
+            self.assertEqual(instrument.read_log(os.path.join(directory, 'missing')), [])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_make_report(self):
+        results = [
+            {'name': 'LDC :: a.d', 'code': 'PASS', 'elapsed': 3.0, 'metrics': {'commands': [
+                command('ldc compile', 1.0, 0.9, 100), command('FileCheck', 0.5, 0.4, 10)]}},
+            {'name': 'LDC :: b.d', 'code': 'FAIL', 'elapsed': 1.0, 'metrics': {'commands': [
+                command('ldc compile', 1.5, None, None)]}},
+            {'name': 'LDC :: c.d', 'code': 'PASS', 'elapsed': 0.1, 'metrics': {}},
+        ]
+        report = instrument.make_report(results)
+        self.assertEqual([(t['name'], t['untracked']) for t in report['tests']], [('LDC :: a.d', 1.5), ('LDC :: b.d', 0.0)])
+        self.assertEqual(report['tools']['ldc compile'], {'count': 2, 'wall': 2.5, 'cpu': 0.9, 'max_rss': 100})
+        self.assertEqual(report['tools']['FileCheck']['count'], 1)
+        self.assertEqual(report['tools']['other (executables, shell builtins)']['wall'], 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
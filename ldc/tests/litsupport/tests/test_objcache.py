@@ -0,0 +1,147 @@
+# Tests of the object cache of runlit.py --object-cache, see objcache.py.
+
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+from litsupport import objcache
+
+# stands in for ldc2: writes the source's contents to the -of file and its imports to the -makedeps file
+FAKE_COMPILER = '''#!%s
+import sys
+args = sys.argv[1:]
+output = [a[4:] for a in args if a.startswith('-of=')][0]
+source = [a for a in args if a.endswith('.d')][0]
+with open(source) as f:
+    text = f.read()
+with open(output, 'w') as f:
+    f.write(text)
+for a in args:
+    if a.startswith('-makedeps='):
+        with open(a[len('-makedeps='):], 'w') as f:
+            f.write(output + ': ' + source + ' ' + ' '.join(l.split()[1].rstrip(';') + '.d' for l in text.splitlines() if l.startswith('import')))
+sys.stdout.write('compiled ' + source)
+'''
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+class ObjectCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.dir, 'cache')
+        self.cwd = os.path.join(self.dir, 'work')
+        os.makedirs(os.path.join(self.cache_dir, 'stats'))
+        os.makedirs(self.cwd)
+        write(os.path.join(self.cwd, 'foo.d'), 'import bar;\n')
+        write(os.path.join(self.cwd, 'bar.d'), 'module bar;\n')
+        self.env = {objcache.CACHE_DIR_VARIABLE: self.cache_dir, objcache.TOOLCHAIN_VARIABLE: 'toolchain'}
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def key(self, args, env=None, cwd=None):
+        return objcache.invocation_key('ldc2', args, objcache.output_of(args), cwd or self.cwd, env or self.env)
+
+    def test_output_of(self):
+        self.assertEqual(objcache.output_of(['-c', 'foo.d', '-of=foo.o']), 'foo.o')
+        self.assertEqual(objcache.output_of(['-c', 'foo.d', '-of', 'foo.o']), 'foo.o')
+        self.assertIsNone(objcache.output_of(['foo.d', '-of=foo']))
+        self.assertIsNone(objcache.output_of(['-c', 'foo.d', '-of=foo.o', '-of=bar.o']))
+        self.assertIsNone(objcache.output_of(['-c', 'foo.d', '-of=foo.o', '-output-ll', '-output-o']))
+        for flag in ('-deps=foo.deps', '-Jinputs', '-od=out', '-run', '@args.rsp'):
+            self.assertIsNone(objcache.output_of(['-c', 'foo.d', '-of=foo.o', flag]), flag)
+
+    def test_key_ignores_output_path(self):
+        self.assertEqual(self.key(['-c', 'foo.d', '-of=foo.o']), self.key(['-c', 'foo.d', '-of=other.o']))
+        self.assertEqual(self.key(['-c', 'foo.d', '-of', 'foo.o']), self.key(['-c', 'foo.d', '-of', 'other.o']))
+
+    def test_key_invalidation(self):
+        args = ['-c', 'foo.d', '-of=foo.o']
+        before = self.key(args)
+        self.assertEqual(self.key(args), before)
+        self.assertNotEqual(self.key(['-c', 'foo.d', '-O3', '-of=foo.o']), before)
+        self.assertNotEqual(self.key(args, env=dict(self.env, LDC_LIT_TOOLCHAIN='rebuilt')), before)
+        self.assertNotEqual(self.key(args, env=dict(self.env, DFLAGS='-O')), before)
+        other = os.path.join(self.dir, 'other')
+        shutil.copytree(self.cwd, other)
+        self.assertNotEqual(self.key(args, cwd=other), before)
+        write(os.path.join(self.cwd, 'foo.d'), 'import bar; int x;\n')
+        self.assertNotEqual(self.key(args), before)
+
+    def test_hash_file_memo_follows_changes(self):
+        path = os.path.join(self.cwd, 'foo.d')
+        hashes = {}
+        before = objcache.hash_file(path, hashes)
+        self.assertIn(path, hashes)
+        write(path, 'import bar; int longer;\n')
+        self.assertNotEqual(objcache.hash_file(path, hashes), before)
+        self.assertIsNone(objcache.hash_file(os.path.join(self.cwd, 'missing.d'), hashes))
+
+    def test_read_makedeps(self):
+        path = os.path.join(self.dir, 'deps')
+        write(path, 'foo.o: foo.d \\\n  dir\\ with\\ spaces/bar.d \\\n  C:/druntime/object.d\n')
+        self.assertEqual(objcache.read_makedeps(path), ['foo.d', 'dir with spaces/bar.d', 'C:/druntime/object.d'])
+
+    def test_collect_stats(self):
+        objcache.count(self.cache_dir, hits=1)
+        objcache.count(self.cache_dir, misses=1, size=10)
+        objcache.count(self.cache_dir, hits=1)
+        self.assertEqual(objcache.collect_stats(self.cache_dir), {'hits': 2, 'misses': 1, 'size': 10})
+        self.assertEqual(os.listdir(os.path.join(self.cache_dir, 'stats')), [])
+        objcache.count(self.cache_dir, uncacheable=1)
+        self.assertEqual(objcache.collect_stats(self.cache_dir), {'hits': 2, 'misses': 1, 'size': 10, 'uncacheable': 1})
+
+    def make_entry(self, key, size, mtime):
+        entry = os.path.join(self.cache_dir, key[:2], key)
+        os.makedirs(entry)
+        write(os.path.join(entry, 'output'), 'x' * size)
+        write(os.path.join(entry, 'manifest.json'), '{}')
+        os.utime(os.path.join(entry, 'manifest.json'), (mtime, mtime))
+        return entry
+
+    def test_evicts_least_recently_used(self):
+        entries = [self.make_entry('%02x' % i * 4, 98, 1000 + i) for i in range(5)]  # 100 bytes each
+        objcache.count(self.cache_dir, size=500)
+        stats = objcache.collect_stats(self.cache_dir, max_size=400)
+        self.assertEqual(stats['size'], 300)
+        self.assertEqual([os.path.isdir(e) for e in entries], [False, False, True, True, True])
+
+    @unittest.skipIf(os.name == 'nt', 'the fake compiler is a script with a #! line')
+    def test_compile_cached(self):
+        compiler = os.path.join(self.dir, 'ldc2')
+        write(compiler, FAKE_COMPILER % sys.executable)
+        os.chmod(compiler, os.stat(compiler).st_mode | stat.S_IEXEC)
+        args = ['-c', 'foo.d', '-of=foo.o']
+        output = os.path.join(self.cwd, 'foo.o')
+
+        def compile():
+            if os.path.exists(output):
+                os.remove(output)
+            result = objcache.compile_cached(compiler, args, self.cwd, self.env)
+            with open(output) as f, open(os.path.join(self.cwd, 'foo.d')) as source:
+                self.assertEqual(f.read(), source.read())
+            return result
+
+        self.assertEqual(compile(), (0, b'compiled foo.d', b''))
+        self.assertEqual(compile(), (0, b'compiled foo.d', b''))
+        stats = objcache.collect_stats(self.cache_dir)
+        self.assertEqual((stats['misses'], stats['hits']), (1, 1))
+
+        # an imported module is not on the command line, its manifest stamp invalidates the entry
+        write(os.path.join(self.cwd, 'bar.d'), 'module bar; int changed;\n')
+        compile()
+        self.assertEqual(objcache.collect_stats(self.cache_dir)['misses'], 2)
+        with open(os.path.join(self.cache_dir, 'stats.json')) as f:
+            self.assertEqual(json.load(f)['hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
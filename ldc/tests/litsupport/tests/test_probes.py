@@ -0,0 +1,63 @@
+# Tests of the memoized tool probes of lit.site.cfg, see probes.py.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from litsupport.probes import ProbeCache
+
+
+class ProbeCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'probes.json')
+        self.tool = os.path.join(self.dir, 'gdb')
+        with open(self.tool, 'w') as f:
+            f.write('gdb 12')
+        self.calls = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def probe(self):
+        self.calls += 1
+        return {'version': self.calls}
+
+    def get(self, extra=None):
+        cache = ProbeCache(self.path)
+        value = cache.get('gdb', [self.tool], self.probe, extra)
+        cache.save()
+        return value
+
+    def test_probe_runs_once(self):
+        self.assertEqual(self.get(), {'version': 1})
+        self.assertEqual(self.get(), {'version': 1})
+        self.assertEqual(self.calls, 1)
+
+    def test_changed_file_reruns_probe(self):
+        self.get()
+        with open(self.tool, 'w') as f:
+            f.write('gdb 13.2')
+        self.assertEqual(self.get(), {'version': 2})
+
+    def test_removed_file_reruns_probe(self):
+        self.get()
+        os.remove(self.tool)
+        self.assertEqual(self.get(), {'version': 2})
+        self.assertEqual(self.get(), {'version': 2})
+
+    def test_extra_value_reruns_probe(self):
+        self.get('x86_64')
+        self.assertEqual(self.get('x86_64'), {'version': 1})
+        self.assertEqual(self.get('aarch64'), {'version': 2})
+
+    def test_unwritable_cache(self):
+        cache = ProbeCache(os.path.join(self.dir, 'missing', 'probes.json'))
+        self.assertEqual(cache.get('gdb', [self.tool], self.probe), {'version': 1})
+        cache.save()
+        self.assertFalse(cache.dirty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# Tests of the keys of the cache of passing test results, see resultcache.py.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from litsupport.resultcache import ResultCache, toolchain_digest
+
+
+class FakeConfig(object):
+    def __init__(self):
+        self.available_features = set(['host_X86', 'Linux'])
+        self.substitutions = [('%ldc', '/build/bin/ldc2'), ('%runtimedir', '/build/lib')]
+
+
+class FakeSuite(object):
+    def __init__(self, source_root):
+        self.source_root = source_root
+
+
+class FakeTest(object):
+    """The parts of a lit.Test.Test used by ResultCache."""
+    def __init__(self, source_root, path_in_suite):
+        self.suite = FakeSuite(source_root)
+        self.path_in_suite = path_in_suite
+        self.config = FakeConfig()
+
+    def getSourcePath(self):
+        return os.path.join(self.suite.source_root, *self.path_in_suite)
+
+    def getFullName(self):
+        return 'LDC :: ' + '/'.join(self.path_in_suite)
+
+
+def write(path, text):
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.dir, 'tests')
+        write(os.path.join(self.root, 'lit.local.cfg'), 'config.suffixes = [".d"]\n')
+        write(os.path.join(self.root, 'codegen', 'foo.d'),
+              '// RUN: %ldc -c %s -I%S/inputs\n// RUN: %ldc -c %S/helper/bar.d\nimport baz;\n')
+        write(os.path.join(self.root, 'codegen', 'inputs', 'baz.d'), 'module baz;\n')
+        write(os.path.join(self.root, 'codegen', 'helper', 'bar.d'), 'module bar;\n')
+        write(os.path.join(self.root, 'codegen', 'other.d'), 'module other;\n')
+        self.test = FakeTest(self.root, ('codegen', 'foo.d'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def key(self, toolchain='toolchain'):
+        # a new cache per key, like a new run, its digests of the dependencies are memoized
+        return ResultCache(os.path.join(self.dir, 'cache'), toolchain).key(self.test)
+
+    def assertInvalidates(self, change):
+        before = self.key()
+        change()
+        self.assertNotEqual(self.key(), before)
+
+    def test_key_is_stable(self):
+        self.assertEqual(self.key(), self.key())
+
+    def test_dependencies(self):
+        cache = ResultCache(os.path.join(self.dir, 'cache'), 'toolchain')
+        with open(self.test.getSourcePath()) as f:
+            deps = cache.dependencies(self.test, f.read())
+        codegen = os.path.join(self.root, 'codegen')
+        self.assertEqual(deps, sorted([
+            os.path.join(codegen, 'inputs'),
+            os.path.join(codegen, 'helper', 'bar.d'),
+            os.path.join(self.root, 'lit.local.cfg'),
+            os.path.join(codegen, 'lit.local.cfg'),
+        ]))
+
+    def test_source_change_invalidates(self):
+        self.assertInvalidates(lambda: write(self.test.getSourcePath(), '// RUN: %ldc -c %s\n'))
+
+    def test_inputs_change_invalidates(self):
+        self.assertInvalidates(lambda: write(os.path.join(self.root, 'codegen', 'inputs', 'baz.d'), 'module baz; int x;\n'))
+
+    def test_new_inputs_file_invalidates(self):
+        self.assertInvalidates(lambda: write(os.path.join(self.root, 'codegen', 'inputs', 'qux.d'), 'module qux;\n'))
+
+    def test_referenced_file_change_invalidates(self):
+        self.assertInvalidates(lambda: write(os.path.join(self.root, 'codegen', 'helper', 'bar.d'), 'module bar; int y;\n'))
+
+    def test_lit_local_cfg_invalidates(self):
+        self.assertInvalidates(lambda: write(os.path.join(self.root, 'lit.local.cfg'), 'config.suffixes = [".d", ".i"]\n'))
+        self.assertInvalidates(lambda: write(os.path.join(self.root, 'codegen', 'lit.local.cfg'), 'config.unsupported = True\n'))
+
+    def test_toolchain_change_invalidates(self):
+        self.assertNotEqual(self.key('toolchain'), self.key('rebuilt toolchain'))
+
+    def test_feature_change_invalidates(self):
+        self.assertInvalidates(lambda: self.test.config.available_features.add('atleast_llvm1700'))
+
+    def test_substitution_change_invalidates(self):
+        self.assertInvalidates(lambda: self.test.config.substitutions.append(('%ldc_extra', '-O3')))
+
+    def test_unrelated_change_keeps_key(self):
+        before = self.key()
+        write(os.path.join(self.root, 'codegen', 'other.d'), 'module other; int z;\n')
+        write(os.path.join(self.root, 'debuginfo', 'lit.local.cfg'), 'config.unsupported = True\n')
+        self.assertEqual(self.key(), before)
+
+    def test_store_and_lookup(self):
+        cache = ResultCache(os.path.join(self.dir, 'cache'), 'toolchain')
+        key = cache.key(self.test)
+        self.assertIsNone(cache.lookup(key))
+        cache.store(key, self.test, 1.5)
+        self.assertEqual(cache.lookup(key), {'test': 'LDC :: codegen/foo.d', 'elapsed': 1.5})
+
+    def test_toolchain_digest(self):
+        compiler = os.path.join(self.dir, 'bin', 'ldc2')
+        write(compiler, 'compiler')
+        before = toolchain_digest([compiler])
+        self.assertEqual(toolchain_digest([compiler]), before)
+        write(compiler, 'rebuilt compiler')
+        self.assertNotEqual(toolchain_digest([compiler]), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
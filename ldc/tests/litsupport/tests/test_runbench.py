@@ -0,0 +1,39 @@
+# Tests of the regression check of runbench.py --compare.
+
+import unittest
+
+import runbench
+
+
+class CompareTest(unittest.TestCase):
+    def test_t_critical(self):
+        self.assertEqual(runbench.t_critical(1), 6.314)
+        self.assertEqual(runbench.t_critical(4.7), 2.132)  # rounded down, the conservative side
+        self.assertEqual(runbench.t_critical(0.5), 6.314)
+        self.assertEqual(runbench.t_critical(500), runbench.T_CRITICAL[-1])
+        self.assertEqual(runbench.t_critical(5000), runbench.T_CRITICAL_INFINITY)
+
+    def test_significant_slowdown(self):
+        change, slower = runbench.compare([10.5, 10.6, 10.4], [10.0, 10.1, 9.9], 0.02)
+        self.assertAlmostEqual(change, 0.05)
+        self.assertTrue(slower)
+
+    def test_noisy_slowdown_is_not_significant(self):
+        change, slower = runbench.compare([9.0, 12.0, 11.0], [10.0, 10.1, 9.9], 0.02)
+        self.assertGreater(change, 0.02)
+        self.assertFalse(slower)
+
+    def test_below_threshold(self):
+        self.assertFalse(runbench.compare([10.1, 10.1, 10.1], [10.0, 10.0, 10.0], 0.02)[1])
+
+    def test_needs_min_iterations(self):
+        self.assertFalse(runbench.compare([20.0, 20.1], [10.0, 10.1], 0.02)[1])
+        self.assertTrue(runbench.compare([20.0, 20.1, 20.0], [10.0, 10.1, 10.0], 0.02)[1])
+
+    def test_without_variance(self):
+        self.assertEqual(runbench.compare([11.0] * 3, [10.0] * 3, 0.02), (0.1, True))
+        self.assertEqual(runbench.compare([1.0] * 3, [0.0] * 3, 0.02), (0.0, False))
+
+
+if __name__ == '__main__':
+    unittest.main()
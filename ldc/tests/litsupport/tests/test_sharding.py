@@ -0,0 +1,101 @@
+# Tests of the shard assignment of runlit.py --shard, see sharding.py.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from litsupport import sharding
+from litsupport.timing import TimingDB
+
+
+def make_db(path, times):
+    db = TimingDB(path)
+    db.tests = dict((name, {'elapsed': elapsed, 'runs': 1}) for name, elapsed in times.items())
+    return db
+
+
+TIMES = {
+    'LDC :: codegen/a.d': 10.0,
+    'LDC :: codegen/b.d': 7.0,
+    'LDC :: codegen/c.d': 5.0,
+    'LDC :: debuginfo/d.d': 4.0,
+    'LDC :: debuginfo/e.d': 2.0,
+    'LDC :: linking/f.d': 1.0,
+    'LDC :: linking/g.d': 0.5,
+}
+
+
+class ShardingTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = make_db(os.path.join(self.dir, 'timing.json'), TIMES)
+        self.tests = sorted(TIMES)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def assertPartition(self, tests, count, plan):
+        shards = [sharding.select_shard(tests, i, count, plan) for i in range(count)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(tests))
+        return shards
+
+    def test_plan_is_deterministic(self):
+        plan = sharding.make_plan(self.tests, self.db, 3)
+        self.assertEqual(plan, sharding.make_plan(list(reversed(self.tests)), self.db, 3))
+        self.assertEqual(set(plan['shards']), set(self.tests))
+
+    def test_plan_balances_longest_first(self):
+        plan = sharding.make_plan(self.tests, self.db, 2)
+        self.assertEqual(sorted(plan['expected_times']), [14.5, 15.0])
+        self.assertNotEqual(plan['shards']['LDC :: codegen/a.d'], plan['shards']['LDC :: codegen/b.d'])
+
+    def test_every_test_runs_exactly_once(self):
+        for count in (1, 2, 3, 5):
+            self.assertPartition(self.tests, count, sharding.make_plan(self.tests, self.db, count)['shards'])
+            self.assertPartition(self.tests, count, None)
+
+    def test_added_tests_do_not_move_planned_ones(self):
+        plan = sharding.make_plan(self.tests, self.db, 3)
+        path = os.path.join(self.dir, 'plan.json')
+        sharding.write_plan(path, plan)
+        shards = sharding.read_plan(path, 3)
+
+        before = self.assertPartition(self.tests, 3, shards)
+        added = ['LDC :: codegen/new%d.d' % i for i in range(20)]
+        after = self.assertPartition(sorted(self.tests + added), 3, shards)
+        for i in range(3):
+            self.assertEqual([t for t in after[i] if t not in added], before[i])
+            for name in after[i]:
+                if name in added:
+                    self.assertEqual(sharding.hash_shard(name, 3), i)
+
+    def test_assignment_without_plan_ignores_other_tests(self):
+        alone = [sharding.select_shard(['LDC :: codegen/a.d'], i, 4, None) for i in range(4)]
+        together = [sharding.select_shard(self.tests, i, 4, None) for i in range(4)]
+        for i in range(4):
+            self.assertEqual('LDC :: codegen/a.d' in alone[i], 'LDC :: codegen/a.d' in together[i])
+
+    def test_plan_of_other_shard_count_is_ignored(self):
+        path = os.path.join(self.dir, 'plan.json')
+        sharding.write_plan(path, sharding.make_plan(self.tests, self.db, 3))
+        self.assertIsNone(sharding.read_plan(path, 4))
+        self.assertIsNone(sharding.read_plan(os.path.join(self.dir, 'missing.json'), 3))
+
+    def test_merge_reports(self):
+        paths = []
+        for i, (names, elapsed) in enumerate([(['LDC :: b.d'], 3.0), (['LDC :: a.d', 'LDC :: c.d'], 5.0)]):
+            path = os.path.join(self.dir, 'report%d.json' % i)
+            with open(path, 'w') as f:
+                json.dump({'__version__': [13, 0], 'shard': i, 'elapsed': elapsed,
+                           'tests': [{'name': n, 'code': 'PASS'} for n in names]}, f)
+            paths.append(path)
+        merged = sharding.merge_reports(paths)
+        self.assertEqual([t['name'] for t in merged['tests']], ['LDC :: a.d', 'LDC :: b.d', 'LDC :: c.d'])
+        self.assertEqual(merged['elapsed'], 5.0)
+        self.assertNotIn('shard', merged)
+
+
+if __name__ == '__main__':
+    unittest.main()
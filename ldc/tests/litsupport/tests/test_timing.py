@@ -0,0 +1,69 @@
+# Tests of the timing database ordering and splitting the test run, see timing.py.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from litsupport import timing
+
+
+def result(name, code, elapsed, cached=False):
+    return {'name': 'LDC :: ' + name, 'code': code, 'elapsed': elapsed, 'metrics': {'cached': True} if cached else {}}
+
+
+class TimingDBTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.db = timing.TimingDB(os.path.join(self.dir, 'timing.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_moving_average(self):
+        self.db.update([result('a.d', 'PASS', 10.0)])
+        self.db.update([result('a.d', 'PASS', 20.0)])
+        self.assertAlmostEqual(self.db.estimate('LDC :: a.d'), 10.0 + timing.SMOOTHING * 10.0)
+        self.assertEqual(self.db.tests['LDC :: a.d']['runs'], 2)
+        self.assertIsNone(self.db.estimate('LDC :: b.d'))
+        self.assertEqual(self.db.estimate('LDC :: b.d', 1.0), 1.0)
+
+    def test_skips_results_without_a_real_run(self):
+        self.db.update([result('a.d', 'PASS', 10.0)])
+        self.db.update([result('a.d', 'PASS', 0.001, cached=True), result('a.d', 'TIMEOUT', 60.0),
+                        result('b.d', 'UNSUPPORTED', 0.1)])
+        self.assertEqual(self.db.estimate('LDC :: a.d'), 10.0)
+        self.assertEqual(self.db.tests['LDC :: a.d']['runs'], 1)
+        self.assertEqual(self.db.tests['LDC :: a.d']['history'], 'PF')
+        self.assertNotIn('LDC :: b.d', self.db.tests)
+
+    def test_save_and_load(self):
+        self.db.update([result('a.d', 'PASS', 3.0)])
+        self.db.save()
+        self.assertEqual(timing.TimingDB(self.db.path).tests, self.db.tests)
+        with open(self.db.path, 'w') as f:
+            f.write('{"tests": ')
+        self.assertEqual(timing.TimingDB(self.db.path).tests, {})
+
+    def test_write_lit_test_times(self):
+        path = os.path.join(self.dir, '.lit_test_times.txt')
+        with open(path, 'w') as f:
+            f.write('1.000000e+00 other/kept.d\n5.000000e-03 codegen/a.d\n')
+        self.db.update([result('codegen/a.d', 'PASS', 4.0), result('codegen/b.d', 'FAIL', 2.0)])
+        self.db.write_lit_test_times(self.dir)
+        with open(path) as f:
+            times = dict((name, float(time)) for time, name in (line.split() for line in f))
+        # failed tests get a negative time, lit runs them first
+        self.assertEqual(times, {'codegen/a.d': 4.0, 'codegen/b.d': -2.0, 'other/kept.d': 1.0})
+
+    def test_plan_split(self):
+        self.db.update([result('a.d', 'PASS', 10.0), result('b.d', 'PASS', 5.0), result('c.d', 'PASS', 1.0)])
+        tests = ['LDC :: a.d', 'LDC :: b.d', 'LDC :: c.d', 'LDC :: new.d']
+        self.assertEqual(timing.plan_split(self.db, tests, 2, 10), ['LDC :: a.d', 'LDC :: b.d'])
+        self.assertEqual(timing.plan_split(self.db, tests, 8, 1), ['LDC :: a.d'])
+        self.assertEqual(timing.plan_split(self.db, tests, 0, 10), [])
+        self.assertEqual(timing.plan_split(self.db, ['LDC :: new.d'], 4, 10), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# Database of historical test timings, kept by runlit.py across runs.
+#
+# lit only remembers the last elapsed time of each test (.lit_test_times.txt),
+# which is reset to ~0 by cached passes and is noisy on loaded machines. The
+# database keeps a moving average per test; runlit.py writes it back into
+# lit's timing file before each run, so lit's default ('smart') order starts
+# the longest tests first, and uses it to split the slowest tests out onto
+# spare cores.
+
+import json
+import os
+import tempfile
+
+# weight of a new measurement in the moving average
+SMOOTHING = 0.3
+
+# number of outcomes kept per test, see flaky.py
+HISTORY_LENGTH = 50
+OUTCOMES = {'PASS': 'P', 'FLAKYPASS': 'R', 'FAIL': 'F', 'TIMEOUT': 'F'}
+
+# codes of tests which did not run (or did not run to completion)
+NOT_RUN_CODES = ('UNSUPPORTED', 'EXCLUDED', 'SKIPPED', 'UNRESOLVED', 'TIMEOUT')
+
+
+def test_path(name):
+    """'LDC :: codegen/foo.d' -> 'codegen/foo.d'"""
+    return name.split(' :: ', 1)[-1]
+
+
+def write_json(path, data):
+    """Writes 'data' to 'path' atomically."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class TimingDB(object):
+    def __init__(self, path):
+        self.path = path
+        self.tests = {}
+        try:
+            with open(path) as f:
+                self.tests = json.load(f).get('tests', {})
+        except (IOError, OSError, ValueError):
+            pass
+
+    def save(self):
+        write_json(self.path, {'tests': self.tests})
+
+    def estimate(self, name, default=None):
+        entry = self.tests.get(name)
+        return entry['elapsed'] if entry else default
+
+    def update(self, results):
+        """Adds the elapsed times and outcomes of a lit JSON report's tests."""
+        for t in results:
+            metrics = t.get('metrics', {})
+            if t['code'] in OUTCOMES and not metrics.get('cached'):
+                entry = self.tests.setdefault(t['name'], {'elapsed': t.get('elapsed') or 0.0, 'runs': 0})
+                entry['history'] = (entry.get('history', '') + OUTCOMES[t['code']])[-HISTORY_LENGTH:]
+            if t['code'] in NOT_RUN_CODES or metrics.get('cached') or t.get('elapsed') is None:
+                continue
+            entry = self.tests.setdefault(t['name'], {'elapsed': t['elapsed'], 'runs': 0})
+            entry['elapsed'] += SMOOTHING * (t['elapsed'] - entry['elapsed'])
+            entry['runs'] += 1
+            entry['failed'] = t['code'] in ('FAIL', 'XPASS')
+
+    def write_lit_test_times(self, exec_root):
+        """Merges the averages into lit's .lit_test_times.txt in 'exec_root', read by lit's 'smart' test order."""
+        path = os.path.join(exec_root, '.lit_test_times.txt')
+        times = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    fields = line.split(None, 1)
+                    if len(fields) == 2:
+                        times[fields[1].strip('\n')] = fields[0]
+        for name, entry in self.tests.items():
+            # lit runs tests with a negative time, i.e. failed the last time, first
+            time = -max(entry['elapsed'], 1e-6) if entry.get('failed') else entry['elapsed']
+            times[test_path(name)] = '%e' % time
+        with open(path, 'w') as f:
+            for name in sorted(times):
+                f.write(times[name] + ' ' + name + '\n')
+
+
+def plan_split(db, tests, spare_cores, limit):
+    """
+    Chooses the slowest of 'tests' to run on 'spare_cores' cores next to the main run, one core each,
+    at most 'limit' of them; tests without recorded timings are never split out.
+    """
+    estimates = sorted(((db.estimate(name, 0.0), name) for name in tests), reverse=True)
+    return [name for e, name in estimates[:max(0, min(limit, spare_cores))] if e > 0.0]
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# compile-time benchmark of LDC on the lit test sources
+#
+# Runs the lit tests of the chosen directories N times with every %ldc
+# invocation writing a --ftime-trace file, aggregates the traces per compiler
+# phase with timetrace2txt and compares the result to a stored baseline.
+#
+#   runbench.py codegen semantic -n 5 --save-baseline   # on the reference compiler
+#   runbench.py codegen semantic -n 5                   # on the new compiler, exits with 1 on regressions
+
+from __future__ import print_function
+
+import argparse
+import bisect
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# directory of this script, which is the lit exec root of the test suite
+TEST_EXEC_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# one-sided 95% critical values of Student's t distribution for 1 to 30 degrees of freedom, then for 40, 60 and 120
+T_CRITICAL_DOF = list(range(1, 31)) + [40, 60, 120]
+T_CRITICAL = [6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812, 1.796, 1.782, 1.771, 1.761, 1.753,
+              1.746, 1.740, 1.734, 1.729, 1.725, 1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697,
+              1.684, 1.671, 1.658]
+T_CRITICAL_INFINITY = 1.645
+
+# fewer runs than this on either side are never reported as a regression
+MIN_ITERATIONS = 3
+
+# timetrace2txt --indent line: indentation, '- ', duration in ms, ' - ', event name, ...
+_trace_line = re.compile(r'^( *)- +([0-9.]+) - (.*)$')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='runbench.py',
+        description='Benchmarks the compile times of %%ldc over lit test directories.')
+    parser.add_argument('dirs', nargs='*', default=['codegen', 'semantic'],
+        help='test directories (or files) to compile (default: %(default)s)')
+    parser.add_argument('-n', '--iterations', type=int, default=5,
+        help='number of runs (default: %(default)s)')
+    parser.add_argument('-j', '--workers', type=int,
+        help='number of lit workers (default: all cores; fewer give less noisy timings)')
+    parser.add_argument('--baseline', default=os.path.join(TEST_EXEC_ROOT, '.lit_bench_baseline.json'),
+        help='baseline to compare to or to save (default: %(default)s)')
+    parser.add_argument('--save-baseline', action='store_true',
+        help='save the results as the new baseline instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.05,
+        help='relative slowdown of a phase considered a regression if also significant in a one-sided Welch\'s t-test '
+             'at 95%% (default: %(default)s)')
+    parser.add_argument('--timetrace2txt',
+        help='timetrace2txt binary (default: the one configured in lit.site.cfg)')
+    parser.add_argument('-o', '--output',
+        help='also write the results as JSON to this file')
+    return parser.parse_args(argv)
+
+
+def configured_timetrace2txt():
+    with open(os.path.join(TEST_EXEC_ROOT, 'lit.site.cfg')) as f:
+        m = re.search(r'^config\.timetrace2txt_bin\s*=\s*"([^"]*)"', f.read(), re.M)
+    return m.group(1) if m else 'timetrace2txt'
+
+
+def phase_of(event):
+    """'Sema1: Module foo, ...' -> 'Sema1', 'Codegen module foo, ...' -> 'Codegen module', 'Linking executable, ...' -> 'Linking executable'"""
+    name = event.split(', ', 1)[0]
+    if ':' in name:
+        return name.split(':', 1)[0]
+    if name.startswith('Codegen module '):
+        return 'Codegen module'
+    return name
+
+
+def trace_phases(timetrace2txt, trace_file):
+    """Time per phase in ms of one time trace; events nested in an event of the same phase are not counted twice."""
+    output = subprocess.check_output([timetrace2txt, trace_file, '--indent', '-o', '-'], universal_newlines=True)
+    phases = {}
+    stack = []  # (depth, phase) of the enclosing events
+    for line in output.splitlines():
+        m = _trace_line.match(line)
+        if not m:
+            continue
+        depth, ms, event = len(m.group(1)) // 2, float(m.group(2)), m.group(3)
+        if event.startswith('Total '):
+            continue  # LLVM's per event name summaries
+        phase = phase_of(event)
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        if not any(p == phase for _, p in stack):
+            phases[phase] = phases.get(phase, 0.0) + ms
+        stack.append((depth, phase))
+    return phases
+
+
+def run_iteration(opts, timetrace2txt):
+    """Runs the tests once, returns the time per phase in ms summed over all %ldc invocations."""
+    trace_dir = tempfile.mkdtemp(prefix='ldc-bench')
+    try:
+        command = [sys.executable, '-c', 'import lit.main; lit.main.main()', '-q', '--param', 'ldc_time_trace=' + trace_dir]
+        if opts.workers:
+            command += ['-j', str(opts.workers)]
+        command += [os.path.join(TEST_EXEC_ROOT, d) for d in opts.dirs]
+        subprocess.call(command)  # failing tests are not our business, their compile times count all the same
+
+        phases = {'invocations': 0}
+        for name in os.listdir(trace_dir):
+            path = os.path.join(trace_dir, name)
+            if os.path.getsize(path) == 0:
+                continue  # compiler failed before writing the trace
+            try:
+                for phase, ms in trace_phases(timetrace2txt, path).items():
+                    phases[phase] = phases.get(phase, 0.0) + ms
+            except subprocess.CalledProcessError:
+                continue
+            phases['invocations'] += 1
+        return phases
+    finally:
+        shutil.rmtree(trace_dir, ignore_errors=True)
+
+
+def stats(samples):
+    n = len(samples)
+    mean = sum(samples) / n
+    variance = sum((x - mean) ** 2 for x in samples) / (n - 1) if n > 1 else 0.0
+    return mean, math.sqrt(variance), n
+
+
+def t_critical(dof):
+    """One-sided 95% critical value of Student's t distribution, the degrees of freedom are rounded down to the table."""
+    index = bisect.bisect_right(T_CRITICAL_DOF, dof)
+    if index == len(T_CRITICAL_DOF) and dof > 1000:
+        return T_CRITICAL_INFINITY
+    return T_CRITICAL[max(index - 1, 0)]
+
+
+def compare(samples, baseline_samples, threshold):
+    """
+    Relative change of the means and whether it is a significant slowdown: a one-sided Welch's t-test at 95%
+    with the Welch-Satterthwaite degrees of freedom, which needs MIN_ITERATIONS samples on both sides.
+    """
+    mean, stdev, n = stats(samples)
+    base_mean, base_stdev, base_n = stats(baseline_samples)
+    if base_mean == 0.0:
+        return 0.0, False
+    change = (mean - base_mean) / base_mean
+    if change <= threshold or min(n, base_n) < MIN_ITERATIONS:
+        return change, False
+    var, base_var = stdev ** 2 / n, base_stdev ** 2 / base_n
+    if var + base_var == 0.0:
+        return change, True
+    dof = (var + base_var) ** 2 / (var ** 2 / (n - 1) + base_var ** 2 / (base_n - 1))
+    return change, (mean - base_mean) / math.sqrt(var + base_var) > t_critical(dof)
+
+
+def main(argv):
+    opts = parse_args(argv)
+    if opts.iterations < MIN_ITERATIONS and not opts.save_baseline:
+        print('Warning: regressions need at least %d runs, only reporting the changes' % MIN_ITERATIONS)
+    timetrace2txt = opts.timetrace2txt or configured_timetrace2txt()
+
+    samples = {}
+    for i in range(opts.iterations):
+        print('Run %d of %d ...' % (i + 1, opts.iterations))
+        for phase, value in run_iteration(opts, timetrace2txt).items():
+            samples.setdefault(phase, []).append(value)
+    invocations = samples.pop('invocations', [0])
+    if not samples:
+        sys.exit('No time traces were written, is %ldc working?')
+    # phases missing in some runs took 0ms there
+    for phase in samples:
+        samples[phase] += [0.0] * (opts.iterations - len(samples[phase]))
+
+    results = {'dirs': opts.dirs, 'iterations': opts.iterations, 'invocations': invocations, 'phases': samples}
+    if opts.output:
+        with open(opts.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if opts.save_baseline:
+        with open(opts.baseline, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    baseline = None
+    if not opts.save_baseline and os.path.exists(opts.baseline):
+        with open(opts.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('dirs') != opts.dirs:
+            print('Warning: the baseline was made for %s' % ', '.join(baseline.get('dirs', [])))
+
+    print('\n%d %%ldc invocations per run' % max(invocations))
+    print('%-36s %12s %10s %12s %9s' % ('phase', 'mean [ms]', 'stdev', 'baseline', 'change'))
+    regressions = []
+    for phase in sorted(samples, key=lambda p: -stats(samples[p])[0]):
+        mean, stdev, _ = stats(samples[phase])
+        line = '%-36s %12.1f %10.1f' % (phase[:36], mean, stdev)
+        if baseline and phase in baseline['phases']:
+            change, regressed = compare(samples[phase], baseline['phases'][phase], opts.threshold)
+            line += ' %12.1f %+8.1f%%' % (stats(baseline['phases'][phase])[0], change * 100)
+            if regressed:
+                line += '  REGRESSION'
+                regressions.append(phase)
+        print(line)
+
+    if opts.save_baseline:
+        print('\nSaved as baseline to ' + opts.baseline)
+    elif regressions:
+        print('\n%d phases regressed by more than %.0f%%: %s' % (len(regressions), opts.threshold * 100, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
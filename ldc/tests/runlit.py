@@ -1,17 +1,431 @@
 #!/usr/bin/env python3
 # wrapper to run lit from commandline
+#
+# Options not handled here are passed on to lit, see 'runlit.py --runlit-help'.
+# 'runlit.py merge ...' merges the results of several shards, see 'runlit.py merge --help'.
 
 from __future__ import print_function
 
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# directory of this script, which is the lit exec root of the test suite; runlit's state lives here
+TEST_EXEC_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# oldest lit providing what runlit builds on: .lit_test_times.txt, ALLOW_RETRIES/allowed_retries and -o JSON results
+MIN_LIT_VERSION = (13, 0)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='runlit.py', add_help=False, allow_abbrev=False,
+        description='Runs lit on the LDC test suite. All options not listed here are passed on to lit.')
+    parser.add_argument('--runlit-help', action='help', help='show this help message and exit')
+    parser.add_argument('-o', '--output', dest='output',
+        help='write lit\'s JSON test results to this file (default: .lit_results.json in the exec root)')
+    parser.add_argument('-j', '--workers', type=int,
+        help='number of lit workers (default: all cores)')
+    parser.add_argument('--filter',
+        help='lit: only run tests whose name matches this regex')
+    parser.add_argument('--filter-out',
+        help='lit: filter out tests whose name matches this regex')
+
+    group = parser.add_argument_group('result cache')
+    group.add_argument('--result-cache', action='store_true',
+        help='report passing tests whose source, inputs, compiler, runtime libs and features are unchanged as cached passes')
+    group.add_argument('--result-cache-dir', default=os.path.join(TEST_EXEC_ROOT, '.lit_result_cache'),
+        help='directory of the result cache (default: %(default)s)')
+    group.add_argument('--clear-result-cache', action='store_true',
+        help='remove all cached results before running')
+
+    group = parser.add_argument_group('scheduling')
+    group.add_argument('--timing-db', default=os.path.join(TEST_EXEC_ROOT, '.lit_timing.json'),
+        help='database of historical test timings used to start the longest tests first (default: %(default)s)')
+    group.add_argument('--split-slowest', type=int, default=4, metavar='N',
+        help='if -j leaves cores unused, run up to N of the slowest tests on them, next to the main run (default: %(default)s)')
+
+    group = parser.add_argument_group('flaky tests')
+    group.add_argument('--flaky-threshold', type=float, default=0.02,
+        help='share of a test\'s last runs with failures which did not persist, above which it is considered flaky (default: %(default)s)')
+    group.add_argument('--flaky-retries', type=int, default=2, metavar='N',
+        help='retry flaky tests up to N times when they fail, 0 to disable (default: %(default)s)')
+    group.add_argument('--retry-budget', type=int, default=0, metavar='N',
+        help='rerun the failed tests once at the end of the run if no more than N failed (default: %(default)s)')
+
+    group = parser.add_argument_group('change impact')
+    group.add_argument('--changed-since', metavar='REV',
+        help='only run the tests affected by the files changed since git revision REV, committed or not')
+    group.add_argument('--full', action='store_true',
+        help='run all tests, overriding --changed-since')
+    group.add_argument('--record-impact', action='store_true',
+        help='record the modules and inputs read by each test\'s %%ldc invocations into the impact map')
+    group.add_argument('--impact-map', default=os.path.join(TEST_EXEC_ROOT, '.lit_impact.json'),
+        help='the runtime modules and inputs read by each test, used by --changed-since (default: %(default)s)')
+
+    group = parser.add_argument_group('sharding')
+    group.add_argument('--shard-count', type=int, metavar='N',
+        help='split the selected tests into N shards balanced by the shard plan')
+    group.add_argument('--shard-index', type=int, metavar='I',
+        help='run shard I (0-based) of --shard-count')
+    group.add_argument('--shard-plan', default=os.path.join(TEST_EXEC_ROOT, '.lit_shard_plan.json'),
+        help='test to shard assignment shared by all machines; tests not in it are assigned by name (default: %(default)s)')
+    group.add_argument('--write-shard-plan', action='store_true',
+        help='write a shard plan for --shard-count shards balanced by the timing database and exit')
+
+    group = parser.add_argument_group('object cache')
+    group.add_argument('--object-cache', action='store_true',
+        help='reuse the output of plain %%ldc -c compilations with identical flags, inputs, imports and compiler')
+    group.add_argument('--object-cache-dir', default=os.path.join(TEST_EXEC_ROOT, '.lit_object_cache'),
+        help='directory of the object cache (default: %(default)s)')
+    group.add_argument('--object-cache-size', type=int, default=1024, metavar='MB',
+        help='size limit of the object cache, least recently used entries are evicted (default: %(default)s)')
+
+    group.add_argument('--object-cache-daemon', action='store_true',
+        help='keep the object cache\'s file digests in memory in a daemon started for this run instead of rehashing '
+             'the sources and imports in every %%ldc invocation; not used with --instrument')
+
+    group = parser.add_argument_group('instrumentation')
+    group.add_argument('--instrument', action='store_true',
+        help='measure wall time, CPU time and peak RSS of every %%ldc, %%llc, %%profdata, ..., and FileCheck invocation')
+    group.add_argument('--instrument-report', default=os.path.join(TEST_EXEC_ROOT, '.lit_instrument.json'),
+        help='file to write the measurements to (default: %(default)s)')
+    group.add_argument('--instrument-top', type=int, default=10, metavar='N',
+        help='number of slowest tests and commands to list in the summary (default: %(default)s)')
+
+    opts, lit_args = parser.parse_known_args(argv)
+    if (opts.shard_index is not None or opts.write_shard_plan) and not opts.shard_count:
+        parser.error('--shard-index and --write-shard-plan require --shard-count')
+    if opts.shard_count and not opts.write_shard_plan and not (opts.shard_index is not None and 0 <= opts.shard_index < opts.shard_count):
+        parser.error('--shard-index must be between 0 and --shard-count - 1')
+    if opts.object_cache_daemon and not opts.object_cache:
+        parser.error('--object-cache-daemon requires --object-cache')
+    return opts, lit_args
+
+
+def parse_merge_args(argv):
+    parser = argparse.ArgumentParser(prog='runlit.py merge',
+        description='Merges the JSON results of several shards into one report.')
+    parser.add_argument('reports', nargs='+', help='JSON results of the shards (runlit.py -o)')
+    parser.add_argument('-o', '--output', help='write the merged JSON results to this file')
+    parser.add_argument('--junit', help='write the merged results as JUnit XML to this file')
+    return parser.parse_args(argv)
+
+
+def start_lit(lit_args, **kwargs):
+    """Starts lit in a child process."""
+    return subprocess.Popen([sys.executable, '-c', 'import lit.main; lit.main.main()'] + lit_args, **kwargs)
+
+
+def wait_all(processes):
+    """Waits for the lit processes, returns the worst exit code."""
+    try:
+        return max(p.wait() for p in processes)
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
+        return 130
+
+
+def discover_tests(lit_args):
+    """The names of the tests lit would find for 'lit_args'."""
+    output = subprocess.check_output([sys.executable, '-c', 'import lit.main; lit.main.main()'] + lit_args + ['--show-tests'],
+                                     universal_newlines=True)
+    return [line.strip() for line in output.splitlines() if line.startswith('  ') and ' :: ' in line]
+
+
+def read_report(path):
+    """A lit JSON report, None if lit did not write one."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def read_results(path):
+    """The tests of a lit JSON report, an empty list if lit did not write one."""
+    report = read_report(path)
+    return report.get('tests', []) if report else []
+
+
+def select_tests(opts, lit_args):
+    """The names of the tests lit would run for 'lit_args' and the --filter/--filter-out options."""
+    tests = discover_tests(lit_args)
+    if opts.filter:
+        tests = [t for t in tests if re.search(opts.filter, t)]
+    if opts.filter_out:
+        tests = [t for t in tests if not re.search(opts.filter_out, t)]
+    return tests
+
+
+def split_slowest(opts, tests, db):
+    """The slowest of 'tests' to run on the cores left unused by -j, see --split-slowest."""
+    spare_cores = (os.cpu_count() or 1) - (opts.workers or os.cpu_count() or 1)
+    if spare_cores < 1 or opts.split_slowest < 1 or not db.tests:
+        return []
+    return litsupport.timing.plan_split(db, tests(), spare_cores, opts.split_slowest)
+
+
+def source_tree():
+    """The root of the git repository and the lit test directory relative to it."""
+    tests_dir = litsupport.impact.site_config_value(TEST_EXEC_ROOT, 'test_source_root')
+    root = litsupport.impact.repository_root(tests_dir)
+    return root, os.path.relpath(tests_dir, root).replace(os.sep, '/')
+
+
+def rerun_failures(opts, lit_args, results_file):
+    """Reruns the failed tests of the report at 'results_file' within the --retry-budget, returns their names."""
+    report = read_report(results_file)
+    failed, within_budget = litsupport.flaky.rerun_candidates(report['tests'] if report else [], opts.retry_budget)
+    if not failed:
+        return []
+    if not within_budget:
+        print('\n%d tests failed, more than the retry budget of %d, not rerunning them' % (len(failed), opts.retry_budget))
+        return []
+
+    print('\nRerunning the %d failed tests: %s' % (len(failed), ', '.join(failed)))
+    rerun_results_file = results_file + '.rerun'
+    rerun_args = lit_args + ['-o', rerun_results_file, '--filter', exact_names(failed)]
+    if opts.workers:
+        rerun_args += ['-j', str(opts.workers)]
+    wait_all([start_lit(rerun_args)])
+    litsupport.flaky.apply_rerun(report['tests'], read_results(rerun_results_file))
+    litsupport.timing.write_json(results_file, report)
+    if os.path.exists(rerun_results_file):
+        os.remove(rerun_results_file)
+    return failed
+
+
+def start_object_cache_daemon():
+    """Starts the object cache daemon, returns it and its socket, (None, None) if it does not come up."""
+    if not litsupport.objcachedaemon.SUPPORTED:
+        print('The object cache daemon needs Unix domain sockets, running without')
+        return None, None
+    address = os.path.join(tempfile.mkdtemp(prefix='ldc-lit-'), 'socket')
+    server = subprocess.Popen([sys.executable, litsupport.objcachedaemon.__file__, '--serve', address])
+    deadline = time.time() + 10
+    while not os.path.exists(address):
+        if server.poll() is not None or time.time() > deadline:
+            print('The object cache daemon did not start, running without')
+            stop_object_cache_daemon(server, address)
+            return None, None
+        time.sleep(0.05)
+    return server, address
+
+
+def stop_object_cache_daemon(server, address):
+    if server.poll() is None:
+        server.terminate()
+        server.wait()
+    shutil.rmtree(os.path.dirname(address), ignore_errors=True)
+
+
+def exact_names(names):
+    return '^(?:' + '|'.join(re.escape(name) for name in names) + ')$'
+
+
+def filter_file(names):
+    """A lit response file selecting exactly the tests 'names', the regex can be too long for a command line."""
+    f = tempfile.NamedTemporaryFile(mode='w', prefix='.lit_filter', suffix='.txt', dir=TEST_EXEC_ROOT, delete=False)
+    with f:
+        f.write('--filter\n' + exact_names(names) + '\n')
+    return f.name
+
+
+def merge(argv):
+    opts = parse_merge_args(argv)
+    report = litsupport.sharding.merge_reports(opts.reports)
+    if opts.output:
+        litsupport.timing.write_json(opts.output, report)
+    if opts.junit:
+        litsupport.sharding.write_junit(opts.junit, report)
+    codes = [t['code'] for t in report['tests']]
+    failures = sum(1 for c in codes if c in litsupport.sharding.FAILURE_CODES)
+    print('Merged %d reports: %d tests, %d failures' % (len(opts.reports), len(codes), failures))
+    return 1 if failures else 0
+
+
+def print_cache_summary(tests):
+    cached = sum(1 for t in tests if t.get('metrics', {}).get('cached'))
+    saved = sum(t['metrics'].get('cached_elapsed', 0.0) for t in tests if t.get('metrics', {}).get('cached'))
+    print('Cached passes: %d of %d tests (%.1fs of test time skipped)' % (cached, len(tests), saved))
+
+
+def main(argv):
+    if argv[:1] == ['merge']:
+        return merge(argv[1:])
+
+    opts, lit_args = parse_args(argv)
+
+    lit_args = list(lit_args)
+    results_file = opts.output or os.path.join(TEST_EXEC_ROOT, '.lit_results.json')
+    split_results_file = results_file + '.split'
+
+    if opts.clear_result_cache and os.path.isdir(opts.result_cache_dir):
+        shutil.rmtree(opts.result_cache_dir)
+    if opts.result_cache:
+        lit_args += ['--param', 'ldc_result_cache=' + opts.result_cache_dir]
+    if opts.instrument:
+        lit_args += ['--param', 'ldc_instrument=1']
+    if opts.record_impact:
+        lit_args += ['--param', 'ldc_record_impact=1']
+    if opts.object_cache:
+        lit_args += ['--param', 'ldc_object_cache=' + opts.object_cache_dir,
+                     '--param', 'ldc_object_cache_size=%d' % (opts.object_cache_size << 20)]
+        object_cache_stats = litsupport.objcache.collect_stats(opts.object_cache_dir)
+
+    db = litsupport.timing.TimingDB(opts.timing_db)
+    db.write_lit_test_times(TEST_EXEC_ROOT)
+
+    discovered = []
+    def tests():
+        if not discovered:
+            discovered.append(select_tests(opts, lit_args))
+        return discovered[0]
+
+    if opts.write_shard_plan:
+        plan = litsupport.sharding.make_plan(tests(), db, opts.shard_count)
+        litsupport.sharding.write_plan(opts.shard_plan, plan)
+        print('Wrote a plan for %d shards to %s, expected times: %s' % (
+            opts.shard_count, opts.shard_plan, ', '.join('%.1fs' % t for t in plan['expected_times'])))
+        return 0
+
+    # explicit selection of the tests of the main run, None to leave it to lit
+    selected = None
+    if opts.changed_since and not opts.full:
+        root, tests_dir = source_tree()
+        changed = litsupport.impact.changed_files(root, opts.changed_since)
+        affected = litsupport.impact.affected_tests(changed, tests(), litsupport.impact.ImpactMap(opts.impact_map), root, tests_dir)
+        affected = [t for t in tests() if t in affected]
+        print('%d files changed since %s, %d of %d tests affected' % (len(changed), opts.changed_since, len(affected), len(tests())))
+        if not affected:
+            return 0
+        selected = affected
+        tests = lambda: affected
+
+    if opts.shard_count:
+        plan = litsupport.sharding.read_plan(opts.shard_plan, opts.shard_count)
+        if plan is None:
+            print('No plan for %d shards in %s, assigning tests by name' % (opts.shard_count, opts.shard_plan))
+        selected = litsupport.sharding.select_shard(tests(), opts.shard_index, opts.shard_count, plan)
+        print('Shard %d of %d: %d of %d tests' % (opts.shard_index, opts.shard_count, len(selected), len(tests())))
+        tests = lambda: selected
+
+    split = split_slowest(opts, tests, db)
+
+    quarantined = litsupport.flaky.flaky_tests(db, opts.flaky_threshold) if opts.flaky_retries > 0 else []
+    if quarantined:
+        fd, flaky_file = tempfile.mkstemp(prefix='ldc-lit-flaky', suffix='.txt')
+        os.close(fd)
+        litsupport.flaky.write_list(flaky_file, quarantined)
+        lit_args += ['--param', 'ldc_flaky_tests=' + flaky_file, '--param', 'ldc_flaky_retries=%d' % opts.flaky_retries]
+
+    server = None
+    if opts.object_cache_daemon and not opts.instrument:
+        server, address = start_object_cache_daemon()
+        if server:
+            lit_args += ['--param', 'ldc_object_cache_daemon=' + address]
+
+    main_args = lit_args + ['-o', results_file]
+    if opts.workers:
+        main_args += ['-j', str(opts.workers)]
+    filter_files = []
+    if selected is not None:
+        filter_files.append(filter_file([t for t in selected if t not in split]))
+        main_args += ['@' + filter_files[-1]]
+    else:
+        if opts.filter:
+            main_args += ['--filter', opts.filter]
+        filter_out = ([opts.filter_out] if opts.filter_out else []) + ([exact_names(split)] if split else [])
+        if filter_out:
+            main_args += ['--filter-out', '|'.join(filter_out)]
+
+    for path in (results_file, split_results_file):
+        if os.path.exists(path):
+            os.remove(path)
+    processes = [start_lit(main_args)]
+    if split:
+        print('Running the %d slowest tests on spare cores: %s' % (len(split), ', '.join(split)))
+        split_args = lit_args + ['-o', split_results_file, '-j', str(len(split)), '--filter', exact_names(split)]
+        split_log = tempfile.TemporaryFile(mode='w+')
+        processes.append(start_lit(split_args, stdout=split_log, stderr=subprocess.STDOUT))
+    exit_code = wait_all(processes)
+    for path in filter_files:
+        os.remove(path)
+
+    if split:
+        split_log.seek(0)
+        print('\nSlowest tests run on spare cores:')
+        sys.stdout.write(split_log.read())
+        reports = [path for path in (results_file, split_results_file) if os.path.exists(path)]
+        litsupport.timing.write_json(results_file, litsupport.sharding.merge_reports(reports))
+        if os.path.exists(split_results_file):
+            os.remove(split_results_file)
+
+    rerun = rerun_failures(opts, lit_args, results_file) if opts.retry_budget > 0 and exit_code == 1 else []
+    if server:
+        stop_object_cache_daemon(server, address)
+    if quarantined:
+        os.remove(flaky_file)
+
+    if opts.shard_count:
+        report = read_report(results_file)
+        if report is not None:
+            report['shard'] = [opts.shard_index, opts.shard_count]
+            litsupport.timing.write_json(results_file, report)
+
+    tests = read_results(results_file)
+    db.update(tests)
+    db.save()
+    if opts.record_impact:
+        impact_map = litsupport.impact.ImpactMap(opts.impact_map)
+        count = impact_map.update(tests, source_tree()[0])
+        impact_map.save()
+        print('Recorded the dependencies of %d tests to %s' % (count, opts.impact_map))
+    if rerun and not any(t['code'] in litsupport.sharding.FAILURE_CODES for t in tests):
+        exit_code = 0
+    litsupport.flaky.print_summary(tests, db, quarantined, rerun)
+    if opts.result_cache and tests:
+        print_cache_summary(tests)
+    if opts.object_cache:
+        stats = litsupport.objcache.collect_stats(opts.object_cache_dir, opts.object_cache_size << 20)
+        hits, misses, uncacheable = (stats.get(c, 0) - object_cache_stats.get(c, 0) for c in ('hits', 'misses', 'uncacheable'))
+        print('Object cache: %d hits, %d misses, %d uncacheable %%ldc invocations, %.1f MB cached' % (
+            hits, misses, uncacheable, stats.get('size', 0) / 1048576.0))
+    if opts.instrument and tests:
+        report = litsupport.instrument.make_report(tests)
+        litsupport.timing.write_json(opts.instrument_report, report)
+        litsupport.instrument.print_summary(report, opts.instrument_top)
+        print('\nMeasurements written to ' + opts.instrument_report)
+    return exit_code
+
+
 if __name__=='__main__':
     try:
         import lit.main
     except ImportError:
-        import sys
         sys.exit('Package lit cannot be imported.\n' \
                  'Lit can be installed using: \'python -m pip install -U lit\'\n' \
                  '(Python versions older than 2.7.9 or 3.4 do not have pip installed, see:\n' \
                  'https://pip.pypa.io/en/latest/installing/)')
+    lit_version = tuple(int(part) for part in re.findall(r'\d+', str(lit.__version__))[:2])
+    if lit_version < MIN_LIT_VERSION:
+        sys.exit('lit %s is too old, runlit.py requires lit %d.%d or newer.\n'
+                 'Lit can be updated using: \'python -m pip install -U lit\'' % ((lit.__version__,) + MIN_LIT_VERSION))
+
+    import litsupport.flaky
+    import litsupport.impact
+    import litsupport.instrument
+    import litsupport.objcache
+    import litsupport.objcachedaemon
+    import litsupport.sharding
+    import litsupport.timing
 
     print("Lit version: ", lit.__version__)
-    lit.main.main()
+    sys.exit(main(sys.argv[1:]))
@@ -8,8 +8,17 @@ to generate bindings run: vkdgen.py path/to/vulcan-docs outputdir
 import sys
 import re
 import os
+import io
+import hashlib
+import pickle
+import shutil
+import stat
+import tempfile
+import time
+import concurrent.futures
 from os import path
 from itertools import islice
+from collections import Counter
 
 re_funcptr = re.compile(r"^typedef (.+) \(VKAPI_PTR \*$")
 re_single_const = re.compile(r"^const\s+(.+)\*\s*$")
@@ -17,6 +26,9 @@ re_double_const = re.compile(r"^const\s+(.+)\*\s+const\*\s*$")
 re_array = re.compile(r"^([^\[]+)\[(\d+)\]$")
 re_camel_case = re.compile(r"([a-z])([A-Z])")
 re_long_int = re.compile(r"([0-9]+)ULL")
+re_depends_token = re.compile(r"[(),+]|[^\s(),+]+")
+re_identifier = re.compile(r"[A-Za-z_]\w*")
+re_declaration = re.compile(r"^\s*(?:alias|enum|struct|union)\s+(\w+)|!q\{(\w+)\}", re.M)
 
 if len( sys.argv ) > 2 and not sys.argv[ 2 ].startswith( "--" ):
 	sys.path.append( sys.argv[ 1 ] + "/src/spec/" )
@@ -36,7 +48,7 @@ public import {PACKAGE_PREFIX}.functions;\
 """
 
 TYPES_HEADER = """\
-module {PACKAGE_PREFIX}.types;
+module {TYPES_MODULE};
 
 alias uint8_t = ubyte;
 alias uint16_t = ushort;
@@ -81,6 +93,138 @@ version( X86_64 ) {{
 
 """
 
+# header of the per feature modules of the split layout, {PACKAGE_PREFIX}.types.base holds TYPES_HEADER
+TYPE_MODULE_HEADER = """\
+module {MODULE};
+
+{IMPORTS}
+@nogc nothrow:
+extern( System ):\
+"""
+
+# declaration of a table of the table driven loader
+LOADER_TABLE = """
+private {TYPE}[] {NAME} = [{ENTRIES}
+];"""
+
+# functions filling the tables of the table driven loader
+LOADER_FUNCTIONS = """
+
+// load the named functions through getProcAddr into the corresponding slots
+private void loadFunctionSlots( GetProcAddr, Handle )( GetProcAddr getProcAddr, Handle handle, const( immutable( char )* )[] names, void**[] slots ) {
+	foreach( i, name; names )
+		*slots[ i ] = cast( void* )getProcAddr( handle, name );
+}
+
+// same as loadFunctionSlots, with the slots given as member offsets into an aggregate
+private void loadFunctionOffsets( GetProcAddr, Handle )( GetProcAddr getProcAddr, Handle handle, const( immutable( char )* )[] names, const( size_t )[] offsets, void* aggregate ) {
+	foreach( i, name; names )
+		*cast( void** )( aggregate + offsets[ i ] ) = cast( void* )getProcAddr( handle, name );
+}
+"""
+
+# helpers of the lazy loader, following LOADER_FUNCTIONS which load DispatchDevice, and followed by the trampolines
+LAZY_LOADER_FUNCTIONS = """
+
+// handles the lazily loaded functions are resolved with, set by the load*Functions bellow
+private __gshared VkInstance lazyInstance;
+private __gshared VkDevice lazyDevice;
+
+// point the slots back to the trampolines, done instead of resolving when a load*Functions is called
+private void resetFunctionSlots( const( void* )[] trampolines, void**[] slots ) {
+	foreach( i, slot; slots )
+		*slot = cast( void* )trampolines[ i ];
+}
+
+private PFN_vkVoidFunction lazyInstanceProcAddr( const( char )* name ) @nogc nothrow {
+	return vkGetInstanceProcAddr( lazyInstance, name );
+}
+
+private PFN_vkVoidFunction lazyDeviceProcAddr( const( char )* name ) @nogc nothrow {
+	return lazyDevice !is null ? vkGetDeviceProcAddr( lazyDevice, name ) : vkGetInstanceProcAddr( lazyInstance, name );
+}
+
+// trampolines, each resolves its function on first call, patches its slot with it and calls through
+// hence the function pointers are never null, '!is null' does not tell whether a function is available, check
+// vkGetInstanceProcAddr( instance, "vkFoo" ) or vkGetDeviceProcAddr( device, "vkFoo" ) !is null instead, or the
+// core version and enabled extensions, calling a function which can't be resolved halts with its name
+private extern( System ) @nogc nothrow {"""
+
+# trampoline of the lazy loader
+LAZY_TRAMPOLINE = """
+	{RETURN_TYPE} lazy_{NAME}( {PARAMS} ) {{
+		auto resolved = cast( PFN_{NAME} ){PROC_ADDR}( "{NAME}" );
+		if( resolved is null )
+			assert( 0, "{NAME} is not available, check its core version or extension before calling it" );
+		{NAME} = resolved;
+		return {NAME}( {ARGS} );
+	}}"""
+
+# DispatchTables of --dispatch shared, one per VkDevice and reference counted by the DispatchDevices holding it
+DEVICE_DISPATCH_TABLES = """
+import core.sync.mutex : Mutex;
+
+// DispatchTable of a VkDevice, see DispatchDevice.loadDeviceLevelFunctions
+private struct DeviceDispatchTable {
+	DispatchTable table;
+	VkDevice device;
+	size_t references;
+	DeviceDispatchTable* next;
+}
+
+private __gshared DeviceDispatchTable* deviceDispatchTables;
+private __gshared Mutex deviceDispatchTablesMutex;
+
+shared static this() {
+	deviceDispatchTablesMutex = new Mutex;
+}
+
+// returns the DispatchTable of device with one more reference, loaded through device if no DispatchDevice holds it yet
+private DeviceDispatchTable* acquireDeviceDispatchTable( VkDevice device ) {
+	import core.stdc.stdlib : calloc;
+	deviceDispatchTablesMutex.lock_nothrow();
+	scope( exit ) deviceDispatchTablesMutex.unlock_nothrow();
+	for( auto entry = deviceDispatchTables; entry !is null; entry = entry.next ) {
+		if( entry.device == device ) {
+			++entry.references;
+			return entry;
+		}
+	}
+
+	auto entry = cast( DeviceDispatchTable* )calloc( 1, DeviceDispatchTable.sizeof );
+	if( entry is null )
+		assert( 0, "Out of memory allocating a DispatchTable" );
+	entry.table.loadDeviceLevelFunctions( device );
+	entry.device = device;
+	entry.references = 1;
+	entry.next = deviceDispatchTables;
+	deviceDispatchTables = entry;
+	return entry;
+}
+
+private void referenceDeviceDispatchTable( DeviceDispatchTable* entry ) {
+	deviceDispatchTablesMutex.lock_nothrow();
+	scope( exit ) deviceDispatchTablesMutex.unlock_nothrow();
+	++entry.references;
+}
+
+// drops a reference to the DispatchTable of a device, the last one frees it
+private void releaseDeviceDispatchTable( DeviceDispatchTable* entry ) {
+	import core.stdc.stdlib : free;
+	deviceDispatchTablesMutex.lock_nothrow();
+	scope( exit ) deviceDispatchTablesMutex.unlock_nothrow();
+	if( --entry.references > 0 )
+		return;
+	for( auto link = &deviceDispatchTables; *link !is null; link = &( *link ).next ) {
+		if( *link is entry ) {
+			*link = entry.next;
+			break;
+		}
+	}
+	free( entry );
+}
+"""
+
 FUNCTIONS_HEADER = """\
 module {PACKAGE_PREFIX}.functions;
 
@@ -89,32 +233,32 @@ public import {PACKAGE_PREFIX}.types;
 extern( System ) @nogc nothrow {{\
 """
 
-def getFullType( elem, opaqueStruct = None ):
+def resolveFullType( elem ):
+	"""
+	Returns the C type string of elem and the name of an opaque struct it refers to, if any
+	"""
 	typ = elem.find( "type" )
 	typstr = ( elem.text or "" ).lstrip() + typ.text.strip() + ( typ.tail or "" ).rstrip()
 
 	# catch opaque structs
+	opaque = None
 	if typstr.startswith( 'struct' ):
 		typstr = typstr.lstrip( 'struct ' )
-		if isinstance( opaqueStruct, set ):
-			opaqueStruct.add( typstr.rstrip( '*' ))
+		opaque = typstr.rstrip( '*' )
 
 	arrlen = elem.find( "enum" )
 	if arrlen is not None:
-		return "{0}[ {1} ]".format( typstr, arrlen.text )
+		return "{0}[ {1} ]".format( typstr, arrlen.text ), opaque
 	else:
 		name = elem.find( "name" )
-		return typstr + ( name.tail or "" )
+		return typstr + ( name.tail or "" ), opaque
 
-def convertTypeConst( typ ):
-	"""
-	Converts C const syntax to D const syntax
-	"""
-	doubleConstMatch = re.match( re_double_const, typ )
+def translateTypeConst( typ ):
+	doubleConstMatch = re_double_const.match( typ )
 	if doubleConstMatch:
 		return "const( {0}* )*".format( doubleConstMatch.group( 1 ))
 	else:
-		singleConstMatch = re.match( re_single_const, typ )
+		singleConstMatch = re_single_const.match( typ )
 		if singleConstMatch:
 			return "const( {0} )*".format( singleConstMatch.group( 1 ))
 	return typ
@@ -126,30 +270,226 @@ def convertTypeArray( typ, name ):
 	else:
 		return typ, name
 
+class OutputBuffer:
+	"""
+	Collects generated text as a list of chunks, which are joined or written out once,
+	instead of growing a string with += for every feature
+	"""
+	def __init__( self ):
+		self.chunks = []
+
+	def __iadd__( self, text ):
+		self.chunks.append( text )
+		return self
+
+	def __bool__( self ):
+		return any( self.chunks )
+
+	def __str__( self ):
+		return "".join( self.chunks )
+
+	def format( self, **kwargs ):
+		return str( self ).format( **kwargs )
+
+	def formatLines( self, **kwargs ):
+		# replacement fields and escaped braces never span a line, so formatting line by line is equivalent
+		return self.format( **kwargs ).splitlines( True )
+
+	def writeTo( self, file ):
+		file.writelines( self.chunks )
+
+	def close( self ):
+		self.chunks = []
+
+class SpillBuffer( OutputBuffer ):
+	"""
+	OutputBuffer which writes its chunks to a temporary file as soon as they are added,
+	used in streaming mode to keep the generators resident memory independent of output size
+	"""
+	def __init__( self ):
+		self.file = tempfile.TemporaryFile( "w+", encoding = "utf-8", newline = "" )
+		self.empty = True
+
+	def __iadd__( self, text ):
+		if text:
+			self.file.write( text )
+			self.empty = False
+		return self
+
+	def __bool__( self ):
+		return not self.empty
+
+	def __str__( self ):
+		self.file.seek( 0 )
+		return self.file.read()
+
+	def formatLines( self, **kwargs ):
+		self.file.seek( 0 )
+		for line in self.file:
+			yield line.format( **kwargs )
+
+	def writeTo( self, file ):
+		self.file.seek( 0 )
+		shutil.copyfileobj( self.file, file )
+
+	def close( self ):
+		self.file.close()
+
+class OutputFile:
+	"""
+	Generated module rendered into memory, or into a temporary file next to it in streaming mode.
+	close() compares content hashes with the existing module and atomically replaces it only if it changed,
+	unchanged modules keep their mtime and don't trigger recompilation of their dependents
+	"""
+	def __init__( self, fileName, stream = False ):
+		self.fileName = fileName
+		self.changed = None
+		self.lines = 0
+		self.size = None		# in bytes once closed, reported by --profile
+		self.closed = False
+		if stream:
+			self.file = tempfile.NamedTemporaryFile( "w", encoding = "utf-8", dir = path.dirname( fileName ),
+				prefix = "." + path.basename( fileName ) + ".", suffix = ".tmp", delete = False )
+		else:
+			self.file = io.StringIO()
+
+	def __enter__( self ):
+		return self
+
+	def __exit__( self, excType, excValue, traceback ):
+		if excType is None:
+			self.close()
+		else:
+			self.discard()
+
+	def write( self, text ):
+		self.lines += text.count( "\n" )
+		return self.file.write( text )
+
+	def writelines( self, lines ):
+		for line in lines:
+			self.write( line )
+
+	@staticmethod
+	def digest( chunks ):
+		digest = hashlib.sha256()
+		for chunk in chunks:
+			digest.update( chunk )
+		return digest.digest()
+
+	@staticmethod
+	def fileChunks( fileName ):
+		with open( fileName, "rb" ) as f:
+			yield from iter( lambda: f.read( 1 << 16 ), b"" )
+
+	def replace( self, tmpName ):
+		# temporary files are created private, give the module the permissions open() would have
+		if path.isfile( self.fileName ):
+			mode = stat.S_IMODE( os.stat( self.fileName ).st_mode )
+		else:
+			umask = os.umask( 0 )
+			os.umask( umask )
+			mode = 0o666 & ~umask
+		os.chmod( tmpName, mode )
+		os.replace( tmpName, self.fileName )
+
+	def close( self ):
+		oldDigest = None
+		if path.isfile( self.fileName ):
+			oldDigest = self.digest( self.fileChunks( self.fileName ))
+
+		if isinstance( self.file, io.StringIO ):
+			# same newline translation as a file opened in text mode
+			content = self.file.getvalue().replace( "\n", os.linesep ).encode( "utf-8" )
+			self.size = len( content )
+			self.changed = oldDigest != self.digest( [ content ] )
+			if self.changed:
+				with tempfile.NamedTemporaryFile( "wb", dir = path.dirname( self.fileName ),
+					prefix = "." + path.basename( self.fileName ) + ".", suffix = ".tmp", delete = False ) as tmpFile:
+					tmpFile.write( content )
+				self.replace( tmpFile.name )
+		else:
+			self.file.close()
+			self.size = path.getsize( self.file.name )
+			self.changed = oldDigest != self.digest( self.fileChunks( self.file.name ))
+			if self.changed:
+				self.replace( self.file.name )
+			else:
+				os.remove( self.file.name )
+		self.closed = True
+
+	def discard( self ):
+		"""
+		Drops the rendered content of a module which failed to generate, the existing module is kept
+		"""
+		if self.closed:
+			return
+		self.closed = True
+		self.file.close()
+		if not isinstance( self.file, io.StringIO ) and path.exists( self.file.name ):
+			os.remove( self.file.name )
+
 class DGenerator( OutputGenerator ):
 	# This is an ordered list of sections in the header file.
 	TYPE_SECTIONS = [ 'include', 'define', 'basetype', 'handle', 'enum', 'group', 'bitmask', 'funcpointer', 'struct' ]
 	ALL_SECTIONS = TYPE_SECTIONS + [ 'commandPointer', 'command' ]
+	# Output collected over all features and written in endFile
+	OUTPUT_BUFFERS = [ 'typesFileContent', 'functionAliases', 'functionTypeDefinition', 'instanceLevelFunctions', 'deviceLevelFunctions', 'dispatchTypeDefinition', 'dispatchConvenienceFunctions',
+		'instanceLevelNameTable', 'instanceLevelSlotTable', 'deviceLevelNameTable', 'deviceLevelSlotTable', 'dispatchDeviceOffsetTable',
+		'instanceLevelTrampolineTable', 'deviceLevelTrampolineTable', 'lazyTrampolines',
+		'platformLoaderTables', 'platformInstanceLevelLoads', 'platformDeviceLevelLoads', 'platformDispatchDeviceLoads' ]
+	# lists the files generated into the output folder, kept beside it, see manifestFile
+	MANIFEST = ".{0}.erupted_manifest"
+	# Function pointers set by loadGlobalLevelFunctions, skipped by the other loaders
+	GLOBAL_LEVEL_FUNC_NAMES = { "vkGetInstanceProcAddr", "vkEnumerateInstanceExtensionProperties", "vkEnumerateInstanceLayerProperties", "vkCreateInstance" }
 	def __init__( self, errFile = sys.stderr, warnFile = sys.stderr, diagFile = sys.stderr ):
 		super().__init__( errFile, warnFile, diagFile )
 		self.headerVersion = ""
-		self.typesFileContent = ""
+		self.outputFiles = []		# the OutputFiles of the current run, see outputFile
+		self.typesFileContent = OutputBuffer()
+		self.typeModules = []		# ( module name, types content ) per feature in split layout
 
-		self.opaqueStruct = set()
+		self.opaqueStruct = dict()		# used as insertion ordered set, keeps the output independent of string hashing
 		self.sections = dict( [ ( section, [] ) for section in self.ALL_SECTIONS ] )
 		self.functionTypeName = dict()
-		self.functionTypeDefinition = ""
+		self.commandSignatures = dict()		# return type, parameters and argument names per command for the lazy loader
+		self.functionAliases = OutputBuffer()
+		self.functionTypeDefinition = OutputBuffer()
 
 		self.instanceLevelFuncNames = set()
-		self.instanceLevelFunctions = ""
+		self.instanceLevelFunctions = OutputBuffer()
 		self.deviceLevelFuncNames = set()
-		self.deviceLevelFunctions = ""
+		self.deviceLevelFunctions = OutputBuffer()
 
-		self.dispatchTypeDefinition = ""
+		self.dispatchTypeDefinition = OutputBuffer()
+		self.hotCommands = dict()		# ( __gshared member, DispatchDevice member or None ) of the commands in the usage profile
 		self.dispatchConvenienceFuncNames = dict()
-		self.dispatchConvenienceFunctions = ""
+		self.dispatchConvenienceFunctions = OutputBuffer()
 		self.maxDispatchConvenienceFuncName = 0
 
+		# table driven loader, see appendLoaderTables
+		self.instanceLevelNameTable = OutputBuffer()
+		self.instanceLevelSlotTable = OutputBuffer()
+		self.deviceLevelNameTable = OutputBuffer()
+		self.deviceLevelSlotTable = OutputBuffer()
+		self.dispatchDeviceOffsetTable = OutputBuffer()
+		self.instanceLevelTrampolineTable = OutputBuffer()
+		self.deviceLevelTrampolineTable = OutputBuffer()
+		self.lazyTrampolines = OutputBuffer()
+		self.platformLoaderTables = OutputBuffer()
+		self.platformInstanceLevelLoads = OutputBuffer()
+		self.platformDeviceLevelLoads = OutputBuffer()
+		self.platformDispatchDeviceLoads = OutputBuffer()
+
+		# emitted declarations per category, reported in endFile
+		self.symbolCounts = Counter()
+
+		# type resolution results keyed by the XML element of a member, param or proto, see getFullType and getDType
+		self.fullTypeCache = dict()
+		self.dTypeCache = dict()
+		# C to D type translation table, filled on first use of each C type
+		self.typeTranslation = dict()
+
 		self.platformExtensions = {
 			"// VK_KHR_android_surface"          : [ "VK_USE_PLATFORM_ANDROID_KHR", "public import android.native_window;\n" ],
 			"// VK_KHR_mir_surface"              : [ "VK_USE_PLATFORM_MIR_KHR",     "public import mir_toolkit.client_types;\n" ],
@@ -166,31 +506,70 @@ class DGenerator( OutputGenerator ):
 			"// VK_KHR_external_fence_win32"     : [ "VK_USE_PLATFORM_WIN32_KHR",   "" ],
 		}
 
-	def beginFile( self, genOpts ):
+	def beginRender( self, genOpts ):
+		"""
+		Prepares rendering features into the output buffers, without any file output.
+		beginFile starts with it, the --jobs workers only call this
+		"""
 		self.genOpts = genOpts
+		self.splitTypes = genOpts.layout == "split"
+		self.fullTypeCache.clear()
+		self.dTypeCache.clear()
+		self.typeTranslation.clear()
+
+	def beginFile( self, genOpts ):
+		self.beginRender( genOpts )
+		if genOpts.streamOutput:
+			for buffer in self.OUTPUT_BUFFERS:
+				setattr( self, buffer, SpillBuffer())
+
 		try:
 			os.mkdir( genOpts.filename )
 		except FileExistsError:
 			pass
 
-		self.typesFile = open( path.join( genOpts.filename, "types.d" ), "w", encoding = "utf-8" )
-		self.funcsFile = open( path.join( genOpts.filename, "functions.d" ), "w", encoding = "utf-8" )
+		# files of the previous run, those not generated again are removed in endFile
+		self.outputFiles = []
+		self.previousFiles = self.readManifest()
+
+		typesDir = path.join( genOpts.filename, "types" )
+		if self.splitTypes:
+			# a types.d module would clash with the types package, a generated one is removed with the other stale files
+			if path.isfile( typesDir + ".d" ) and "types.d" not in self.previousFiles:
+				print( "Warning: {0}.d clashes with the generated types package and should be removed".format( typesDir ), file = sys.stderr )
+		else:
+			self.typesFile = self.outputFile( typesDir + ".d", genOpts.streamOutput )
+			if path.isdir( typesDir ) and any( "types/" + name not in self.previousFiles for name in os.listdir( typesDir )):
+				print( "Warning: {0} clashes with the generated types.d module and should be removed".format( typesDir ), file = sys.stderr )
+
+		self.funcsFile = self.outputFile( path.join( genOpts.filename, "functions.d" ), genOpts.streamOutput )
 
 		#self.testsFile = open( path.join( genOpts.filename, "test.txt" ), "w", encoding = "utf-8" )
 
-		with open( path.join( genOpts.filename, "package.d" ), "w", encoding = "utf-8" ) as packageFile:
+		with self.outputFile( path.join( genOpts.filename, "package.d" )) as packageFile:
 			write( PACKAGE_HEADER.format( PACKAGE_PREFIX = genOpts.packagePrefix ), file = packageFile )
 
 		write( FUNCTIONS_HEADER.format( PACKAGE_PREFIX = genOpts.packagePrefix ), file = self.funcsFile )
 
 	def endFile( self ):
 
-		# write types.d file
-		write( TYPES_HEADER.format( PACKAGE_PREFIX = self.genOpts.packagePrefix, HEADER_VERSION = self.headerVersion ) + self.typesFileContent, file = self.typesFile )
+		# write types.d file, or the types package in split layout
+		if self.splitTypes:
+			self.writeTypeModules()
+		else:
+			self.typesFile.write( TYPES_HEADER.format( TYPES_MODULE = self.genOpts.packagePrefix + ".types", HEADER_VERSION = self.headerVersion ))
+			self.typesFileContent.writeTo( self.typesFile )
+			write( "", file = self.typesFile )
 
 		# write functions.d file
-		write( "}}\n\n__gshared {{{GLOBAL_FUNCTION_DEFINITIONS}\n}}\n".format( GLOBAL_FUNCTION_DEFINITIONS = self.functionTypeDefinition ), file = self.funcsFile )
-		write( """\
+		self.functionAliases.writeTo( self.funcsFile )
+		self.funcsFile.write( "}\n\n__gshared {" )
+		self.writeHotMembers( 0 )
+		self.functionTypeDefinition.writeTo( self.funcsFile )
+		write( "\n}\n", file = self.funcsFile )
+		if self.genOpts.loader != "statements":
+			self.writeLoaderTables()
+		self.funcsFile.write( """\
 /// if not using version "with-derelict-loader" this function must be called first
 /// sets vkCreateInstance function pointer and acquires basic functions to retrieve information about the implementation
 void loadGlobalLevelFunctions( typeof( vkGetInstanceProcAddr ) getProcAddr ) {
@@ -203,9 +582,9 @@ void loadGlobalLevelFunctions( typeof( vkGetInstanceProcAddr ) getProcAddr ) {
 /// with a valid VkInstance call this function to retrieve additional VkInstance, VkPhysicalDevice, ... related functions
 void loadInstanceLevelFunctions( VkInstance instance ) {
 	assert( vkGetInstanceProcAddr !is null, "Must call loadGlobalLevelFunctions before loadInstanceLevelFunctions" );\
-"""
-		+ self.instanceLevelFunctions
-		+ """\n\
+""" )
+		self.writeLoaderBody( "instance" )
+		self.funcsFile.write( """\n\
 }
 
 /// with a valid VkInstance call this function to retrieve VkDevice, VkQueue and VkCommandBuffer related functions
@@ -213,9 +592,9 @@ void loadInstanceLevelFunctions( VkInstance instance ) {
 /// use loadDeviceLevelFunctions( VkDevice device ) bellow to avoid this indirection and get the pointers directly form a VkDevice
 void loadDeviceLevelFunctions( VkInstance instance ) {
 	assert( vkGetInstanceProcAddr !is null, "Must call loadInstanceLevelFunctions before loadDeviceLevelFunctions" );\
-"""
-		+ self.deviceLevelFunctions.format( INSTANCE_OR_DEVICE = "Instance", instance_or_device = "instance" )
-		+ """\n\
+""" )
+		self.writeLoaderBody( "instanceDevice" )
+		self.funcsFile.write( """\n\
 }
 
 /// with a valid VkDevice call this function to retrieve VkDevice, VkQueue and VkCommandBuffer related functions
@@ -224,11 +603,85 @@ void loadDeviceLevelFunctions( VkInstance instance ) {
 /// use createGroupedDeviceLevelFunctions bellow if usage of multiple VkDevices is required
 void loadDeviceLevelFunctions( VkDevice device ) {
 	assert( vkGetDeviceProcAddr !is null, "Must call loadInstanceLevelFunctions before loadDeviceLevelFunctions" );\
-"""
-		+ self.deviceLevelFunctions.format( INSTANCE_OR_DEVICE = "Device", instance_or_device = "device" )
-		+ """\n\
-}
+""" )
+		self.writeLoaderBody( "device" )
+		self.funcsFile.write( "\n}\n" )
+		if self.genOpts.dispatch == "shared":
+			self.writeSharedDispatch()
+		else:
+			self.writeEmbeddedDispatch()
+		write( """
+// Derelict loader to acquire entry point vkGetInstanceProcAddr
+version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
+	import derelict.util.loader;
+	import derelict.util.system;
 
+	private {{
+		version( Windows )
+			enum libNames = "vulkan-1.dll";
+
+		else version( Posix )
+			enum libNames = "libvulkan.so.1";
+
+		else
+			static assert( 0,"Need to implement Vulkan libNames for this operating system." );
+	}}
+
+	class Derelict{NAME_PREFIX}Loader : SharedLibLoader {{
+		this() {{
+			super( libNames );
+		}}
+
+		protected override void loadSymbols() {{
+			typeof( vkGetInstanceProcAddr ) getProcAddr;
+			bindFunc( cast( void** )&getProcAddr, "vkGetInstanceProcAddr" );
+			loadGlobalLevelFunctions( getProcAddr );
+		}}
+	}}
+
+	__gshared Derelict{NAME_PREFIX}Loader Derelict{NAME_PREFIX};
+
+	shared static this() {{
+		Derelict{NAME_PREFIX} = new Derelict{NAME_PREFIX}Loader();
+	}}
+}}
+
+""".format(
+	NAME_PREFIX = self.genOpts.namePrefix,
+	NAME_PREFIX_UCASE = self.genOpts.namePrefix.upper()),
+	file = self.funcsFile )
+
+		if not self.splitTypes:
+			self.typesFile.close()
+		self.funcsFile.close()
+		for buffer in self.OUTPUT_BUFFERS:
+			getattr( self, buffer ).close()
+		self.writeManifest()
+
+		if self.genOpts.verbose:
+			for outFile in ( [] if self.splitTypes else [ self.typesFile ] ) + [ self.funcsFile ]:
+				print( "{0}: {1} lines{2}".format( outFile.fileName, outFile.lines, "" if outFile.changed else " (unchanged)" ))
+			print( "symbols: {0}".format( ", ".join( "{1} {0}".format( category, count ) for category, count in sorted( self.symbolCounts.items()))))
+			if self.genOpts.usageCounts:
+				print( "usage profile: {0} hot commands placed first, {1} profiled commands not generated".format(
+					len( self.hotCommands ), len( set( self.genOpts.usageCounts ) - set( self.hotCommands ))))
+
+	def writeHotMembers( self, index ):
+		"""
+		Writes the members of the commands in the usage profile, most called first, ahead of the members in registry order,
+		index 0 selects the __gshared function pointers and 1 the DispatchDevice members
+		"""
+		counts = self.genOpts.usageCounts
+		members = [ self.hotCommands[ name ][ index ] for name in sorted( self.hotCommands, key = lambda name: ( -counts[ name ], name )) ]
+		members = [ member for member in members if member is not None ]
+		if members:
+			self.funcsFile.write( "\n\n\t// hot commands of the usage profile, ordered by call count" + "".join( members ))
+
+	def writeEmbeddedDispatch( self ):
+		"""
+		Writes the DispatchDevice struct with its own copy of all device level function pointers
+		"""
+		self.funcsFile.write( """
 /// with a valid VkDevice call this function to retrieve VkDevice, VkQueue and VkCommandBuffer related functions grouped in a DispatchDevice struct
 /// the functions call directly VkDevice and related resources and can be retrieved for any VkDevice
 deprecated( \"Use DispatchDevice( VkDevice ) or DispatchDevice.loadDeviceLevelFunctions( VkDevice ) instead\" )
@@ -262,11 +715,115 @@ struct DispatchDevice {
 	void loadDeviceLevelFunctions( VkDevice device ) {
 		assert( vkGetDeviceProcAddr !is null, "Must call loadInstanceLevelFunctions before loadDeviceLevelFunctions" );
 		this.device = device;\
-"""
-			+ self.deviceLevelFunctions.format( INSTANCE_OR_DEVICE = "Device", instance_or_device = "device" ).replace( '\t', '\t\t' ).replace( '\t\t\t\t', '\t\t\t' )
-			+ """\n\
+""" )
+		self.writeLoaderBody( "dispatch" )
+		self.funcsFile.write( "\n\t}" )
+		self.writeDispatchConvenienceFunctions()
+		self.funcsFile.write( """\n\
+
+	// Member vulkan function decelerations""" )
+		self.writeHotMembers( 1 )
+		self.dispatchTypeDefinition.writeTo( self.funcsFile )
+		self.funcsFile.write( "\n}\n" )
+
+	def writeSharedDispatch( self ):
+		"""
+		--dispatch shared: writes the device level function pointers into a DispatchTable, loaded once per VkDevice
+		and shared by all DispatchDevices of the device, which only hold the VkDevice and a counted reference to the table
+		"""
+		self.funcsFile.write( """
+/// device level functions of a VkDevice, they must only be called with that device or its child objects
+/// DispatchDevice.loadDeviceLevelFunctions shares one per VkDevice, a DispatchTable can also be loaded explicitly
+/// and passed to DispatchDevice( VkDevice, const( DispatchTable )* )
+struct DispatchTable {
+
+	// load the device level member functions through the passed in VkDevice
+	void loadDeviceLevelFunctions( VkDevice device ) {
+		assert( vkGetDeviceProcAddr !is null, "Must call loadInstanceLevelFunctions before loadDeviceLevelFunctions" );\
+""" )
+		self.writeLoaderBody( "dispatch" )
+		self.funcsFile.write( """\n\
 	}
 
+	// Member vulkan function decelerations""" )
+		self.writeHotMembers( 1 )
+		self.dispatchTypeDefinition.writeTo( self.funcsFile )
+		self.funcsFile.write( "\n}\n" )
+		self.funcsFile.write( DEVICE_DISPATCH_TABLES )
+		self.funcsFile.write( """
+
+// struct to group per device deviceLevelFunctions into a custom namespace
+// keeps track of the device to which the functions are bound, the functions themselves are in the DispatchTable of the device
+// all DispatchDevices of a VkDevice, and copies of them, share its DispatchTable, the last one going out of scope frees it
+struct DispatchDevice {
+	private VkDevice device = VK_NULL_HANDLE;
+	private const( DispatchTable )* table;
+	private DeviceDispatchTable* entry;		// counted reference to the shared table, null with an explicitly passed in table
+	VkCommandBuffer commandBuffer;
+
+	// return copy of the internal VkDevice
+	VkDevice vkDevice() {
+		return device;
+	}
+
+	// the members of the DispatchTable are accessible as members of the DispatchDevice
+	ref const( DispatchTable ) functions() const {
+		return *table;
+	}
+	alias functions this;
+
+	// Constructor forwards parameter 'device' to 'this.loadDeviceLevelFunctions'
+	this( VkDevice device ) {
+		this.loadDeviceLevelFunctions( device );
+	}
+
+	// Constructor using an explicitly loaded DispatchTable of device, which must outlive the DispatchDevice
+	this( VkDevice device, const( DispatchTable )* table ) {
+		this.device = device;
+		this.table = table;
+	}
+
+	// copies hold their own reference to the shared DispatchTable
+	this( this ) {
+		if( entry !is null )
+			referenceDeviceDispatchTable( entry );
+	}
+
+	~this() {
+		releaseDeviceLevelFunctions();
+	}
+
+	// use the DispatchTable of the passed in VkDevice, loaded through it unless another DispatchDevice already holds it
+	// this also sets the private member 'device' to the passed in VkDevice and releases a previously loaded table
+	// release all DispatchDevices of a VkDevice after destroying it, before a new device may reuse its handle
+	// now the DispatchDevice can be used e.g.:
+	//		auto dd = DispatchDevice( device );
+	//		dd.vkDestroyDevice( dd.vkDevice, pAllocator );
+	//		dd.releaseDeviceLevelFunctions;
+	// convenience functions to omit the first arg do exist, see bellow
+	void loadDeviceLevelFunctions( VkDevice device ) {
+		auto acquired = acquireDeviceDispatchTable( device );
+		this.releaseDeviceLevelFunctions();
+		this.device = device;
+		this.table = &acquired.table;
+		this.entry = acquired;
+	}
+
+	// drop the reference to the shared DispatchTable, done on destruction, an explicitly passed in table is left alone
+	// the functions must not be called through this DispatchDevice afterwards, its copies keep the table alive
+	void releaseDeviceLevelFunctions() {
+		if( entry !is null )
+			releaseDeviceDispatchTable( entry );
+		device = VK_NULL_HANDLE;
+		table = null;
+		entry = null;
+	}""" )
+		self.writeDispatchConvenienceFunctions()
+		self.funcsFile.write( "\n}\n" )
+
+	def writeDispatchConvenienceFunctions( self ):
+		self.funcsFile.write( """
+
 	// Convenience member functions, forwarded to corresponding vulkan functions
 	// If the first arg of the vulkan function is VkDevice it can be omitted
 	// private 'DipatchDevice' member 'device' will be passed to the forwarded vulkan functions
@@ -283,63 +840,133 @@ struct DispatchDevice {
 	//		dd.BeginCommandBuffer( &beginInfo );
 	//		dd.CmdBindPipeline( VK_PIPELINE_BIND_POINT_GRAPHICS, some_pipeline );
 	//
-	// Does not work with queues, there are just too few queue related functions"""
-
-	+ self.dispatchConvenienceFunctions
-	+ """\n\
-
-	// Member vulkan function decelerations{DISPATCH_FUNCTION_DEFINITIONS}
-}}
-
-// Derelict loader to acquire entry point vkGetInstanceProcAddr
-version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
-	import derelict.util.loader;
-	import derelict.util.system;
-
-	private {{
-		version( Windows )
-			enum libNames = "vulkan-1.dll";
-
-		else version( Posix )
-			enum libNames = "libvulkan.so.1";
-
-		else
-			static assert( 0,"Need to implement Vulkan libNames for this operating system." );
-	}}
-
-	class Derelict{NAME_PREFIX}Loader : SharedLibLoader {{
-		this() {{
-			super( libNames );
-		}}
-
-		protected override void loadSymbols() {{
-			typeof( vkGetInstanceProcAddr ) getProcAddr;
-			bindFunc( cast( void** )&getProcAddr, "vkGetInstanceProcAddr" );
-			loadGlobalLevelFunctions( getProcAddr );
-		}}
-	}}
-
-	__gshared Derelict{NAME_PREFIX}Loader Derelict{NAME_PREFIX};
-
-	shared static this() {{
-		Derelict{NAME_PREFIX} = new Derelict{NAME_PREFIX}Loader();
-	}}
-}}
-
-""".format(
-	NAME_PREFIX = self.genOpts.namePrefix,
-	NAME_PREFIX_UCASE = self.genOpts.namePrefix.upper(),
-	DISPATCH_FUNCTION_DEFINITIONS = self.dispatchTypeDefinition ),
-	file = self.funcsFile )
-
-		self.typesFile.close()
-		self.funcsFile.close()
+	// Does not work with queues, there are just too few queue related functions""" )
+		self.dispatchConvenienceFunctions.writeTo( self.funcsFile )
+
+	def writeTypeModules( self ):
+		"""
+		Split layout: writes one module per core version and extension, each publicly importing the modules
+		which declare the symbols it references, and the aggregate {PACKAGE_PREFIX}.types package module
+		"""
+		typesDir = path.join( self.genOpts.filename, "types" )
+		os.makedirs( typesDir, exist_ok = True )
+		typesPackage = self.genOpts.packagePrefix + ".types"
+
+		baseModule = typesPackage + ".base"
+		with self.outputFile( path.join( typesDir, "base.d" )) as moduleFile:
+			write( TYPES_HEADER.format( TYPES_MODULE = baseModule, HEADER_VERSION = self.headerVersion ), file = moduleFile )
+		moduleFiles = [ moduleFile ]
+		modules = [ baseModule ]
+
+		symbolModules = dict()
+		for name, content in self.typeModules:
+			module = "{0}.{1}".format( typesPackage, name )
+			declared = set( symbol for match in re_declaration.findall( content ) for symbol in match if symbol )
+			imported = set( symbolModules[ identifier ] for identifier in set( re_identifier.findall( content )) - declared if identifier in symbolModules )
+			imports = [ baseModule ] + [ m for m in modules if m in imported ]
+			with self.outputFile( path.join( typesDir, name + ".d" ), self.genOpts.streamOutput ) as moduleFile:
+				write( TYPE_MODULE_HEADER.format( MODULE = module, IMPORTS = "".join( "public import {0};\n".format( m ) for m in imports )), file = moduleFile )
+				write( content, file = moduleFile )
+			moduleFiles.append( moduleFile )
+			modules.append( module )
+			symbolModules.update(( symbol, module ) for symbol in declared )
+
+		with self.outputFile( path.join( typesDir, "package.d" )) as moduleFile:
+			write( "module {0};\n".format( typesPackage ) + "".join( "\npublic import {0};".format( m ) for m in modules ), file = moduleFile )
+		moduleFiles.append( moduleFile )
+
+		if self.genOpts.verbose:
+			print( "{0}: {1} modules, {2} lines, {3} changed".format( typesDir, len( moduleFiles ),
+				sum( moduleFile.lines for moduleFile in moduleFiles ), sum( 1 for moduleFile in moduleFiles if moduleFile.changed )))
+
+	def outputFile( self, fileName, stream = False ):
+		outFile = OutputFile( fileName, stream )
+		self.outputFiles.append( outFile )
+		return outFile
+
+	def discardOutput( self ):
+		"""
+		Drops the modules still open when generation failed or was interrupted between beginFile and endFile,
+		the existing modules are kept and no temporary files of --stream are left in the output folder
+		"""
+		for outFile in self.outputFiles:
+			outFile.discard()
+		for buffer in self.OUTPUT_BUFFERS:
+			getattr( self, buffer ).close()
+
+	def manifestFile( self ):
+		"""
+		The manifest is kept beside the output folder, e.g. source/.erupted.erupted_manifest, not to ship with the package
+		"""
+		outFolder = path.normpath( self.genOpts.filename )
+		return path.join( path.dirname( outFolder ), self.MANIFEST.format( path.basename( outFolder )))
+
+	def readManifest( self ):
+		"""
+		Output folder relative paths of the files generated by the previous run, as listed in its manifest
+		"""
+		try:
+			with open( self.manifestFile(), encoding = "utf-8" ) as f:
+				return set( f.read().splitlines())
+		except FileNotFoundError:
+			return set()
+
+	def writeManifest( self ):
+		"""
+		Lists the generated files in the manifest and removes the files of the previous run which were not generated again,
+		e.g. modules of dropped extensions or types.d after switching to the split layout. Other files are never touched
+		"""
+		generated = [ path.relpath( outFile.fileName, self.genOpts.filename ).replace( os.sep, "/" ) for outFile in self.outputFiles ]
+		for fileName in sorted( self.previousFiles - set( generated )):
+			if path.isabs( fileName ) or ".." in fileName.split( "/" ):
+				continue
+			try:
+				os.remove( path.join( self.genOpts.filename, fileName ))
+			except FileNotFoundError:
+				pass
+			# drop directories left empty, like types after switching to the single layout
+			directory = path.join( self.genOpts.filename, path.dirname( fileName ))
+			if path.dirname( fileName ) and path.isdir( directory ) and not os.listdir( directory ):
+				os.rmdir( directory )
+
+		with OutputFile( self.manifestFile()) as manifestFile:
+			write( "\n".join( generated ), file = manifestFile )
+
+	def getFullType( self, elem, opaqueStruct = None ):
+		resolved = self.fullTypeCache.get( elem )
+		if resolved is None:
+			resolved = self.fullTypeCache[ elem ] = resolveFullType( elem )
+
+		typstr, opaque = resolved
+		if opaque is not None and isinstance( opaqueStruct, dict ):
+			opaqueStruct[ opaque ] = None
+		return typstr
+
+	def getDType( self, elem, opaqueStruct = None ):
+		"""
+		Shorthand for convertTypeConst( getFullType( elem, opaqueStruct ).strip()), cached per element
+		"""
+		typstr = self.getFullType( elem, opaqueStruct )
+		dType = self.dTypeCache.get( elem )
+		if dType is None:
+			dType = self.dTypeCache[ elem ] = self.convertTypeConst( typstr.strip())
+		return dType
+
+	def convertTypeConst( self, typ ):
+		"""
+		Converts C const syntax to D const syntax
+		"""
+		converted = self.typeTranslation.get( typ )
+		if converted is None:
+			converted = self.typeTranslation[ typ ] = translateTypeConst( typ )
+		return converted
 
 	def beginFeature( self, interface, emit ):
 		OutputGenerator.beginFeature( self, interface, emit )
 		#if interface.attrib.get( 'protect' ):
 			#write( interface.attrib[ 'name' ], file = self.testsFile )
 		self.currentFeature = "// {0}".format( interface.attrib[ 'name' ] )
+		self.currentModule = interface.attrib[ 'name' ].lower()
 		self.sections = dict( [ ( section, [] ) for section in self.ALL_SECTIONS ] )
 		self.opaqueStruct.clear()
 		self.platformExtensionVersionIndent = ""
@@ -353,7 +980,7 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 
 			# special treat for platform surface extension which get wrapped into a version block
 			extIndent = self.platformExtensionVersionIndent
-			fileContent = self.typesFileContent
+			fileContent = OutputBuffer() if self.splitTypes else self.typesFileContent
 			fileContent += "\n{0}\n".format( self.currentFeature )
 			version_platform = ""
 			if self.isPlatformExtension:
@@ -391,7 +1018,8 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 			if self.isPlatformExtension:
 				fileContent += "}\n"
 
-			self.typesFileContent = fileContent
+			if self.splitTypes:
+				self.typeModules.append(( self.currentModule, str( fileContent )))
 
 			fileContent = ""
 
@@ -401,7 +1029,7 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 				fileContent += '\n' + extIndent + ( '\n' + extIndent ).join( self.sections[ 'commandPointer' ] ) #write( extIndent + ( '\n' + extIndent ).join( self.sections[ 'commandPointer' ] ), file = self.funcsFile )
 				if self.isPlatformExtension: fileContent += "\n}" #write( "}", file = self.funcsFile )
 				fileContent += '\n' #write( '', file = self.funcsFile )
-				write( fileContent, file = self.funcsFile )
+				self.functionAliases += fileContent + '\n'
 				fileContent = ""
 
 			# write function aliases into functions.d and build strings for later injection
@@ -414,7 +1042,7 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 				if self.isPlatformExtension: fileContent += "\n\t" + version_platform #write( "\t" + version_platform, file = self.funcsFile )
 				fileContent += "\n" + extIndent + ( '\n' + extIndent ).join( self.sections[ 'command' ] ) #write( extIndent + ( '\n' + extIndent ).join( self.sections[ 'command' ] ), file = self.funcsFile )
 				if self.isPlatformExtension: fileContent += "\n\t}" #write( "\t}", file = self.funcsFile )
-				write( fileContent, file = self.funcsFile )
+				self.functionAliases += fileContent + '\n'
 				fileContent = ""
 
 				# capture if function is a instance or device level function
@@ -428,10 +1056,13 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 				# surface extension version directive
 				if self.isPlatformExtension: self.functionTypeDefinition += "\n\t" + version_platform
 
-				# create string of functionTypes functionVars
+				# create string of functionTypes functionVars, commands in the usage profile are written first in endFile
 				for command in self.sections[ 'command' ]:
 					name = self.functionTypeName[ command ]
-					self.functionTypeDefinition += "\n\t{1}PFN_{0} {0};".format( name, extIndent )
+					if self.isHotCommand( name ):
+						self.hotCommands[ name ] = [ self.hotMember( "\n\tPFN_{0} {0};".format( name )), None ]
+					else:
+						self.functionTypeDefinition += "\n\t{1}PFN_{0} {0};".format( name, extIndent )
 
 					# query if the current function is in instance or deviceLevelFuncNames for the next step
 					if not inInstanceLevelFuncNames and name in self.instanceLevelFuncNames:
@@ -445,21 +1076,19 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 				# surface extension version closing curly brace
 				if self.isPlatformExtension: self.functionTypeDefinition += "\n\t}"
 
-				# create a strings to load instance level functions
-				if inInstanceLevelFuncNames:
+				# create a strings to load instance level functions, the table and lazy loaders only need the tables appended bellow
+				statements = self.genOpts.loader == "statements"
+				if inInstanceLevelFuncNames and statements:
 					# comment the current feature
 					self.instanceLevelFunctions += "\n\n{0}".format( self.currentFeature )
 
 					# surface extension version directive
 					if self.isPlatformExtension: self.instanceLevelFunctions += "\n\t" + version_platform
 
-					# set of global level function names, function pointers are ignored here are set in endFile method
-					gloablLevelFuncNames = {"vkGetInstanceProcAddr", "vkEnumerateInstanceExtensionProperties", "vkEnumerateInstanceLayerProperties", "vkCreateInstance"}
-
-					# build the commands
+					# build the commands, global level function pointers are ignored here and set in endFile method
 					for command in self.sections[ 'command' ]:
 						name = self.functionTypeName[ command ]
-						if name in self.instanceLevelFuncNames and name not in gloablLevelFuncNames:
+						if name in self.instanceLevelFuncNames and name not in self.GLOBAL_LEVEL_FUNC_NAMES:
 							self.instanceLevelFunctions += "\n\t{1}{0} = cast( typeof( {0} )) vkGetInstanceProcAddr( instance, \"{0}\" );".format( name, extIndent )
 
 					# surface extension version closing curly brace
@@ -469,7 +1098,7 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 				# create a string to load device level functions
 				if inDeviceLevelFuncNames:
 					# comment the current feature
-					self.deviceLevelFunctions += "\n\n{0}".format( self.currentFeature )
+					if statements: self.deviceLevelFunctions += "\n\n{0}".format( self.currentFeature )
 
 					# surface extension version directive
 					if self.isPlatformExtension:
@@ -478,21 +1107,25 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 
 						# need to change version platform due to INSTANCE_OR_DEVICE format element
 						version_platform = "version( {0} ) {{{{".format( self.platformExtensions[ self.currentFeature[1:] ][ 0 ] )
-						self.deviceLevelFunctions += "\n\t" + version_platform
+						if statements: self.deviceLevelFunctions += "\n\t" + version_platform
 
 
 					# build the commands
 					for command in self.sections[ 'command' ]:
 						name = self.functionTypeName[ command ]
 						if name in self.deviceLevelFuncNames:
-							self.deviceLevelFunctions += "\n\t{1}{0} = cast( typeof( {0} )) vkGet{{INSTANCE_OR_DEVICE}}ProcAddr( {{instance_or_device}}, \"{0}\" );".format( name, extIndent )
+							if statements: self.deviceLevelFunctions += "\n\t{1}{0} = cast( typeof( {0} )) vkGet{{INSTANCE_OR_DEVICE}}ProcAddr( {{instance_or_device}}, \"{0}\" );".format( name, extIndent )
 
 							# this function type definitions end up in the DispatchDevice struct
-							self.dispatchTypeDefinition += "\n\t{1}PFN_{0} {0};".format( name, extIndent )
+							member = "\n\tPFN_{0} {0};".format( name )
+							if self.isHotCommand( name ):
+								self.hotCommands[ name ][ 1 ] = self.hotMember( member )
+							else:
+								self.dispatchTypeDefinition += member.replace( "\n", "\n" + extIndent )
 
 					# surface extension version closing curly brace
 					if self.isPlatformExtension:
-						self.deviceLevelFunctions += "\n\t}}"	# closing braces for formated device level functions
+						if statements: self.deviceLevelFunctions += "\n\t}}"	# closing braces for formated device level functions
 						self.dispatchTypeDefinition += "\n\t}"	# closing braces for unformated dispatch device struct
 
 
@@ -509,24 +1142,175 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 						self.dispatchConvenienceFunctions += "\n\t" + version_platform
 
 
-					# build the commands
+					# build the commands, with shared tables the function pointers are members of DispatchDevice.table
+					qualifier = "table." if self.genOpts.dispatch == "shared" else ""
 					for command in self.sections[ 'command' ]:
 						name = self.functionTypeName[ command ]
 						if name in self.dispatchConvenienceFuncNames:
-							self.dispatchConvenienceFunctions +=  '\n' + self.dispatchConvenienceFuncNames[ name ].format( extIndent )
+							self.dispatchConvenienceFunctions +=  '\n' + self.dispatchConvenienceFuncNames[ name ].format( extIndent, qualifier )
 
 					# surface extension version closing curly brace
 					if self.isPlatformExtension:
 						self.dispatchConvenienceFunctions += "\n\t}"	# closing braces for formated device level functions
 
+				if not statements:
+					self.appendLoaderTables()
 
 		# Finish processing in superclass
 		OutputGenerator.endFeature( self )
 
+	def isHotCommand( self, name ):
+		counts = self.genOpts.usageCounts
+		return counts is not None and counts.get( name, 0 ) > 0
+
+	def hotMember( self, member ):
+		"""
+		Wraps a member of the hot block into the version block of its platform extension, if any
+		"""
+		if not self.isPlatformExtension:
+			return member
+		return "\n\tversion( {0} ) {{".format( self.platformExtensions[ self.currentFeature.strip() ][ 0 ] ) + member.replace( "\n", "\n\t" ) + "\n\t}"
+
+	def appendLoaderTables( self ):
+		"""
+		Table driven and lazy loader: appends the loadable commands of the current feature to the tables of function names
+		and of the slots their pointers are loaded into, platform extensions get their own tables in a version block.
+		The lazy loader additionally gets a trampoline per command and tables of trampolines to reset the __gshared slots to,
+		DispatchDevice is loaded as with the table driven loader, its trampolines could not tell which device to resolve with
+		"""
+		names = [ self.functionTypeName[ command ] for command in self.sections[ 'command' ] ]
+		instanceNames = [ name for name in names if name in self.instanceLevelFuncNames and name not in self.GLOBAL_LEVEL_FUNC_NAMES ]
+		deviceNames = [ name for name in names if name in self.deviceLevelFuncNames ]
+		if not instanceNames and not deviceNames:
+			return
+
+		isLazy = self.genOpts.loader == "lazy"
+		dispatchStruct = "DispatchTable" if self.genOpts.dispatch == "shared" else "DispatchDevice"
+		feature = self.currentFeature.strip()
+		extIndent = self.platformExtensionVersionIndent
+
+		if isLazy:
+			# trampolines resolve their function on first call and patch their slot with it
+			self.lazyTrampolines += "\n\n\t{0}".format( feature )
+			if self.isPlatformExtension:
+				self.lazyTrampolines += "\n\tversion( {0} ) {{".format( self.platformExtensions[ feature ][ 0 ] )
+			for name in instanceNames + deviceNames:
+				returnType, params, args = self.commandSignatures[ name ]
+				self.lazyTrampolines += LAZY_TRAMPOLINE.format( NAME = name, RETURN_TYPE = returnType, PARAMS = params, ARGS = args,
+					PROC_ADDR = "lazyInstanceProcAddr" if name in instanceNames else "lazyDeviceProcAddr" ).replace( "\n", "\n" + extIndent )
+			if self.isPlatformExtension:
+				self.lazyTrampolines += "\n\t}"
+
+		tables = [ ( "immutable( char* )", "instanceLevelNames", "instanceLevelNameTable", instanceNames, "\n\t\"{0}\"," ),
+			( "__gshared void**", "instanceLevelSlots", "instanceLevelSlotTable", instanceNames, "\n\tcast( void** )&{0}," ),
+			( "immutable( char* )", "deviceLevelNames", "deviceLevelNameTable", deviceNames, "\n\t\"{0}\"," ),
+			( "__gshared void**", "deviceLevelSlots", "deviceLevelSlotTable", deviceNames, "\n\tcast( void** )&{0}," ),
+			( "immutable size_t", "dispatchDeviceOffsets", "dispatchDeviceOffsetTable", deviceNames, "\n\t" + dispatchStruct + ".{0}.offsetof," ) ]
+		if isLazy:
+			tables += [ ( "__gshared void*", "instanceLevelTrampolines", "instanceLevelTrampolineTable", instanceNames, "\n\tcast( void* )&lazy_{0}," ),
+				( "__gshared void*", "deviceLevelTrampolines", "deviceLevelTrampolineTable", deviceNames, "\n\tcast( void* )&lazy_{0}," ) ]
+
+		if not self.isPlatformExtension:
+			for _, _, bufferName, tableNames, entry in tables:
+				if tableNames:
+					buffer = getattr( self, bufferName )
+					buffer += "\n\n\t{0}".format( feature ) + "".join( entry.format( name ) for name in tableNames )
+			return
+
+		platform = self.platformExtensions[ feature ][ 0 ]
+		extension = feature[ 3: ]
+		self.platformLoaderTables += "\n\n{0}\nversion( {1} ) {{".format( feature, platform )
+		for typ, table, _, tableNames, entry in tables:
+			if tableNames:
+				self.platformLoaderTables += LOADER_TABLE.format( TYPE = typ, NAME = table + "_" + extension,
+					ENTRIES = "".join( entry.format( name ) for name in tableNames )).replace( "\n", "\n\t" )
+		self.platformLoaderTables += "\n}"
+
+		if isLazy:
+			if instanceNames:
+				self.platformInstanceLevelLoads += "\n\tversion( {0} ) resetFunctionSlots( instanceLevelTrampolines_{1}, instanceLevelSlots_{1} );".format( platform, extension )
+			if deviceNames:
+				self.platformDeviceLevelLoads += "\n\tversion( {0} ) resetFunctionSlots( deviceLevelTrampolines_{1}, deviceLevelSlots_{1} );".format( platform, extension )
+		else:
+			if instanceNames:
+				self.platformInstanceLevelLoads += "\n\tversion( {0} ) loadFunctionSlots( vkGetInstanceProcAddr, instance, instanceLevelNames_{1}, instanceLevelSlots_{1} );".format( platform, extension )
+			if deviceNames:
+				self.platformDeviceLevelLoads += "\n\tversion( {0} ) loadFunctionSlots( vkGet{{INSTANCE_OR_DEVICE}}ProcAddr, {{instance_or_device}}, deviceLevelNames_{1}, deviceLevelSlots_{1} );".format( platform, extension )
+		if deviceNames:
+			self.platformDispatchDeviceLoads += "\n\t\tversion( {0} ) loadFunctionOffsets( vkGetDeviceProcAddr, device, deviceLevelNames_{1}, dispatchDeviceOffsets_{1}, &this );".format( platform, extension )
+
+	def writeLoaderTables( self ):
+		write( "\n// Table driven loader, names of the loadable functions and the slots their pointers are loaded into", file = self.funcsFile, end = "" )
+		tables = [
+			( "immutable( char* )", "instanceLevelNames",    self.instanceLevelNameTable ),
+			( "__gshared void**",   "instanceLevelSlots",    self.instanceLevelSlotTable ),
+			( "immutable( char* )", "deviceLevelNames",      self.deviceLevelNameTable ),
+			( "__gshared void**",   "deviceLevelSlots",      self.deviceLevelSlotTable ),
+			( "immutable size_t",   "dispatchDeviceOffsets", self.dispatchDeviceOffsetTable ) ]
+		if self.genOpts.loader == "lazy":
+			tables += [
+			( "__gshared void*",    "instanceLevelTrampolines", self.instanceLevelTrampolineTable ),
+			( "__gshared void*",    "deviceLevelTrampolines",   self.deviceLevelTrampolineTable ) ]
+		for typ, name, table in tables:
+			write( LOADER_TABLE.format( TYPE = typ, NAME = name, ENTRIES = str( table )), file = self.funcsFile, end = "" )
+		self.platformLoaderTables.writeTo( self.funcsFile )
+
+		if self.genOpts.loader == "lazy":
+			write( LOADER_FUNCTIONS + LAZY_LOADER_FUNCTIONS, file = self.funcsFile, end = "" )
+			self.lazyTrampolines.writeTo( self.funcsFile )
+			write( "\n}\n", file = self.funcsFile )
+		else:
+			write( LOADER_FUNCTIONS, file = self.funcsFile )
+
+	def writeLoaderBody( self, loader ):
+		"""
+		Writes the body of a generated loader function, loader is one of 'instance' for loadInstanceLevelFunctions,
+		'instanceDevice' and 'device' for the two loadDeviceLevelFunctions and 'dispatch' for DispatchDevice.loadDeviceLevelFunctions
+		"""
+		if self.genOpts.loader == "statements":
+			if loader == "instance":
+				self.instanceLevelFunctions.writeTo( self.funcsFile )
+			elif loader == "instanceDevice":
+				self.funcsFile.writelines( self.deviceLevelFunctions.formatLines( INSTANCE_OR_DEVICE = "Instance", instance_or_device = "instance" ))
+			elif loader == "device":
+				self.funcsFile.writelines( self.deviceLevelFunctions.formatLines( INSTANCE_OR_DEVICE = "Device", instance_or_device = "device" ))
+			else:
+				self.funcsFile.writelines( line.replace( '\t', '\t\t' ).replace( '\t\t\t\t', '\t\t\t' )
+					for line in self.deviceLevelFunctions.formatLines( INSTANCE_OR_DEVICE = "Device", instance_or_device = "device" ))
+
+		elif loader == "dispatch":
+			self.funcsFile.write( "\n\t\tloadFunctionOffsets( vkGetDeviceProcAddr, device, deviceLevelNames, dispatchDeviceOffsets, &this );" )
+			self.platformDispatchDeviceLoads.writeTo( self.funcsFile )
+
+		elif self.genOpts.loader == "lazy":
+			if loader == "instance":
+				self.funcsFile.write( "\n\tlazyInstance = instance;\n\tresetFunctionSlots( instanceLevelTrampolines, instanceLevelSlots );" )
+				self.platformInstanceLevelLoads.writeTo( self.funcsFile )
+			else:
+				if loader == "instanceDevice":
+					self.funcsFile.write( "\n\tlazyInstance = instance;\n\tlazyDevice = null;" )
+				else:
+					self.funcsFile.write( "\n\tlazyDevice = device;" )
+				self.funcsFile.write( "\n\tresetFunctionSlots( deviceLevelTrampolines, deviceLevelSlots );" )
+				self.platformDeviceLevelLoads.writeTo( self.funcsFile )
+
+		elif loader == "instance":
+			self.funcsFile.write( "\n\tloadFunctionSlots( vkGetInstanceProcAddr, instance, instanceLevelNames, instanceLevelSlots );" )
+			self.platformInstanceLevelLoads.writeTo( self.funcsFile )
+		else:
+			instanceOrDevice = "instance" if loader == "instanceDevice" else "device"
+			self.funcsFile.write( "\n\tloadFunctionSlots( vkGet{0}ProcAddr, {1}, deviceLevelNames, deviceLevelSlots );".format( instanceOrDevice.capitalize(), instanceOrDevice ))
+			self.funcsFile.writelines( self.platformDeviceLevelLoads.formatLines( INSTANCE_OR_DEVICE = instanceOrDevice.capitalize(), instance_or_device = instanceOrDevice ))
+
 	# Append a definition to the specified section
 	def appendSection( self, section, text ):
 		self.sections[ section ].append( text )
 
+	# Count a declaration of an emitted feature for the endFile report
+	def countSymbol( self, category ):
+		if self.emit:
+			self.symbolCounts[ category ] += 1
+
 	def genType( self, typeinfo, name ):
 		super().genType( typeinfo, name )
 		if "requires" in typeinfo.elem.attrib:
@@ -542,6 +1326,8 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 			return
 
 		category = typeinfo.elem.attrib[ "category" ]
+		if category in { "handle", "basetype", "bitmask", "funcpointer" }:
+			self.countSymbol( category )
 
 		if category == "handle":
 			self.appendSection( "handle", "mixin( {0}!q{{{1}}} );".format( typeinfo.elem.find( "type" ).text, name ))
@@ -562,7 +1348,7 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 				for line in params.splitlines():
 					lineSplit = line.split()
 					if len( lineSplit ) > 2:
-						concatParams += ' ' + convertTypeConst( lineSplit[ 0 ] + ' ' + lineSplit[ 1 ] ) + ' ' + lineSplit[ 2 ]
+						concatParams += ' ' + self.convertTypeConst( lineSplit[ 0 ] + ' ' + lineSplit[ 1 ] ) + ' ' + lineSplit[ 2 ]
 					else:
 						concatParams += ' ' + ' '.join( param for param in lineSplit )
 
@@ -585,12 +1371,13 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 	def genStruct( self, typeinfo, name ):
 		super().genStruct( typeinfo, name )
 		category = typeinfo.elem.attrib[ "category" ]
+		self.countSymbol( category )
 		self.appendSection( "struct", "\n{2}{0} {1} {{".format( category, name, self.platformExtensionVersionIndent ))
 		targetLen = 0
 		memberTypeName = []
 
 		for member in typeinfo.elem.findall( "member" ):
-			memberType = convertTypeConst( getFullType( member, self.opaqueStruct ).strip())
+			memberType = self.getDType( member, self.opaqueStruct )
 			memberName = member.find( "name" ).text
 
 			if memberName == "module":
@@ -615,6 +1402,7 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 
 	def genGroup( self, groupinfo, groupName ):
 		super().genGroup( groupinfo, groupName )
+		self.countSymbol( "group" )
 
 		groupElem = groupinfo.elem
 
@@ -687,6 +1475,7 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 
 	def genEnum( self, enuminfo, name ):
 		super().genEnum( enuminfo, name )
+		self.countSymbol( "enum" )
 		_,strVal = self.enumToValue( enuminfo.elem, False )
 		if strVal == "VK_STRUCTURE_TYPE_DEBUG_REPORT_CALLBACK_CREATE_INFO_EXT":
 			strVal = "VkStructureType." + strVal
@@ -697,16 +1486,21 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 		#if name not in {"vkGetInstanceProcAddr", "vkEnumerateInstanceExtensionProperties", "vkEnumerateInstanceLayerProperties", "vkCreateInstance"}:
 		super().genCmd( cmdinfo, name )
 		proto = cmdinfo.elem.find( "proto" )
-		returnType = convertTypeConst( getFullType( proto ).strip())
+		returnType = self.getDType( proto )
 		#write( returnType, file = self.testsFile )
 
 		params = cmdinfo.elem.findall( "param" )
-		joinedParams = ", ".join( convertTypeConst( getFullType( param, self.opaqueStruct ).strip()) + " " + param.find( "name" ).text for param in params )
+		paramTypes = [ self.getDType( param, self.opaqueStruct ) for param in params ]
+		paramNames = [ param.find( "name" ).text for param in params ]
+		joinedParams = ", ".join( paramType + " " + paramName for paramType, paramName in zip( paramTypes, paramNames ))
 		funcTypeName = "\talias PFN_{0} = {1} function( {2} );".format( name, returnType, joinedParams )
 		self.appendSection( 'command', funcTypeName )
+		self.countSymbol( "command" )
 		self.functionTypeName[ funcTypeName ] = name
+		self.commandSignatures[ name ] = ( returnType, joinedParams, ", ".join( paramNames ))
 
-		if name != "vkGetDeviceProcAddr" and getFullType( params[ 0 ] ) in { "VkDevice", "VkQueue", "VkCommandBuffer" }:
+		firstParamType = self.getFullType( params[ 0 ] )
+		if name != "vkGetDeviceProcAddr" and firstParamType in { "VkDevice", "VkQueue", "VkCommandBuffer" }:
 			self.deviceLevelFuncNames.add( name )
 
 			doReturn = ""
@@ -715,19 +1509,19 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 
 			joinedArgs = ""
 			if len( params[1:] ):
-				joinedArgs = ", " + ", ".join( param.find( "name" ).text for param in params[1:] )
-			joinedParams = ", ".join( convertTypeConst( getFullType( param, self.opaqueStruct ).strip()) + " " + param.find( "name" ).text for param in params[1:] )
+				joinedArgs = ", " + ", ".join( paramNames[1:] )
+			joinedParams = ", ".join( paramType + " " + paramName for paramType, paramName in zip( paramTypes[1:], paramNames[1:] ))
 			self.maxDispatchConvenienceFuncName = max( len( returnType ) + 2 + len( name ) + 2 + len( joinedParams ) + 2, self.maxDispatchConvenienceFuncName )
 
 			# create convenience functions for DispatchDevice
-			if getFullType( params[ 0 ] ) == "VkDevice":
-				forwardFuncs = "\t{{0}}{0} {1}( {2} ) {{{{\n{{0}}\t\t{3}{4}( this.device{5} );\n{{0}}\t}}}}".format(
+			if firstParamType == "VkDevice":
+				forwardFuncs = "\t{{0}}{0} {1}( {2} ) {{{{\n{{0}}\t\t{3}{{1}}{4}( this.device{5} );\n{{0}}\t}}}}".format(
 					returnType, name[2:], joinedParams, doReturn, name, joinedArgs ).replace( '(  )', '()' )
 				self.dispatchConvenienceFuncNames[ name ] = forwardFuncs
 				#write( forwardFuncs, file = self.testsFile )
 
-			elif getFullType( params[ 0 ] ) == "VkCommandBuffer":
-				forwardFuncs = "{{0}}\t{0} {1}( {2} ) {{{{\n{{0}}\t\t{3}{4}( this.commandBuffer{5} );\n{{0}}\t}}}}".format(
+			elif firstParamType == "VkCommandBuffer":
+				forwardFuncs = "{{0}}\t{0} {1}( {2} ) {{{{\n{{0}}\t\t{3}{{1}}{4}( this.commandBuffer{5} );\n{{0}}\t}}}}".format(
 					returnType, name[2:], joinedParams, doReturn, name, joinedArgs ).replace( '(  )', '()' )
 				self.dispatchConvenienceFuncNames[ name ] = forwardFuncs
 				#write( forwardFuncs, file = self.testsFile )
@@ -741,13 +1535,378 @@ version( {NAME_PREFIX_UCASE}_FROM_DERELICT ) {{
 			self.instanceLevelFuncNames.add( name )
 
 
+class GeneratorProfile:
+	"""
+	Timers and call counters wrapped around the callbacks of a generator for --profile. Time spent
+	in a callback called by another one, e.g. genStruct by genType, only counts for the callee
+	"""
+	CALLBACKS = [ "beginFile", "beginFeature", "endFeature", "genType", "genStruct", "genGroup", "genEnum", "genCmd", "endFile" ]
+	def __init__( self ):
+		self.seconds = Counter()
+		self.calls = Counter()
+		self.featureSeconds = Counter()		# time of all callbacks of a core version or extension
+		self.feature = None
+		self.nested = [ 0.0 ]		# time spent in nested callbacks, per active callback
+
+	def attach( self, gen ):
+		self.gen = gen
+		for name in self.CALLBACKS:
+			setattr( gen, name, self.wrap( name, getattr( gen, name )))
+
+	def wrap( self, name, method ):
+		def timed( *args ):
+			if name == "beginFeature":
+				self.feature = args[ 0 ].get( "name" )
+			self.nested.append( 0.0 )
+			start = time.perf_counter()
+			try:
+				return method( *args )
+			finally:
+				elapsed = time.perf_counter() - start
+				exclusive = elapsed - self.nested.pop()
+				self.nested[ -1 ] += elapsed
+				self.seconds[ name ] += exclusive
+				self.calls[ name ] += 1
+				if self.feature is not None:
+					self.featureSeconds[ self.feature ] += exclusive
+				if name == "endFeature":
+					self.feature = None
+		return timed
+
+	def report( self, total, top = 10 ):
+		callbacks = sum( self.seconds.values())
+		print( "profile: {0:.3f}s total, {1:.3f}s in generator callbacks, {2:.3f}s in the registry and elsewhere".format( total, callbacks, total - callbacks ))
+		print( "  {0:<14} {1:>8} {2:>10} {3:>10}".format( "callback", "calls", "total [s]", "mean [us]" ))
+		for name, seconds in self.seconds.most_common():
+			print( "  {0:<14} {1:>8} {2:>10.3f} {3:>10.1f}".format( name, self.calls[ name ], seconds, seconds / self.calls[ name ] * 1e6 ))
+		print( "  slowest core versions and extensions:" )
+		for feature, seconds in self.featureSeconds.most_common( top ):
+			print( "  {0:>10.3f}s  {1}".format( seconds, feature ))
+		print( "  bytes written:" )
+		for outFile in sorted( self.gen.outputFiles, key = lambda outFile: outFile.fileName ):
+			if outFile.size is not None:
+				print( "  {0:>10}  {1}".format( outFile.size, outFile.fileName ))
+
 class DGeneratorOptions( GeneratorOptions ):
 	def __init__( self, *args, **kwargs ):
 		self.packagePrefix = kwargs.pop( "packagePrefix" )
 		self.namePrefix = kwargs.pop( "namePrefix" )
 		self.genFuncPointers = kwargs.pop( "genFuncPointers" )
+		self.streamOutput = kwargs.pop( "streamOutput", False )
+		self.maxVersion = kwargs.pop( "maxVersion", None )
+		self.extensionList = kwargs.pop( "extensionList", None )
+		self.layout = kwargs.pop( "layout", "single" )
+		self.loader = kwargs.pop( "loader", "statements" )
+		self.dispatch = kwargs.pop( "dispatch", "embedded" )
+		self.usageCounts = kwargs.pop( "usageCounts", None )
+		self.verbose = kwargs.pop( "verbose", False )
 		super().__init__( *args, **kwargs )
 
+# bump when the layout of the cached callbacks changes
+REGISTRY_CACHE_VERSION = 3
+
+# number of resolved registries kept in the --cacheDir
+REGISTRY_CACHE_ENTRIES = 8
+
+# generator options derived from vk.xml by resolveApiSelection, stored along the cached callbacks
+RESOLVED_OPTIONS = [ "versions", "emitversions", "addExtensions" ]
+
+def loadUsageProfile( fileName ):
+	"""
+	Reads a usage profile, one command and its call count per line separated by white space or a comma, # starts a comment
+	"""
+	counts = dict()
+	with open( fileName, encoding = "utf-8" ) as f:
+		for number, line in enumerate( f, 1 ):
+			fields = line.split( "#", 1 )[ 0 ].replace( ",", " " ).split()
+			if not fields:
+				continue
+			if len( fields ) != 2 or not fields[ 1 ].isdigit():
+				sys.exit( "{0}:{1}: expected a command name and its call count".format( fileName, number ))
+			counts[ fields[ 0 ]] = counts.get( fields[ 0 ], 0 ) + int( fields[ 1 ] )
+	return counts
+
+def parseVersion( version ):
+	return tuple( int( number ) for number in version.split( "." ))
+
+def parseDepends( expression ):
+	"""
+	Parses a vk.xml 'depends' expression into nested ( operator, operands ) lists, ',' being or and '+' being and.
+	The registry parenthesizes mixed operators, '+' binds tighter otherwise. Feature names like VK_KHR_foo::bar
+	are reduced to their extension or version
+	"""
+	tokens = re_depends_token.findall( expression )
+	position = 0
+
+	def parseOperand():
+		nonlocal position
+		token = tokens[ position ]
+		position += 1
+		if token == "(":
+			operand = parseOperator( "," )
+			position += 1		# closing parenthesis
+			return operand
+		return token.split( "::" )[ 0 ]
+
+	def parseOperator( operator ):
+		nonlocal position
+		parse = parseOperand if operator == "+" else lambda: parseOperator( "+" )
+		operands = [ parse() ]
+		while position < len( tokens ) and tokens[ position ] == operator:
+			position += 1
+			operands.append( parse())
+		return operands[ 0 ] if len( operands ) == 1 else [ operator, operands ]
+
+	return parseOperator( "," )
+
+def selectDepends( requirements, extensions, apiname, ceiling, available ):
+	"""
+	Returns the extensions to generate for one satisfied branch of parsed requirements, or None if there is no such branch.
+	Of several alternatives the one requiring the fewest extensions which are not yet available is chosen, the first of equals
+	"""
+	if isinstance( requirements, str ):
+		if requirements.startswith( "VK_VERSION_" ):
+			satisfied = ceiling is None or parseVersion( requirements[ 11: ].replace( "_", "." )) <= ceiling
+			return [] if satisfied else None
+		extension = extensions.get( requirements )
+		if extension is None or apiname not in extension.get( "supported", "" ).split( "," ):
+			return None
+		return [ requirements ]
+
+	operator, operands = requirements
+	branches = [ selectDepends( operand, extensions, apiname, ceiling, available ) for operand in operands ]
+	if operator == "+":
+		return None if None in branches else [ name for branch in branches for name in branch ]
+	branches = [ branch for branch in branches if branch is not None ]
+	if not branches:
+		return None
+	return min( branches, key = lambda branch: len( set( branch ) - available ))
+
+def resolveApiSelection( root, genOpts ):
+	"""
+	Turns the core version ceiling and the extension allow-list of genOpts into the registry version and
+	extension patterns, extensions required by the listed ones are pulled in transitively
+	"""
+	ceiling = None
+	if genOpts.maxVersion is not None:
+		ceiling = parseVersion( genOpts.maxVersion )
+		versions = [ feature.get( "name" ) for feature in root.findall( "feature" )
+			if genOpts.apiname in feature.get( "api" ).split( "," ) and parseVersion( feature.get( "number" )) <= ceiling ]
+		genOpts.versions = genOpts.emitversions = "^({0})$".format( "|".join( versions ))
+
+	if genOpts.extensionList is None:
+		return
+
+	extensions = dict(( extension.get( "name" ), extension ) for extension in root.findall( "extensions/extension" ))
+	selected = set()
+	pending = list( genOpts.extensionList )
+	listed = set( pending )
+	while pending:
+		name = pending.pop()
+		if name in selected:
+			continue
+		extension = extensions.get( name )
+		if extension is None or genOpts.apiname not in extension.get( "supported", "" ).split( "," ):
+			sys.exit( "Extension {0} is not a supported {1} extension".format( name, genOpts.apiname ))
+		selected.add( name )
+
+		# 'requires' lists extension names which are all required, newer registries use a 'depends' expression of extensions and versions
+		dependencies = extension.get( "depends" ) or "+".join( filter( None, extension.get( "requires", "" ).split( "," )))
+		if dependencies:
+			requirements = parseDepends( dependencies )
+			satisfied = selectDepends( requirements, extensions, genOpts.apiname, ceiling, listed | selected )
+			if satisfied is None:
+				print( "Warning: no alternative of the dependencies {1} of {0} is satisfiable{2}".format( name, dependencies,
+					"" if ceiling is None else " within --maxVersion " + genOpts.maxVersion ), file = sys.stderr )
+				satisfied = selectDepends( requirements, extensions, genOpts.apiname, None, listed | selected ) or []
+			pending += satisfied
+
+		requiresCore = extension.get( "requiresCore" )
+		if ceiling is not None and requiresCore and parseVersion( requiresCore ) > ceiling:
+			print( "Warning: {0} requires core {1} above --maxVersion {2}".format( name, requiresCore, genOpts.maxVersion ), file = sys.stderr )
+
+	genOpts.addExtensions = "^({0})$".format( "|".join( sorted( selected ))) if selected else "(?!)"
+	if genOpts.verbose:
+		print( "extensions: {0}".format( ", ".join( sorted( selected ))))
+
+# top level sections of vk.xml used to build the specification and its validation, but not by the generator
+SPEC_ONLY_SECTIONS = { "formats", "spirvextensions", "spirvcapabilities", "sync", "videocodecs" }
+
+def isPruned( elem, apiname ):
+	"""
+	True for elements the generator never looks at: comment elements and variants for another api than apiname
+	"""
+	if elem.tag == "comment":
+		return True
+	api = elem.get( "api" )
+	return api is not None and apiname not in api.split( "," )
+
+def pruneChildren( parent, apiname ):
+	"""
+	Removes the pruned children of parent, their tails are moved to the preceding sibling or into the parent's text
+	"""
+	kept = []
+	for child in parent:
+		if not isPruned( child, apiname ):
+			kept.append( child )
+		elif child.tail:
+			if kept:
+				kept[ -1 ].tail = ( kept[ -1 ].tail or "" ) + child.tail
+			else:
+				parent.text = ( parent.text or "" ) + child.tail
+	parent[ : ] = kept
+
+def pruneExtensions( extensions, genOpts ):
+	"""
+	Removes the type and command references of the extensions the registry won't generate, their enums are kept
+	as the registry adds the enums extending core enumerations to the generated groups regardless
+	"""
+	for extension in extensions:
+		name = extension.get( "name" )
+		generated = re.match( genOpts.addExtensions, name ) or ( genOpts.defaultExtensions and re.match( genOpts.defaultExtensions, extension.get( "supported", "" )))
+		if generated and not ( genOpts.removeExtensions and re.match( genOpts.removeExtensions, name )):
+			continue
+		for require in extension.findall( "require" ):
+			require[ : ] = [ child for child in require if child.tag not in { "type", "command" } ]
+
+def loadRegistryTree( vkxml, genOpts ):
+	"""
+	Parses vk.xml and drops what the generator doesn't use before the Registry indexes it: comment elements, variants
+	for other apis, the spec only top level sections and the type and command references of extensions which are not
+	generated. The api selection of genOpts is resolved along the way, see resolveApiSelection
+	"""
+	tree = etree.parse( vkxml )
+	root = tree.getroot()
+	root[ : ] = [ section for section in root if section.tag not in SPEC_ONLY_SECTIONS ]
+
+	# candidates are collected first as the tree must not change while it is iterated, the test is
+	# inlined as it runs for every element, pruneChildren leaves the variants for apiname in place
+	parents = { parent for parent in root.iter() for child in parent if child.tag == "comment" or child.get( "api" ) is not None }
+	for parent in parents:
+		pruneChildren( parent, genOpts.apiname )
+
+	resolveApiSelection( root, genOpts )
+	for extensions in root.findall( "extensions" ):
+		pruneExtensions( extensions, genOpts )
+	return tree
+
+class RegistryRecorder:
+	"""
+	Stands in for the generator passed to Registry.setGenerator, forwards every call
+	and records the feature and gen* callbacks of the resolved registry for later replay
+	"""
+	CALLBACKS = { "beginFeature", "endFeature", "genType", "genStruct", "genGroup", "genEnum", "genCmd" }
+	def __init__( self, gen, forward = True ):
+		self.gen = gen
+		self.forward = forward		# if False the callbacks are only recorded and no files are written
+		self.calls = []
+
+	def __getattr__( self, name ):
+		attr = getattr( self.gen, name )
+		if name not in self.CALLBACKS:
+			if not self.forward and name in { "beginFile", "endFile" }:
+				return lambda *args: None
+			return attr
+
+		def record( *args ):
+			self.calls.append(( name, args ))
+			if self.forward:
+				return attr( *args )
+		return record
+
+def registryCacheKey( vkxml, genOpts ):
+	"""
+	Content hash of vk.xml, the registry code, this script and the generator options which affect feature and extension resolution
+	"""
+	key = hashlib.sha256()
+	key.update( str( REGISTRY_CACHE_VERSION ).encode())
+	for fileName in ( vkxml, sys.modules[ Registry.__module__ ].__file__, __file__ ):
+		with open( fileName, "rb" ) as f:
+			key.update( f.read())
+	for option in ( "apiname", "profile", "versions", "emitversions", "defaultExtensions", "addExtensions", "removeExtensions", "maxVersion", "extensionList" ):
+		key.update( repr( getattr( genOpts, option, None )).encode())
+	return key.hexdigest()
+
+def loadRegistryCache( cacheFile ):
+	try:
+		with open( cacheFile, "rb" ) as f:
+			return pickle.load( f )
+	except FileNotFoundError:
+		return None
+	except Exception as e:
+		print( "Ignoring unreadable registry cache {0}: {1}".format( cacheFile, e ), file = sys.stderr )
+		return None
+
+def storeRegistryCache( cacheFile, genOpts, calls ):
+	os.makedirs( path.dirname( cacheFile ), exist_ok = True )
+	tmpFile = "{0}.{1}.tmp".format( cacheFile, os.getpid())
+	resolved = dict(( option, getattr( genOpts, option )) for option in RESOLVED_OPTIONS )
+	with open( tmpFile, "wb" ) as f:
+		pickle.dump(( resolved, calls ), f, pickle.HIGHEST_PROTOCOL )
+	os.replace( tmpFile, cacheFile )
+
+	# keep only the most recently stored registries
+	cacheDir = path.dirname( cacheFile )
+	entries = sorted(( entry for entry in os.scandir( cacheDir ) if entry.name.endswith( ".pickle" )), key = lambda entry: entry.stat().st_mtime, reverse = True )
+	for entry in entries[ REGISTRY_CACHE_ENTRIES : ]:
+		try:
+			os.remove( entry.path )
+		except OSError:
+			pass
+
+def replayRegistry( calls, gen, genOpts ):
+	"""
+	Drives the generator with recorded callbacks, the way Registry.apiGen would
+	"""
+	gen.beginFile( genOpts )
+	for name, args in calls:
+		getattr( gen, name )( *args )
+	gen.endFile()
+
+def renderFeatures( genOpts, calls ):
+	"""
+	Worker of the --jobs mode, renders the recorded callbacks of a contiguous range of features
+	into in memory fragments of the DGenerator output buffers
+	"""
+	gen = DGenerator()
+	gen.beginRender( genOpts )
+	for name, args in calls:
+		getattr( gen, name )( *args )
+	return gen.headerVersion, gen.symbolCounts, gen.typeModules, gen.hotCommands, [ str( getattr( gen, buffer )) for buffer in DGenerator.OUTPUT_BUFFERS ]
+
+def replayRegistryParallel( calls, gen, genOpts, jobs ):
+	"""
+	Renders features in worker processes and merges their fragments in registry order.
+	DGenerator does accumulate state across features: the function type names, command signatures, instance
+	and device level name sets and dispatchConvenienceFuncNames. But Registry generates each command in the
+	first feature requiring it, and endFeature only looks up the commands of the current feature, which genCmd
+	registered within the same batch. maxDispatchConvenienceFuncName is tracked but never written out, and
+	symbolCounts and hotCommands are merged bellow. Hence the output equals replayRegistry's,
+	erupt_check.py compares both on a vk.xml
+	"""
+	features = []
+	for call in calls:
+		if call[ 0 ] == "beginFeature" or not features:
+			features.append( [] )
+		features[ -1 ].append( call )
+
+	# contiguous batches of features, a few per worker to even out the load
+	batchCount = min( len( features ), jobs * 4 )
+	batches = [ sum( features[ i * len( features ) // batchCount : ( i + 1 ) * len( features ) // batchCount ], [] ) for i in range( batchCount ) ]
+
+	gen.beginFile( genOpts )
+	with concurrent.futures.ProcessPoolExecutor( max_workers = jobs ) as executor:
+		for headerVersion, symbolCounts, typeModules, hotCommands, fragments in executor.map( renderFeatures, [ genOpts ] * batchCount, batches ):
+			if headerVersion:
+				gen.headerVersion = headerVersion
+			gen.symbolCounts.update( symbolCounts )
+			gen.typeModules += typeModules
+			gen.hotCommands.update( hotCommands )
+			for buffer, fragment in zip( DGenerator.OUTPUT_BUFFERS, fragments ):
+				output = getattr( gen, buffer )
+				output += fragment
+	gen.endFile()
+
 if __name__ == "__main__":
 	import argparse
 
@@ -760,15 +1919,38 @@ if __name__ == "__main__":
 	parser.add_argument( "outfolder" )
 	parser.add_argument( "--packagePrefix", default = "erupted" )
 	parser.add_argument( "--namePrefix", default = "Erupted" )
+	parser.add_argument( "--cacheDir",
+		help = "cache the resolved registry in this directory, keyed by vk.xml content, the generator code and options" )
+	parser.add_argument( "--stream", action = "store_true", help = "spill generated sections to temporary files as features complete, single layout only" )
+	parser.add_argument( "--jobs", type = int, default = 1, help = "number of worker processes rendering features in parallel" )
+	parser.add_argument( "--layout", choices = [ "single", "split" ], default = "single",
+		help = "split: one types module per core version and extension, aggregated by the {packagePrefix}.types package" )
+	parser.add_argument( "--loader", choices = [ "statements", "table", "lazy" ], default = "statements",
+		help = "table: load function pointers in a loop over a static table of names instead of one statement per function, "
+			"lazy: resolve each __gshared function on its first call, its pointer is then never null, test availability "
+			"with vkGet*ProcAddr instead; DispatchDevice stays eager and resolves all its device level functions when loaded, "
+			"as with table, as a shared trampoline could not tell which device to resolve with" )
+	parser.add_argument( "--dispatch", choices = [ "embedded", "shared" ], default = "embedded",
+		help = "shared: DispatchDevice only holds its VkDevice and a reference to a DispatchTable of the device level functions, "
+			"loaded once per VkDevice and shared by its DispatchDevices, needs druntime for core.sync.mutex" )
+	parser.add_argument( "--usageProfile", metavar = "FILE",
+		help = "command call counts, the called commands are placed first, most called first, in DispatchDevice and the __gshared block" )
+	parser.add_argument( "--maxVersion", help = "highest core version to generate, e.g. 1.1" )
+	parser.add_argument( "--extensions", action = "append",
+		help = "comma separated allow-list of extensions to generate, required extensions are added automatically" )
+	parser.add_argument( "--profile", action = "store_true",
+		help = "report the time spent in each generator callback, the slowest features and the size of the output files" )
+	parser.add_argument( "--profileDump", metavar = "FILE", help = "also run under cProfile and dump the pstats to FILE" )
+	parser.add_argument( "--verbose", action = "store_true", help = "print the generated files, symbol counts and selected extensions" )
 
 	args = parser.parse_args()
+	if args.stream and args.layout == "split":
+		parser.error( "--layout split keeps the per feature modules in memory to resolve their imports, --stream only applies to the single layout" )
+	if ( args.profile or args.profileDump ) and args.jobs > 1:
+		print( "Warning: {0} renders in a single process, ignoring --jobs".format( "--profile" if args.profile else "--profileDump" ), file = sys.stderr )
+		args.jobs = 1
 
-	gen = DGenerator()
-	reg = Registry()
-	reg.loadElementTree( etree.parse( vkxml ))
-	reg.setGenerator( gen )
-	reg.apiGen(
-		DGeneratorOptions(
+	genOpts = DGeneratorOptions(
 		filename = args.outfolder,
 		apiname = "vulkan",
 		versions = ".*",
@@ -776,10 +1958,75 @@ if __name__ == "__main__":
 		packagePrefix = args.packagePrefix,
 		namePrefix = args.namePrefix,
 		genFuncPointers  = True,
+		streamOutput = args.stream,
+		maxVersion = args.maxVersion,
+		layout = args.layout,
+		loader = args.loader,
+		dispatch = args.dispatch,
+		usageCounts = args.usageProfile and loadUsageProfile( args.usageProfile ),
+		verbose = args.verbose,
+		extensionList = args.extensions and [ name.strip() for names in args.extensions for name in names.split( "," ) if name.strip() ],
 		#defaultExtensions = "defaultExtensions",
 		addExtensions = r".*",
 		#removeExtensions = None#r"VK_KHR_.*_surface$"
-	))
+	)
+
+	gen = DGenerator()
+	profile = None
+	if args.profile:
+		profile = GeneratorProfile()
+		profile.attach( gen )
+	if args.profileDump:
+		import cProfile
+		profiler = cProfile.Profile()
+		profiler.enable()
+	start = time.perf_counter()
+
+	cacheFile = None
+	calls = None
+	if args.cacheDir:
+		cacheFile = path.join( args.cacheDir, registryCacheKey( vkxml, genOpts ) + ".pickle" )
+		cached = loadRegistryCache( cacheFile )
+		if cached is not None:
+			resolved, calls = cached
+			for option, value in resolved.items():
+				setattr( genOpts, option, value )
+
+	generated = False
+	try:
+		if calls is None:
+			# with --jobs the registry is only recorded here and rendered in parallel bellow
+			serial = args.jobs <= 1
+			recorder = RegistryRecorder( gen if serial else OutputGenerator(), forward = serial )
+			tree = loadRegistryTree( vkxml, genOpts )
+			reg = Registry()
+			reg.loadElementTree( tree )
+			reg.setGenerator( recorder )
+			reg.apiGen( genOpts )
+			calls = recorder.calls
+			generated = recorder.forward
+			if cacheFile:
+				storeRegistryCache( cacheFile, genOpts, calls )
+
+		if not generated:
+			if args.jobs > 1:
+				replayRegistryParallel( calls, gen, genOpts, args.jobs )
+			else:
+				replayRegistry( calls, gen, genOpts )
+	except BaseException:
+		# also on Ctrl-C, which would leave the temporary files of --stream behind
+		gen.discardOutput()
+		raise
+
+	if args.profileDump:
+		profiler.disable()
+		profiler.dump_stats( args.profileDump )
+	if profile is not None:
+		profile.report( time.perf_counter() - start )
+	if args.profileDump:
+		import pstats
+		print( "cProfile statistics written to {0}, the top functions by cumulative time:".format( args.profileDump ))
+		pstats.Stats( args.profileDump ).sort_stats( "cumulative" ).print_stats( 15 )
 
 # 146: Platform Extensions
 # 171: Test File
\ No newline at end of file
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Benchmark of erupt.py, times the full Registry/apiGen pipeline with DGenerator on pinned vk.xml fixtures.
+
+Each run parses and resolves a fixture in a fresh process, without the registry cache, and reports
+wall time, peak RSS and the time spent in each generator callback. Results are compared to a stored
+baseline, which also records the content hash of each fixture so only like is compared with like.
+
+to save a baseline run: erupt_bench.py path/to/vulkan-docs fixtures/vk-1.3.250.xml ... --saveBaseline
+to compare against it:  erupt_bench.py path/to/vulkan-docs fixtures/vk-1.3.250.xml ...
+"""
+
+import sys
+import os
+import bisect
+import json
+import math
+import hashlib
+import statistics
+import shutil
+import subprocess
+import tempfile
+import time
+from os import path
+
+# one-sided 95% critical values of Student's t distribution for 1 to 30 degrees of freedom, then for 40, 60 and 120
+T_CRITICAL_DOF = list( range( 1, 31 )) + [ 40, 60, 120 ]
+T_CRITICAL = [ 6.314, 2.920, 2.353, 2.132, 2.015, 1.943, 1.895, 1.860, 1.833, 1.812, 1.796, 1.782, 1.771, 1.761, 1.753,
+	1.746, 1.740, 1.734, 1.729, 1.725, 1.721, 1.717, 1.714, 1.711, 1.708, 1.706, 1.703, 1.701, 1.699, 1.697, 1.684, 1.671, 1.658 ]
+T_CRITICAL_INFINITY = 1.645
+
+# with fewer runs on either side the standard deviations are too unreliable to call a slowdown a regression
+MIN_ITERATIONS = 3
+
+def runPipeline( vulkanDocs, vkxml, resultFile ):
+	"""
+	Worker, runs erupt.py's uncached pipeline on vkxml and writes the phase and callback timings to resultFile
+	"""
+	sys.path.append( path.join( vulkanDocs, "src", "spec" ))
+	sys.argv = sys.argv[ :1 ]		# erupt.py looks for the Vulkan-Docs path in the command line
+	sys.path.insert( 0, path.dirname( path.abspath( __file__ )))
+	import erupt
+
+	outFolder = tempfile.mkdtemp( prefix = "erupt_bench" )
+	try:
+		genOpts = erupt.DGeneratorOptions(
+			filename = outFolder,
+			apiname = "vulkan",
+			versions = ".*",
+			emitversions = ".*",
+			packagePrefix = "erupted",
+			namePrefix = "Erupted",
+			genFuncPointers = True,
+			addExtensions = r".*",
+		)
+		profile = erupt.GeneratorProfile()
+		gen = erupt.DGenerator()
+		profile.attach( gen )
+
+		start = time.perf_counter()
+		tree = erupt.loadRegistryTree( vkxml, genOpts )
+		parsed = time.perf_counter()
+		reg = erupt.Registry()
+		reg.loadElementTree( tree )
+		loaded = time.perf_counter()
+		reg.setGenerator( gen )
+		reg.apiGen( genOpts )
+		done = time.perf_counter()
+	finally:
+		shutil.rmtree( outFolder, ignore_errors = True )
+
+	phases = { "parse" : parsed - start, "loadElementTree" : loaded - parsed, "apiGen" : done - loaded }
+	phases.update(( name, profile.seconds[ name ] ) for name in profile.CALLBACKS )
+	with open( resultFile, "w" ) as f:
+		json.dump({ "phases" : phases, "calls" : dict( profile.calls ) }, f )
+
+def runOnce( vulkanDocs, vkxml ):
+	"""
+	Runs the pipeline in a child process, returns its timings with the wall time and peak RSS of the whole process
+	"""
+	fd, resultFile = tempfile.mkstemp( suffix = ".json" )
+	os.close( fd )
+	try:
+		start = time.perf_counter()
+		process = subprocess.Popen([ sys.executable, path.abspath( __file__ ), "--worker", vulkanDocs, vkxml, resultFile ], stdout = subprocess.DEVNULL )
+		if hasattr( os, "wait4" ):
+			_, status, usage = os.wait4( process.pid, 0 )
+			returnCode = os.waitstatus_to_exitcode( status ) if hasattr( os, "waitstatus_to_exitcode" ) else status >> 8
+			# kilobytes on Linux and the BSDs, bytes on macOS
+			rss = usage.ru_maxrss * ( 1 if sys.platform == "darwin" else 1024 )
+		else:
+			returnCode = process.wait()
+			rss = 0
+		wall = time.perf_counter() - start
+		if returnCode != 0:
+			sys.exit( "erupt.py failed on {0}".format( vkxml ))
+		with open( resultFile ) as f:
+			result = json.load( f )
+	finally:
+		os.remove( resultFile )
+	result[ "phases" ][ "wall" ] = wall
+	result[ "rss" ] = rss
+	return result
+
+def fileHash( fileName ):
+	with open( fileName, "rb" ) as f:
+		return hashlib.sha256( f.read()).hexdigest()
+
+def meanStdev( samples ):
+	return statistics.mean( samples ), statistics.stdev( samples ) if len( samples ) > 1 else 0.0
+
+def tCritical( degreesOfFreedom ):
+	"""
+	One-sided 95% critical value of Student's t distribution, the degrees of freedom are rounded down to the table
+	"""
+	index = bisect.bisect_right( T_CRITICAL_DOF, degreesOfFreedom )
+	if index == len( T_CRITICAL_DOF ) and degreesOfFreedom > 1000:
+		return T_CRITICAL_INFINITY
+	return T_CRITICAL[ max( index - 1, 0 ) ]
+
+def slowdown( samples, baselineSamples, args ):
+	"""
+	Returns the relative change of the mean against the baseline and whether it is a regression: above args.threshold
+	and significant in a one-sided Welch's t-test at 95%, with the Welch-Satterthwaite degrees of freedom.
+	Fewer than MIN_ITERATIONS samples on either side are never a regression
+	"""
+	mean, stdev = meanStdev( samples )
+	baseMean, baseStdev = meanStdev( baselineSamples )
+	if baseMean == 0.0:
+		return 0.0, False
+	change = mean / baseMean - 1.0
+	if change <= args.threshold or min( len( samples ), len( baselineSamples )) < MIN_ITERATIONS:
+		return change, False
+
+	variance = stdev ** 2 / len( samples )
+	baseVariance = baseStdev ** 2 / len( baselineSamples )
+	if variance + baseVariance == 0.0:
+		return change, True
+	degreesOfFreedom = ( variance + baseVariance ) ** 2 / ( variance ** 2 / ( len( samples ) - 1 ) + baseVariance ** 2 / ( len( baselineSamples ) - 1 ))
+	return change, ( mean - baseMean ) / math.sqrt( variance + baseVariance ) > tCritical( degreesOfFreedom )
+
+def benchmark( args ):
+	results = dict()
+	for vkxml in args.fixtures:
+		name = path.basename( vkxml )
+		samples = dict()
+		rss = []
+		for i in range( args.iterations ):
+			print( "{0}: run {1} of {2} ...".format( name, i + 1, args.iterations ))
+			result = runOnce( args.vulkandocs, vkxml )
+			for phase, seconds in result[ "phases" ].items():
+				samples.setdefault( phase, [] ).append( seconds )
+			rss.append( result[ "rss" ] )
+		results[ name ] = { "sha256" : fileHash( vkxml ), "phases" : samples, "rss" : rss, "calls" : result[ "calls" ] }
+	return results
+
+def report( results, baseline, args ):
+	"""
+	Prints the results next to the baseline, returns the regressed fixture phases
+	"""
+	regressions = []
+	for name, result in results.items():
+		base = baseline.get( name )
+		if base is not None and base[ "sha256" ] != result[ "sha256" ]:
+			print( "\n{0} changed since the baseline was saved, not comparing".format( name ))
+			base = None
+
+		print( "\n{0}: peak RSS {1:.1f} MB".format( name, max( result[ "rss" ] ) / 1048576.0 ), end = "" )
+		if base is not None:
+			print( ", baseline {0:.1f} MB".format( max( base[ "rss" ] ) / 1048576.0 ), end = "" )
+		print( "\n{0:<16} {1:>8} {2:>10} {3:>8} {4:>10} {5:>8}".format( "phase", "calls", "mean [s]", "stdev", "baseline", "change" ))
+		for phase, samples in result[ "phases" ].items():
+			mean, stdev = meanStdev( samples )
+			line = "{0:<16} {1:>8} {2:>10.3f} {3:>8.3f}".format( phase, result[ "calls" ].get( phase, "" ), mean, stdev )
+			if base is not None and phase in base[ "phases" ]:
+				change, regressed = slowdown( samples, base[ "phases" ][ phase ], args )
+				line += " {0:>10.3f} {1:>+7.1f}%".format( statistics.mean( base[ "phases" ][ phase ] ), change * 100 )
+				if regressed:
+					line += "  REGRESSION"
+					regressions.append( "{0} {1}".format( name, phase ))
+			print( line )
+	return regressions
+
+def main():
+	import argparse
+
+	parser = argparse.ArgumentParser( description = "Times erupt.py's registry pipeline on vk.xml fixtures and compares to a baseline." )
+	parser.add_argument( "vulkandocs", help = "Vulkan-Docs directory providing reg.py and generator.py" )
+	parser.add_argument( "fixtures", nargs = "+", help = "pinned vk.xml files to generate from" )
+	parser.add_argument( "-n", "--iterations", type = int, default = 5 )
+	parser.add_argument( "--baseline", default = "erupt_bench_baseline.json", help = "baseline to compare to or to save" )
+	parser.add_argument( "--saveBaseline", action = "store_true", help = "save the results as the new baseline instead of comparing" )
+	parser.add_argument( "--threshold", type = float, default = 0.05,
+		help = "relative slowdown considered a regression if also significant in a one-sided Welch's t-test at 95%%" )
+	args = parser.parse_args()
+	if args.iterations < MIN_ITERATIONS and not args.saveBaseline:
+		print( "Warning: regressions need at least {0} iterations, only reporting the changes".format( MIN_ITERATIONS ), file = sys.stderr )
+
+	results = benchmark( args )
+	baseline = dict()
+	if args.saveBaseline:
+		with open( args.baseline, "w" ) as f:
+			json.dump( results, f, indent = 1, sort_keys = True )
+	elif path.exists( args.baseline ):
+		with open( args.baseline ) as f:
+			baseline = json.load( f )
+
+	regressions = report( results, baseline, args )
+	if args.saveBaseline:
+		print( "\nSaved as baseline to {0}".format( args.baseline ))
+	elif regressions:
+		print( "\nRegressed by more than {0:.0f}%: {1}".format( args.threshold * 100, ", ".join( regressions )))
+		return 1
+	return 0
+
+if __name__ == "__main__":
+	if sys.argv[ 1: 2 ] == [ "--worker" ]:
+		runPipeline( *sys.argv[ 2: ] )
+	else:
+		sys.exit( main())
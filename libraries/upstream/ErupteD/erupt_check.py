@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Consistency check of erupt.py on a vk.xml, run it after changing the generator.
+
+Generates the bindings of every configuration bellow serially and with --jobs and fails
+if any generated module differs between the two, or if the generated modules of a
+configuration do not compile with the D compiler found on the PATH or given with --compiler.
+Run it with each loader, dispatch and usage profile combination compiling before a change
+to erupt.py is merged, --noCompile only compares the --jobs output.
+
+usage: erupt_check.py path/to/vulkan-docs [--jobs 4] [--compiler ldc2 | --noCompile]
+"""
+
+import sys
+import os
+import filecmp
+import shutil
+import subprocess
+import tempfile
+from os import path
+
+# erupt.py arguments of the checked configurations, every loader with every dispatch mode, with and without
+# hot members of a usage profile, and the split layout
+LOADERS = [ "statements", "table", "lazy" ]
+DISPATCHES = [ "embedded", "shared" ]
+CONFIGURATIONS = [ [ "--loader", loader, "--dispatch", dispatch ] + profile
+	for loader in LOADERS for dispatch in DISPATCHES for profile in ( [], [ "--usageProfile", "{USAGE_PROFILE}" ] ) ]
+CONFIGURATIONS.append([ "--layout", "split" ])
+
+# usage profile of the configurations with hot members, with a core, an extension and a platform extension command
+USAGE_PROFILE = """\
+vkCmdDraw 1000
+vkQueueSubmit 100
+vkCmdPushDescriptorSetKHR 10
+vkGetMemoryWin32HandleKHR 1
+"""
+
+# D compilers looked up on the PATH, with their flag to stop after semantic analysis
+D_COMPILERS = [ ( "dmd", "-o-" ), ( "ldmd2", "-o-" ), ( "ldc2", "-o-" ), ( "gdc", "-fsyntax-only" ) ]
+
+# package of the generated modules, erupt.py's default --packagePrefix
+PACKAGE = "erupted"
+
+def erupt( vulkanDocs, outFolder, args ):
+	os.makedirs( path.dirname( outFolder ), exist_ok = True )
+	command = [ sys.executable, path.join( path.dirname( path.abspath( __file__ )), "erupt.py" ), vulkanDocs, outFolder ] + args
+	if subprocess.call( command, stdout = subprocess.DEVNULL ) != 0:
+		sys.exit( "erupt.py failed: {0}".format( " ".join( command )))
+
+def moduleFiles( folder ):
+	return set( path.relpath( path.join( root, name ), folder ) for root, _, names in os.walk( folder ) for name in names )
+
+def checkJobs( vulkanDocs, args, jobs, workDir ):
+	"""
+	Returns the files which --jobs renders differently than a serial run, or only one of both runs.
+	The serial output is left in workDir/serial/{PACKAGE}
+	"""
+	serialFolder = path.join( workDir, "serial", PACKAGE )
+	parallelFolder = path.join( workDir, "parallel", PACKAGE )
+	erupt( vulkanDocs, serialFolder, args )
+	erupt( vulkanDocs, parallelFolder, args + [ "--jobs", str( jobs ) ])
+	serialFiles = moduleFiles( serialFolder )
+	parallelFiles = moduleFiles( parallelFolder )
+	return sorted(( serialFiles ^ parallelFiles ) | set( name for name in serialFiles & parallelFiles
+		if not filecmp.cmp( path.join( serialFolder, name ), path.join( parallelFolder, name ), shallow = False )))
+
+def findCompiler( name ):
+	"""
+	Returns the command and semantic analysis flag of the named D compiler, or of the first one found on the PATH
+	"""
+	for compiler, flag in D_COMPILERS:
+		if name is None or path.basename( name ).startswith( compiler ):
+			command = shutil.which( name or compiler )
+			if command is not None:
+				return command, flag
+			if name is not None:
+				sys.exit( "D compiler {0} not found".format( name ))
+	if name is not None:
+		sys.exit( "Unknown D compiler {0}, expected one of {1}".format( name, ", ".join( compiler for compiler, _ in D_COMPILERS )))
+	return None
+
+def compileModules( compiler, importDir ):
+	"""
+	Runs the semantic analysis of all generated modules, returns True if they compile
+	"""
+	command, flag = compiler
+	files = sorted( path.join( importDir, PACKAGE, name ) for name in moduleFiles( path.join( importDir, PACKAGE )) if name.endswith( ".d" ))
+	return subprocess.call([ command, flag, "-I" + importDir ] + files ) == 0
+
+def main():
+	import argparse
+
+	parser = argparse.ArgumentParser( description = "Checks that erupt.py renders the same bindings with --jobs as serially, and that they compile." )
+	parser.add_argument( "vulkandocs", help = "Vulkan-Docs directory providing reg.py, generator.py and src/spec/vk.xml" )
+	parser.add_argument( "--jobs", type = int, default = 4 )
+	parser.add_argument( "--compiler", help = "D compiler checking the generated modules, default: the first of {0} on the PATH".format(
+		", ".join( compiler for compiler, _ in D_COMPILERS )))
+	parser.add_argument( "--noCompile", action = "store_true", help = "only compare the --jobs output, don't compile the generated modules" )
+	args = parser.parse_args()
+	if args.noCompile and args.compiler:
+		parser.error( "--noCompile and --compiler exclude each other" )
+
+	compiler = None
+	if not args.noCompile:
+		compiler = findCompiler( args.compiler )
+		if compiler is None:
+			sys.exit( "No D compiler found, install one of {0}, or pass --noCompile to only compare the --jobs output".format(
+				", ".join( compiler for compiler, _ in D_COMPILERS )))
+
+	failures = 0
+	for configuration in CONFIGURATIONS:
+		name = " ".join( configuration ).format( USAGE_PROFILE = "usage_profile.txt" )
+		workDir = tempfile.mkdtemp( prefix = "erupt_check" )
+		try:
+			usageProfile = path.join( workDir, "usage_profile.txt" )
+			with open( usageProfile, "w" ) as f:
+				f.write( USAGE_PROFILE )
+			differing = checkJobs( args.vulkandocs, [ arg.format( USAGE_PROFILE = usageProfile ) for arg in configuration ], args.jobs, workDir )
+			compiles = compiler is None or compileModules( compiler, path.join( workDir, "serial" ))
+		finally:
+			shutil.rmtree( workDir, ignore_errors = True )
+		if differing:
+			failures += 1
+			print( "{0}: --jobs {1} output differs in {2}".format( name, args.jobs, ", ".join( differing )))
+		else:
+			print( "{0}: --jobs {1} output matches".format( name, args.jobs ))
+		if not compiles:
+			failures += 1
+			print( "{0}: generated modules do not compile".format( name ))
+		elif compiler is not None:
+			print( "{0}: generated modules compile".format( name ))
+	return 1 if failures else 0
+
+if __name__ == "__main__":
+	sys.exit( main())